@@ -1,27 +1,64 @@
 import time
 from datetime import datetime
+from functools import partial
+from socket import socket
+from typing import Optional
 
-from create.sqlite import get_tables_to_create, reset_all_starts
-from create.tree import create_tree
+from create.executor import CreationExecutor
+from create.maintenance import get_maintenance_scheduler
+from create.redshift import get_dependent_views_index
+from create.sqlite import (
+    get_tables_to_create,
+    reclaim_expired_leases,
+    get_seconds_till_next_due,
+)
+from create.tree import create_planned_table
+from create.venvs import collect_unused_venvs
 from utils.errors import CreationError
 from notifications.slack import send_slack_notification
-from utils.global_config import load_global_config
+from utils.global_config import load_global_config, GlobalConfig
+from utils.table import Table
+from utils.wakeup import open_wakeup_socket, wait_for_wakeup, notify_creator
 
 
-def create(root_table: str):
+def create(table: Table, global_config: GlobalConfig):
     try:
-        create_tree(root_table, load_global_config())
+        create_planned_table(table, global_config)
     except CreationError as e:
         send_slack_notification(e.message, f"Error while creating {e.table}")
     except Exception as e:
         send_slack_notification(str(e))
 
 
+def wait_for_next_tick(wakeup_socket: Optional[socket], global_config: GlobalConfig):
+    if wakeup_socket is None:
+        time.sleep(global_config.poll_interval)
+        return
+
+    next_due = get_seconds_till_next_due(global_config.db_path)
+    if next_due is None or next_due > global_config.poll_interval:
+        next_due = global_config.poll_interval
+    wait_for_wakeup(wakeup_socket, next_due)
+
+
 if __name__ == "__main__":
-    db_path = load_global_config().db_path
-    reset_all_starts(db_path)
+    global_config = load_global_config()
+    db_path = global_config.db_path
+
+    wakeup_socket = None
+    if global_config.wakeup_socket:
+        wakeup_socket = open_wakeup_socket(global_config.wakeup_socket)
+
+    executor = CreationExecutor(
+        global_config.workers,
+        on_finish=partial(notify_creator, global_config.wakeup_socket),
+    )
 
     while True:
+        reclaimed = reclaim_expired_leases(db_path)
+        if reclaimed:
+            print(f"{datetime.now()}: reclaimed {', '.join(reclaimed)}")
+
         new_tables = get_tables_to_create(db_path)
 
         if not new_tables:
@@ -32,7 +69,20 @@ if __name__ == "__main__":
             msg = f"{len(new_tables)} tables in queue"
         print(f"{datetime.now()}: {msg}")
 
-        for t in new_tables:
-            create(t[0])
+        if new_tables:
+            plan = executor.submit(
+                [t[0] for t in new_tables], load_global_config(), create
+            )
+            if plan.tables_to_create:
+                # catalog is fetched again before swaps of the new plan
+                get_dependent_views_index().reset()
+
+        removed_venvs = collect_unused_venvs(global_config.venvs_max_idle_days)
+        if removed_venvs:
+            print(f"{datetime.now()}: removed unused venvs {', '.join(removed_venvs)}")
+
+        maintained = get_maintenance_scheduler().run_pending()
+        if maintained:
+            print(f"{datetime.now()}: maintenance for {', '.join(maintained)}")
 
-        time.sleep(30)
+        wait_for_next_tick(wakeup_socket, global_config)
@@ -0,0 +1,177 @@
+import json
+from typing import List, NamedTuple, Optional, Tuple
+
+import arrow
+import psycopg2
+
+from create.object_store import ObjectStore, get_object_store
+from utils.errors import SnapshotsArchiveError
+from utils.logger import log_action
+from utils.table import history_postfix
+
+archive_folder = "archive"
+
+
+class ArchivedRange(NamedTuple):
+    start: str
+    end: str
+    rows: int
+    prefix: str
+    archived_at: str
+
+
+def get_archive_folder(table_name: str) -> str:
+    return f"{archive_folder}/{table_name}"
+
+
+def get_manifest_key(table_name: str) -> str:
+    return f"{get_archive_folder(table_name)}/manifest.json"
+
+
+def get_data_prefix(table_name: str, start, end) -> str:
+    time_format = "%Y%m%d%H%M%S"
+    return (
+        f"{get_archive_folder(table_name)}/data/"
+        f"{start.strftime(time_format)}-{end.strftime(time_format)}_"
+    )
+
+
+def load_manifest(table_name: str, store: ObjectStore) -> List[ArchivedRange]:
+    manifest = store.get(get_manifest_key(table_name))
+    if manifest is None:
+        return []
+    # noinspection PyArgumentList
+    return [ArchivedRange(**r) for r in json.loads(manifest.decode())["ranges"]]
+
+
+def save_manifest(table_name: str, ranges: List[ArchivedRange], store: ObjectStore):
+    manifest = {"table": table_name, "ranges": [r._asdict() for r in ranges]}
+    store.put(get_manifest_key(table_name), json.dumps(manifest, indent=2).encode())
+
+
+def archive_expiring_rows(
+    table_name: str,
+    column: str,
+    expired: str,
+    connection,
+    store: Optional[ObjectStore] = None,
+) -> Optional[str]:
+    """
+    Unloads rows of `_history` that match `expired` and aren’t archived
+    yet to Parquet files and adds their range to the manifest. Returns
+    the value of `column` up to which rows are archived and can be deleted.
+    """
+    store = store or get_object_store()
+    ranges = load_manifest(table_name, store)
+    archived_until = ranges[-1].end if ranges else None
+    if archived_until is not None:
+        expired = f"{expired} and {column} > '{archived_until}'"
+
+    start, end, rows = get_expiring_range(table_name, column, expired, connection)
+    if not rows:
+        return archived_until
+
+    prefix = get_data_prefix(table_name, start, end)
+    condition = f"{expired} and {column} <= '{end}'"
+    unload_rows(table_name, condition, store.url(prefix), store, connection)
+
+    # noinspection PyArgumentList
+    ranges.append(
+        ArchivedRange(str(start), str(end), rows, prefix, arrow.now().isoformat())
+    )
+    save_manifest(table_name, ranges, store)
+    return str(end)
+
+
+@log_action("get range of expiring snapshots", "table_name")
+def get_expiring_range(table_name: str, column: str, expired: str, connection) -> Tuple:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            select min({column}), max({column}), count(*)
+            from {table_name}{history_postfix}
+            where {expired}
+        """
+        )
+        return cursor.fetchone()
+
+
+@log_action("unload expiring snapshots", "table_name")
+def unload_rows(
+    table_name: str, condition: str, url: str, store: ObjectStore, connection
+):
+    query = f"select * from {table_name}{history_postfix} where {condition}"
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                unload ('{escape_quotes(query)}')
+                to '{url}'
+                {store.authorization}
+                format as parquet;
+            """
+            )
+    except psycopg2.Error as e:
+        raise SnapshotsArchiveError(table_name, str(e))
+
+
+def escape_quotes(query: str) -> str:
+    return query.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def build_restore_query(
+    target: str, archived: ArchivedRange, store: Optional[ObjectStore] = None
+) -> str:
+    """Query to load one archived range back into `target` (e.g., `_history`)"""
+    store = store or get_object_store()
+    return f"""
+        copy {target}
+        from '{store.url(archived.prefix)}'
+        {store.authorization}
+        format as parquet;
+    """
+
+
+def restore_archived_rows(
+    table_name: str,
+    start: str,
+    end: str,
+    connection,
+    target: Optional[str] = None,
+    store: Optional[ObjectStore] = None,
+) -> List[ArchivedRange]:
+    """Copies archived ranges overlapping with [start, end] into `target`"""
+    store = store or get_object_store()
+    target = target or f"{table_name}{history_postfix}"
+    ranges = [
+        r
+        for r in load_manifest(table_name, store)
+        if arrow.get(r.start) <= arrow.get(end) and arrow.get(r.end) >= arrow.get(start)
+    ]
+    with connection.cursor() as cursor:
+        for archived in ranges:
+            cursor.execute(build_restore_query(target, archived, store))
+    return ranges
+
+
+def build_spectrum_table_query(
+    table_name: str,
+    columns: List[Tuple[str, str]],
+    external_schema: str,
+    store: Optional[ObjectStore] = None,
+) -> str:
+    """
+    Query to create a Spectrum table over all archived ranges, so they can
+    be queried without loading them back (`external_schema` has to exist).
+    """
+    store = store or get_object_store()
+    name = table_name.replace(".", "_")
+    definitions = ", ".join(f'"{column}" {type_}' for column, type_ in columns)
+    location = store.url(f"{get_archive_folder(table_name)}/data/")
+    return f"""
+        create external table {external_schema}.{name}{history_postfix} (
+            {definitions}
+        )
+        stored as parquet
+        location '{location}';
+    """
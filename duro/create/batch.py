@@ -0,0 +1,167 @@
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from create.connection_pool import redshift_connection
+from create.lease import Lease
+from create.maintenance import get_maintenance_scheduler
+from create.plan import CreationPlan
+from create.redshift import (
+    swap_staged_tables,
+    convert_dependent_views,
+    drop_old_tables,
+    drop_temp_table,
+)
+from create.snapshots import take_snapshot
+from create.sqlite import update_last_created, log_timestamps, reset_start
+from create.timestamps import Timestamps
+from notifications.slack import send_slack_notification
+from scheduler.query import replace_table_in_query
+from utils.global_config import GlobalConfig
+from utils.logger import setup_logger
+from utils.table import Table, temp_postfix
+
+logger = setup_logger()
+
+
+class StagedTable(NamedTuple):
+    table: Table
+    ts: Timestamps
+    fingerprint: Optional[str]
+
+
+class SwapBatch:
+    """
+    Tables of one connected part of a plan. Their temp tables are kept
+    till all tables of the batch are done and then swapped together,
+    so readers never see half of an updated lineage. Parents are built
+    from the staged temp tables of their children.
+    """
+
+    def __init__(self, tables: Set[str], order: List[str]):
+        self.pending = set(tables)
+        self.order = [name for name in order if name in tables]
+        self.staged: Dict[str, StagedTable] = {}
+        self.leases: List[Lease] = []
+        self.lock = Lock()
+
+    def __repr__(self):
+        return f"SwapBatch({self.order})"
+
+    def prepare(self, table: Table, children: List[str]):
+        with self.lock:
+            staged_children = [child for child in children if child in self.staged]
+        for child in staged_children:
+            table.query = replace_table_in_query(
+                child, f"{child}{temp_postfix}", table.query
+            )
+        table.batch = self
+
+    def stage(self, table: Table, ts: Timestamps, fingerprint: Optional[str]):
+        with self.lock:
+            self.staged[table.name] = StagedTable(table, ts, fingerprint)
+
+    def is_staged(self, name: str) -> bool:
+        with self.lock:
+            return name in self.staged
+
+    def hold(self, name: str, lease: Lease) -> bool:
+        """
+        Keeps the lease of a staged table till the batch is swapped, so
+        other ticks and creators don’t rebuild it in the meantime.
+        """
+        with self.lock:
+            if name not in self.staged:
+                return False
+            self.leases.append(lease)
+            return True
+
+    def release_leases(self):
+        with self.lock:
+            leases, self.leases = self.leases, []
+        for lease in leases:
+            lease.release()
+
+    def finish(self, name: str) -> bool:
+        """True if it was the last table of the batch"""
+        with self.lock:
+            self.pending.discard(name)
+            return not self.pending
+
+    @property
+    def staged_in_order(self) -> List[StagedTable]:
+        return [self.staged[name] for name in self.order if name in self.staged]
+
+
+def build_batches(plan: CreationPlan) -> Dict[str, SwapBatch]:
+    """Splits tables of the plan into connected parts, one batch per part"""
+    parts: Dict[str, Set[str]] = {}
+    for name in plan.tables_to_create:
+        part = {name}
+        for child in plan.children_to_create(name):
+            part |= parts.get(child, {child})
+        for member in part:
+            parts[member] = part
+
+    batches = {}
+    for part in {id(part): part for part in parts.values()}.values():
+        batch = SwapBatch(part, plan.tables_to_create)
+        for name in part:
+            batches[name] = batch
+    return batches
+
+
+def swap_batch(batch: SwapBatch, global_config: GlobalConfig):
+    try:
+        swap_staged_batch(batch, global_config)
+    finally:
+        batch.release_leases()
+
+
+# pylint: disable=no-member
+# noinspection PyUnresolvedReferences
+def swap_staged_batch(batch: SwapBatch, global_config: GlobalConfig):
+    staged = batch.staged_in_order
+    if not staged:
+        return
+
+    db = global_config.db_path
+    names = [s.table.name for s in staged]
+    snapshots = set()
+    try:
+        with redshift_connection() as connection:
+            convert_dependent_views(names, connection)
+            swap_staged_tables(names, connection)
+            for s in staged:
+                s.ts.log("replace_old")
+
+            drop_old_tables(names, connection)
+            for s in staged:
+                s.ts.log("drop_old")
+                if s.table.store_snapshots and take_snapshot(s.table, db, connection):
+                    s.ts.log("make_snapshot")
+                    snapshots.add(s.table.name)
+    except Exception as e:
+        logger.error(e)
+        discard_batch(staged, global_config)
+        send_slack_notification(str(e), f"Error while swapping {', '.join(names)}")
+        return
+
+    maintenance = get_maintenance_scheduler()
+    for s in staged:
+        # stats shouldn’t include the time spent waiting for the batch
+        duration = s.ts.tests - s.ts.start
+        update_last_created(db, s.table.name, s.ts.start, duration, s.fingerprint)
+        log_timestamps(db, s.table.name, s.ts)
+        maintenance.schedule(s.table, s.ts, s.table.name in snapshots)
+    logger.info(f"Swapped {', '.join(names)}")
+
+
+def discard_batch(staged: List[StagedTable], global_config: GlobalConfig):
+    try:
+        with redshift_connection() as connection:
+            for s in staged:
+                drop_temp_table(s.table.name, connection)
+    except Exception as e:
+        logger.error(e)
+    for s in staged:
+        reset_start(global_config.db_path, s.table.name)
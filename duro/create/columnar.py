@@ -0,0 +1,94 @@
+"""
+Parquet and Arrow files for processors. pyarrow is imported only here
+and only when a table uses a columnar `processor_format`, so duro itself
+doesn’t depend on it.
+"""
+from decimal import Decimal
+from typing import List
+
+# psycopg2 type codes are Postgres type oids
+numeric_oid = 1700
+
+
+def get_arrow_type(description):
+    import pyarrow as pa
+
+    types = {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1082: pa.date32(),
+        1114: pa.timestamp("us"),
+        1184: pa.timestamp("us", tz="UTC"),
+    }
+    if description.type_code == numeric_oid and description.precision:
+        return pa.decimal128(description.precision, description.scale or 0)
+    # unknown types (and numerics without precision) are kept as text
+    return types.get(description.type_code, pa.string())
+
+
+def build_schema(description: List):
+    import pyarrow as pa
+
+    return pa.schema(
+        [pa.field(column.name, get_arrow_type(column)) for column in description]
+    )
+
+
+def build_batch(rows: List, schema):
+    import pyarrow as pa
+
+    columns = list(zip(*rows))
+    arrays = [
+        pa.array(prepare_values(values, field.type), type=field.type)
+        for values, field in zip(columns, schema)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def prepare_values(values, arrow_type) -> List:
+    import pyarrow as pa
+
+    if arrow_type == pa.string():
+        return [None if value is None else str(value) for value in values]
+    if pa.types.is_floating(arrow_type):
+        # Redshift returns Decimal for some float expressions
+        return [float(v) if isinstance(v, Decimal) else v for v in values]
+    return list(values)
+
+
+def open_writer(filename: str, file_format: str, schema):
+    import pyarrow as pa
+
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(filename, schema)
+    # Arrow IPC file format can be memory-mapped by processors
+    return pa.ipc.new_file(filename, schema)
+
+
+def write_batches(cursor, filename: str, file_format: str, batch_size: int) -> int:
+    """Writes batches from the cursor to the file, returns the number of rows"""
+    import pyarrow as pa
+
+    rows = 0
+    # named cursors get their description after the first fetch
+    batch = cursor.fetchmany(batch_size)
+    schema = build_schema(cursor.description)
+    writer = open_writer(filename, file_format, schema)
+    try:
+        while batch:
+            record_batch = build_batch(batch, schema)
+            if file_format == "parquet":
+                writer.write_table(pa.Table.from_batches([record_batch]))
+            else:
+                writer.write_batch(record_batch)
+            rows += len(batch)
+            batch = cursor.fetchmany(batch_size)
+    finally:
+        writer.close()
+    return rows
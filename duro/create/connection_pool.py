@@ -0,0 +1,127 @@
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from threading import Condition
+from typing import Callable, List, Tuple
+
+from create.redshift import create_connection
+from utils.global_config import load_global_config
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class ConnectionPool:
+    """
+    Keeps up to `max_size` Redshift connections. Connections are checked
+    with `select 1` before reuse, reset after use, and closed after being
+    idle for more than `max_idle` seconds.
+    """
+
+    def __init__(self, connect: Callable, max_size: int = 5, max_idle: int = 300):
+        self.connect = connect
+        self.max_size = max(max_size, 1)
+        self.max_idle = max_idle
+        self.idle: List[Tuple[object, float]] = []
+        self.in_use = 0
+        self.condition = Condition()
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def acquire(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_use < self.max_size)
+            self.in_use += 1
+            self._evict_idle()
+            connection = self.idle.pop()[0] if self.idle else None
+
+        try:
+            if connection is not None and is_healthy(connection):
+                return connection
+            close_quietly(connection)
+            return self.connect()
+        except Exception:
+            with self.condition:
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, connection):
+        reusable = not connection.closed and reset_session(connection)
+        if not reusable:
+            close_quietly(connection)
+
+        with self.condition:
+            self.in_use -= 1
+            if reusable:
+                self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def close_all(self):
+        with self.condition:
+            for connection, _ in self.idle:
+                close_quietly(connection)
+            self.idle = []
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        fresh = []
+        for connection, returned in self.idle:
+            if now - returned > self.max_idle:
+                close_quietly(connection)
+            else:
+                fresh.append((connection, returned))
+        self.idle = fresh
+
+
+def is_healthy(connection) -> bool:
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("select 1")
+            cursor.fetchone()
+        return True
+    except Exception as e:
+        logger.info(f"Dropping broken Redshift connection: {e}")
+        return False
+
+
+def reset_session(connection) -> bool:
+    try:
+        if not connection.autocommit:
+            connection.rollback()
+            connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute("reset all;")
+        return True
+    except Exception as e:
+        logger.info(f"Couldn’t reset Redshift connection: {e}")
+        return False
+
+
+def close_quietly(connection):
+    if connection is None:
+        return
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+@lru_cache()
+def get_connection_pool() -> ConnectionPool:
+    global_config = load_global_config()
+    return ConnectionPool(
+        create_connection, global_config.pool_size, global_config.pool_max_idle
+    )
+
+
+def redshift_connection():
+    return get_connection_pool().connection()
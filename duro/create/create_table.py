@@ -1,52 +1,162 @@
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from typing import Optional
+
 from async_timeout import timeout
+from psycopg2.extensions import QueryCanceledError
 
+from create.connection_pool import redshift_connection
 from create.data_tests import load_tests, run_tests
+from create.maintenance import get_maintenance_scheduler
 from create.process import process_and_upload_data
 from create.redshift import (
     drop_old_table,
     drop_temp_table,
     replace_old_table,
     create_temp_table,
-    create_connection,
-    make_snapshot,
+    set_statement_timeout,
+    cancel_query,
+    terminate_backend,
+    get_inputs_fingerprint,
+    get_high_water_mark,
+    create_increment_table,
+    merge_increment,
+    transaction,
 )
+from create.snapshots import take_snapshot
 from create.sqlite import (
     update_last_created,
     log_timestamps,
     log_start,
+    log_phase,
     get_average_completion_time,
+    get_fingerprint,
+    mark_table_as_skipped,
 )
-from create.timestamps import Timestamps
+from create.timestamps import Timestamps, ProgressTimestamps
 from utils.errors import TestsFailedError, QueryTimeoutError
 from utils.file_utils import find_processor
+from utils.logger import setup_logger
 from utils.table import Table
 
+logger = setup_logger()
+
+timeout_multiplier = 5
+cancel_grace_period = 60
+
 
 def run_create_table(table: Table, db_path: str, views_path: str):
     asyncio.run(run_with_timeout(table, db_path, views_path))
 
 
-async def run_with_timeout(table: Table, db_path: str, views_path: str):
-    timeout_length = 5 * get_average_completion_time(db_path, table.name)
-    try:
-        async with timeout(timeout_length):
-            await create_table(table, db_path, views_path)
-    except asyncio.TimeoutError:
-        raise QueryTimeoutError(table, timeout_length)
+def get_timeout(db_path: str, table_name: str) -> Optional[float]:
+    average_time = get_average_completion_time(db_path, table_name)
+    if not average_time:
+        return None
+    return timeout_multiplier * average_time
 
 
 # pylint: disable=no-member
 # noinspection PyUnresolvedReferences
-async def create_table(table: Table, db_path: str, views_path: str):
-    ts = Timestamps()
-    ts.log("start")
+async def run_with_timeout(table: Table, db_path: str, views_path: str):
+    timeout_length = get_timeout(db_path, table.name)
 
+    ts = ProgressTimestamps(partial(log_phase, db_path, table.name))
+    ts.log("start")
     log_start(db_path, table.name, ts.start)
 
-    connection = create_connection()
-    ts.log("connect")
+    with ExitStack() as session:
+        connection = session.enter_context(redshift_connection())
+        ts.log("connect")
+        set_statement_timeout(connection, timeout_length)
+        backend_pid = connection.get_backend_pid()
+
+        # asyncio.run waits for threads of the default executor,
+        # and a stuck query shouldn’t keep us from failing the table
+        executor = ThreadPoolExecutor(1)
+        creation = executor.submit(
+            create_table, table, db_path, views_path, connection, ts
+        )
+        executor.shutdown(wait=False)
+        waiter = asyncio.wrap_future(creation)
+        try:
+            async with timeout(timeout_length):
+                await asyncio.shield(waiter)
+        except asyncio.TimeoutError:
+            if not await stop_creation(table, waiter, connection, backend_pid):
+                # the loop is closed by the time the thread finishes
+                waiter.cancel()
+                # the thread still uses the connection, it returns it when done
+                release = session.pop_all()
+                creation.add_done_callback(lambda _: release.close())
+            raise QueryTimeoutError(table, timeout_length)
+        except QueryCanceledError:
+            raise QueryTimeoutError(table, timeout_length)
+
+
+async def stop_creation(
+    table: Table, waiter: asyncio.Future, connection, backend_pid: int
+) -> bool:
+    """
+    Cancels the running query, or terminates its backend if the cancel
+    has no effect. Returns False if the creation thread is still running.
+    """
+    cancel_query(connection)
+    done, _ = await asyncio.wait([waiter], timeout=cancel_grace_period)
+    if not done:
+        try:
+            terminate_backend(backend_pid)
+        except Exception as e:
+            logger.error(e)
+        done, _ = await asyncio.wait([waiter], timeout=cancel_grace_period)
+    for stopped in done:
+        logger.info(f"{table.name}: {stopped.exception()}")
+    return bool(done)
+
+
+# pylint: disable=no-member
+# noinspection PyUnresolvedReferences
+def create_table(
+    table: Table, db_path: str, views_path: str, connection, ts: Timestamps
+):
+    fingerprint = None
+    if table.skip_unchanged:
+        fingerprint = get_inputs_fingerprint(table, connection)
+        if is_unchanged(table, db_path, fingerprint):
+            logger.info(f"{table.name}: inputs haven’t changed, skipping")
+            ts.log("skipped")
+            mark_table_as_skipped(db_path, table.name, ts.start)
+            log_timestamps(db_path, table.name, ts)
+            return
+
+    high_water_mark = None
+    if table.incremental and not table.force:
+        high_water_mark = get_high_water_mark(table, connection)
+
+    if high_water_mark is not None:
+        update_incrementally(table, high_water_mark, views_path, connection, ts)
+    elif rebuild_table(table, views_path, connection, ts):
+        logger.info(f"{table.name}: staged till the rest of its batch is done")
+        table.batch.stage(table, ts, fingerprint)
+        return
+
+    made_snapshot = False
+    if table.store_snapshots:
+        made_snapshot = take_snapshot(table, db_path, connection)
+        if made_snapshot:
+            ts.log("make_snapshot")
 
+    update_last_created(db_path, table.name, ts.start, ts.duration, fingerprint)
+    log_timestamps(db_path, table.name, ts)
+    get_maintenance_scheduler().schedule(table, ts, made_snapshot)
+
+
+# pylint: disable=no-member
+# noinspection PyUnresolvedReferences
+def rebuild_table(table: Table, views_path: str, connection, ts: Timestamps) -> bool:
+    """Returns True if the temp table was left for the batch swap"""
     processor = find_processor(views_path, table.name)
     if processor:
         process_and_upload_data(table, processor, connection, ts, views_path)
@@ -55,25 +165,51 @@ async def create_table(table: Table, db_path: str, views_path: str):
         ts.log("create_temp")
 
     tests = load_tests(table.name, views_path)
-    test_results, failed_tests = run_tests(tests, connection)
+    test_results, failed_tests = run_tests(tests, connection, table.combine_tests)
     ts.log("tests")
 
     if not test_results:
         drop_temp_table(table.name, connection)
         raise TestsFailedError(table.name, failed_tests)
 
+    if table.batch is not None and not processor:
+        return True
+
     replace_old_table(table.name, connection)
     ts.log("replace_old")
 
     drop_old_table(table.name, connection)
     ts.log("drop_old")
+    return False
 
-    if table.store_snapshots:
-        made_snapshot = make_snapshot(table, connection)
-        if made_snapshot:
-            ts.log("make_snapshot")
 
-    connection.close()
+def update_incrementally(
+    table: Table, high_water_mark, views_path: str, connection, ts: Timestamps
+):
+    """
+    Adds rows newer than the high-water mark (replacing rows with the same
+    unique key). Tests run on the whole merged table before the commit.
+    """
+    create_increment_table(table, high_water_mark, connection)
+    ts.log("create_temp")
 
-    update_last_created(db_path, table.name, ts.start, ts.duration)
-    log_timestamps(db_path, table.name, ts)
+    try:
+        with transaction(connection):
+            merge_increment(table, connection)
+            tests = load_tests(table.name, views_path, on_temp=False)
+            test_results, failed_tests = run_tests(
+                tests, connection, table.combine_tests
+            )
+            ts.log("tests")
+
+            if not test_results:
+                raise TestsFailedError(table.name, failed_tests)
+        ts.log("merge")
+    finally:
+        drop_temp_table(table.name, connection)
+
+
+def is_unchanged(table: Table, db_path: str, fingerprint: Optional[str]) -> bool:
+    if table.force or fingerprint is None:
+        return False
+    return fingerprint == get_fingerprint(db_path, table.name)
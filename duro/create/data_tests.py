@@ -1,5 +1,8 @@
 import os
-from typing import Tuple, List, Optional
+import re
+from typing import Tuple, List, Optional, NamedTuple, Dict
+
+import psycopg2
 
 from utils.file_utils import read_file
 from utils.logger import log_action, setup_logger
@@ -10,14 +13,15 @@ TestResults = Tuple[bool, Optional[List]]
 logger = setup_logger()
 
 
-def load_tests(table: str, path: str) -> str:
+def load_tests(table: str, path: str, on_temp: bool = True) -> str:
     has_tests, tests_file = find_tests(table, path)
     if not has_tests:
         logger.info(f"No tests for {table}")
         return ""
 
     logger.info(f"Tests file found for {table}")
-    return read_file(tests_file).replace(f"{table}", f"{table}{temp_postfix}")
+    tests = read_file(tests_file)
+    return tests.replace(f"{table}", f"{table}{temp_postfix}") if on_temp else tests
 
 
 def find_tests(table: str, path: str) -> Tuple[bool, str]:
@@ -35,13 +39,17 @@ def find_tests(table: str, path: str) -> Tuple[bool, str]:
 
 
 @log_action("run tests")
-def run_tests(tests_queries: str, connection) -> TestResults:
+def run_tests(tests_queries: str, connection, combine: bool = False) -> TestResults:
     if not tests_queries:
         return True, None
 
     with connection.cursor() as cursor:
-        queries = (q for q in tests_queries.split(";") if len(q) > 0)
+        queries = [q for q in tests_queries.split(";") if len(q) > 0]
         results = []
+        # a failed query aborts the whole transaction, so there would be
+        # nothing to fall back to
+        if combine and connection.autocommit:
+            results, queries = run_combined_tests(queries, cursor)
         for query in queries:
             cursor.execute(query)
             results.append((cursor.description[0].name, cursor.fetchone()[0]))
@@ -52,6 +60,110 @@ def run_tests(tests_queries: str, connection) -> TestResults:
     return passed, failed_columns
 
 
+class SimpleTest(NamedTuple):
+    name: str
+    expression: str
+    table: str
+    condition: Optional[str]
+
+
+simple_test_pattern = re.compile(
+    r"""^\s*select\s+(?P<expression>.+?)\s+as\s+(?P<name>\w+|"[^"]+")
+    \s+from\s+(?P<table>[\w."]+)
+    (?:\s+where\s+(?P<condition>.+?))?\s*$""",
+    re.IGNORECASE | re.DOTALL | re.VERBOSE,
+)
+# anything that can change the number of rows or needs its own scope
+unsupported_pattern = re.compile(
+    r"\b(select|from|join|group|having|order|limit|union|over)\b|--|/\*",
+    re.IGNORECASE,
+)
+aggregate_pattern = re.compile(
+    r"\b(count|sum|avg|min|max|bool_and|bool_or|every|median|listagg"
+    r"|stddev\w*|var\w*|approximate)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def parse_simple_test(query: str) -> Optional[SimpleTest]:
+    """
+    Tests like `select <expression> as <name> from <table> [where <condition>]`
+    can be combined with others. Aggregates are fine only without `where`.
+    """
+    match = simple_test_pattern.match(query)
+    if match is None:
+        return None
+
+    expression, condition = match.group("expression"), match.group("condition")
+    for part in (expression, condition or ""):
+        if unsupported_pattern.search(part) or not is_single_expression(part):
+            return None
+
+    if condition is not None and aggregate_pattern.search(expression):
+        return None
+
+    # noinspection PyArgumentList
+    return SimpleTest(match.group("name"), expression, match.group("table"), condition)
+
+
+def is_single_expression(expression: str) -> bool:
+    """Balanced parentheses and no commas outside of them"""
+    depth = 0
+    for char in expression:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth < 0 or (depth == 0 and char == ","):
+            return False
+    return depth == 0
+
+
+def build_test_column(test: SimpleTest) -> str:
+    if aggregate_pattern.search(test.expression):
+        return f"{test.expression} as {test.name}"
+    # bool_and skips nulls, but a null in a row test fails it when it runs alone
+    expression = f"coalesce({test.expression}, false)"
+    if test.condition is None:
+        return f"bool_and({expression}) as {test.name}"
+    return f"bool_and(case when {test.condition} then {expression} end) as {test.name}"
+
+
+def build_combined_tests_query(tests: List[SimpleTest]) -> str:
+    """
+    One row with all tests: each tested table is scanned once, row tests
+    pass only if they hold for all rows matching their condition.
+    """
+    by_table: Dict[str, List[SimpleTest]] = {}
+    for test in tests:
+        by_table.setdefault(test.table, []).append(test)
+
+    scans = [
+        f"""(
+            select {", ".join(build_test_column(test) for test in table_tests)}
+            from {table}
+        ) as tests_{i}"""
+        for i, (table, table_tests) in enumerate(by_table.items())
+    ]
+    return f"select * from {' cross join '.join(scans)}"
+
+
+@log_action("run combined tests")
+def run_combined_tests(queries: List[str], cursor) -> Tuple[List, List[str]]:
+    """Returns results of combined tests and queries that still have to run"""
+    tests = {query: parse_simple_test(query) for query in queries}
+    simple = [test for test in tests.values() if test is not None]
+    if len(simple) < 2:
+        return [], queries
+
+    try:
+        cursor.execute(build_combined_tests_query(simple))
+        row = cursor.fetchone()
+    except psycopg2.Error as e:
+        logger.info(f"Couldn’t combine tests, running them one by one: {e}")
+        return [], queries
+
+    results = [(column.name, value) for column, value in zip(cursor.description, row)]
+    return results, [query for query, test in tests.items() if test is None]
+
+
 def parse_tests_results(results) -> TestResults:
     passed = all((result[1] for result in results))
     if not passed:
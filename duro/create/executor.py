@@ -0,0 +1,185 @@
+from itertools import count
+from queue import PriorityQueue
+from threading import Condition, Thread
+from typing import Callable, Dict, List, Set, Optional
+
+import networkx as nx
+
+from create.batch import SwapBatch, build_batches, swap_batch
+from create.plan import CreationPlan, build_plan
+from create.priority import Priority
+from create.sqlite import mark_table_as_waiting, mark_table_as_not_waiting
+from utils.global_config import GlobalConfig
+from utils.graph_utils import get_all_successors
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+def list_tree(root: str, graph: Optional[nx.DiGraph]) -> Set[str]:
+    if graph is None or root not in graph:
+        return {root}
+    return set(get_all_successors(graph, root))
+
+
+class PriorityPool:
+    """Worker threads that always pick the queued task with the highest priority"""
+
+    def __init__(self, workers: int):
+        self.queue = PriorityQueue()
+        self.counter = count()
+        self.threads = [Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, priority: Priority, function: Callable, *args):
+        force, score = priority
+        self.queue.put(((not force, -score), next(self.counter), function, args))
+
+    def _work(self):
+        while True:
+            _, _, function, args = self.queue.get()
+            if function is None:
+                return
+            try:
+                function(*args)
+            except Exception as e:
+                logger.error(e)
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.queue.put(((True, float("inf")), next(self.counter), None, ()))
+        for thread in self.threads:
+            thread.join()
+
+
+class PlanRun:
+    """Tracks which tables of a plan are ready: all their children are done"""
+
+    def __init__(self, plan: CreationPlan, global_config: GlobalConfig):
+        self.plan = plan
+        self.global_config = global_config
+        self.batches: Dict[str, SwapBatch] = (
+            build_batches(plan) if global_config.batch_swaps else {}
+        )
+        self.pending: Dict[str, Set[str]] = {
+            name: set(plan.children_to_create(name)) for name in plan.tables_to_create
+        }
+
+    def ready(self) -> List[str]:
+        return [name for name, children in self.pending.items() if not children]
+
+    def finish(self, name: str) -> List[str]:
+        self.pending.pop(name, None)
+        unblocked = []
+        for parent in self.plan.parents(name):
+            children = self.pending.get(parent)
+            if children is not None and name in children:
+                children.discard(name)
+                if not children:
+                    unblocked.append(parent)
+        return unblocked
+
+
+class CreationExecutor:
+    """
+    Creates tables from per-tick plans in a pool of worker threads.
+    A table starts as soon as all its children from the plan are done,
+    so independent subtrees are created at the same time; ready tables
+    with higher priority start first. Roots with
+    tables still in progress are skipped and picked up on the next tick
+    if they are still due.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        on_finish: Optional[Callable] = None,
+        swap: Callable = swap_batch,
+    ):
+        self.workers = max(workers, 1)
+        self.on_finish = on_finish
+        self.swap = swap
+        self.pool = PriorityPool(self.workers)
+        self.in_progress: Set[str] = set()
+        self.lock = Condition()
+
+    def submit(
+        self, roots: List[str], global_config: GlobalConfig, create: Callable
+    ) -> CreationPlan:
+        free_roots = []
+        with self.lock:
+            for root in roots:
+                if list_tree(root, global_config.graph) & self.in_progress:
+                    logger.info(f"{root}: tree is already in progress")
+                else:
+                    free_roots.append(root)
+
+        plan = build_plan(free_roots, global_config)
+        run = PlanRun(plan, global_config)
+
+        with self.lock:
+            self.in_progress |= set(plan.tables_to_create)
+
+        for name in plan.tables_to_create:
+            if run.pending[name]:
+                mark_table_as_waiting(global_config.db_path, name)
+
+        for name in run.ready():
+            self._submit_table(run, name, create)
+
+        return plan
+
+    def _submit_table(self, run: PlanRun, name: str, create: Callable):
+        priority = run.plan.priority(name)
+        self.pool.submit(priority, self._create_table, run, name, create)
+
+    def _create_table(self, run: PlanRun, name: str, create: Callable):
+        db = run.global_config.db_path
+        node = run.plan.nodes[name]
+        batch = run.batches.get(name)
+        try:
+            mark_table_as_not_waiting(db, name)
+            if batch is not None:
+                batch.prepare(node.table, node.children)
+            create(node.table, run.global_config)
+        except Exception as e:
+            logger.error(e)
+        finally:
+            finished = {name}
+            if batch is not None and batch.finish(name):
+                self._swap(batch, run.global_config)
+                # staged tables are in progress till the swap
+                finished |= set(batch.staged)
+            elif batch is not None and batch.is_staged(name):
+                finished = set()
+
+            with self.lock:
+                self.in_progress -= finished
+                unblocked = run.finish(name)
+                self.lock.notify_all()
+
+            for parent in unblocked:
+                self._submit_table(run, parent, create)
+
+            if self.on_finish is not None:
+                self.on_finish()
+
+    def _swap(self, batch: SwapBatch, global_config: GlobalConfig):
+        try:
+            self.swap(batch, global_config)
+        except Exception as e:
+            logger.error(e)
+
+    @property
+    def busy(self) -> bool:
+        with self.lock:
+            return bool(self.in_progress)
+
+    def wait(self):
+        with self.lock:
+            self.lock.wait_for(lambda: not self.in_progress)
+
+    def shutdown(self):
+        self.wait()
+        self.pool.shutdown()
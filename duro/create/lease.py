@@ -0,0 +1,120 @@
+import os
+import socket
+import time
+from threading import Event, Lock, Thread
+from typing import Optional
+
+from create.sqlite import (
+    claim_table,
+    renew_lease,
+    release_lease,
+    claim_lock,
+    renew_lock,
+    release_lock,
+)
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+def get_creator_id(configured_id: Optional[str] = None) -> str:
+    if configured_id:
+        return configured_id
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    """
+    Lease on a table for one creator. While it’s held, a heartbeat thread
+    renews it every third of its length, so other creators can reclaim
+    the table only if this creator dies.
+    """
+
+    def __init__(self, db_str: str, table: str, owner: str, lease_seconds: int):
+        self.db_str = db_str
+        self.table = table
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.stopped = Event()
+        self.heartbeat = Thread(target=self._renew, daemon=True)
+
+    def claim(self) -> bool:
+        return claim_table(self.db_str, self.table, self.owner, self.lease_seconds)
+
+    def renew(self) -> bool:
+        return renew_lease(self.db_str, self.table, self.owner, self.lease_seconds)
+
+    def start(self):
+        self.heartbeat.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.heartbeat.join()
+
+    def release(self):
+        self.stop()
+        release_lease(self.db_str, self.table, self.owner)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def _renew(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            if not self.renew():
+                logger.error(f"{self.table}: lease was taken by another creator")
+                return
+
+
+class ClusterLock(Lease):
+    """
+    Lease on a name instead of a table, for things Redshift runs one at
+    a time per cluster (e.g., vacuum). Threads of this creator take turns
+    through a local lock, other creators sharing the db wait for the lease.
+    Unlike table leases, it can be taken again after it’s released.
+    """
+
+    def __init__(
+        self,
+        db_str: str,
+        name: str,
+        owner: str,
+        lease_seconds: int,
+        poll_seconds: float = 10,
+    ):
+        super().__init__(db_str, name, owner, lease_seconds)
+        self.poll_seconds = poll_seconds
+        self.local = Lock()
+
+    def claim(self) -> bool:
+        return claim_lock(self.db_str, self.table, self.owner, self.lease_seconds)
+
+    def renew(self) -> bool:
+        return renew_lock(self.db_str, self.table, self.owner, self.lease_seconds)
+
+    def release(self):
+        self.stop()
+        release_lock(self.db_str, self.table, self.owner)
+
+    def __enter__(self):
+        self.local.acquire()
+        try:
+            while not self.claim():
+                time.sleep(self.poll_seconds)
+        except Exception:
+            self.local.release()
+            raise
+        # threads can be started only once
+        self.stopped = Event()
+        self.heartbeat = Thread(target=self._renew, daemon=True)
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self.release()
+        finally:
+            self.local.release()
@@ -0,0 +1,216 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from create.connection_pool import redshift_connection
+from create.lease import ClusterLock, get_creator_id
+from create.sqlite import update_timestamps
+from create.timestamps import Timestamps
+from notifications.slack import send_slack_notification
+from utils.global_config import load_global_config
+from utils.logger import log_action, setup_logger
+from utils.table import Table, history_postfix
+
+logger = setup_logger()
+
+# vacuum goes first: it re-sorts rows and reclaims deleted ones,
+# so statistics collected after it are closer to what the planner sees
+maintenance_steps = ("vacuum", "analyze")
+# Redshift runs one vacuum per cluster at a time, others fail,
+# so vacuums hold a cluster lock; analyze runs concurrently
+vacuum_lock_name = "vacuum"
+
+Window = Tuple[time, time]
+
+
+class TableInfo(NamedTuple):
+    stats_off: Optional[float]
+    unsorted: Optional[float]
+    rows: Optional[int]
+    visible_rows: Optional[int]
+
+    @property
+    def deleted(self) -> float:
+        """Percent of rows that are marked for deletion but still stored"""
+        if not self.rows or self.visible_rows is None:
+            return 0
+        return max(self.rows - self.visible_rows, 0) * 100 / self.rows
+
+
+class MaintenanceTask(NamedTuple):
+    table: Table
+    ts: Timestamps
+    snapshot: bool
+
+    @property
+    def tables(self) -> List[str]:
+        history = [f"{self.table.name}{history_postfix}"] if self.snapshot else []
+        return [self.table.name, *history]
+
+
+def parse_window(window: Optional[str]) -> Optional[Window]:
+    """`01:00-06:00` → (01:00, 06:00); windows can go past midnight"""
+    if not window:
+        return None
+    try:
+        start, end = (
+            datetime.strptime(part.strip(), "%H:%M").time()
+            for part in window.split("-")
+        )
+    except ValueError:
+        raise ValueError(f"Invalid maintenance window: {window}")
+    return start, end
+
+
+def in_window(window: Optional[Window], now: time) -> bool:
+    if window is None:
+        return True
+    start, end = window
+    if start <= end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+def is_needed(mode: str, value: Optional[float], threshold: float) -> bool:
+    if mode == "always":
+        return True
+    if mode == "threshold":
+        return value is not None and value > threshold
+    return False
+
+
+def plan_steps(table: Table, info: Optional[TableInfo]) -> List[str]:
+    # empty tables aren’t listed in svv_table_info
+    info = info or TableInfo(None, None, None, None)
+    steps = []
+    worst = max(info.unsorted or 0, info.deleted)
+    if is_needed(table.vacuum, worst, table.vacuum_threshold):
+        steps.append("vacuum")
+    if is_needed(table.analyze, info.stats_off, table.analyze_threshold):
+        steps.append("analyze")
+    return steps
+
+
+@log_action("get tables info for maintenance", "table_names")
+def get_tables_info(table_names: List[str], connection) -> Dict[str, TableInfo]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            select "schema" || '.' || "table",
+                stats_off, unsorted, tbl_rows, estimated_visible_rows
+            from svv_table_info
+            where "schema" || '.' || "table" in %s
+        """,
+            (tuple(table_names),),
+        )
+        # noinspection PyArgumentList
+        return {name: TableInfo(*info) for name, *info in cursor.fetchall()}
+
+
+@log_action("run maintenance step")
+def run_step(step: str, table_name: str, connection, vacuum_lock: ClusterLock):
+    # neither vacuum nor analyze work inside transactions,
+    # connections from the pool are in autocommit mode
+    if step == "vacuum":
+        with vacuum_lock, connection.cursor() as cursor:
+            cursor.execute(f"vacuum {table_name};")
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{step} {table_name};")
+
+
+def run_maintenance(
+    task: MaintenanceTask, db_path: str, vacuum_lock: ClusterLock
+) -> List[str]:
+    """Runs needed steps for the table (and its snapshots) and logs them"""
+    done = []
+    with redshift_connection() as connection:
+        info = get_tables_info(task.tables, connection)
+        for name in task.tables:
+            for step in plan_steps(task.table, info.get(name)):
+                run_step(step, name, connection, vacuum_lock)
+                task.ts.log(step)
+                done.append(step)
+
+    events = [step for step in maintenance_steps if step in done]
+    if events:
+        update_timestamps(db_path, task.table.name, task.ts, events)
+    return events
+
+
+class MaintenanceScheduler:
+    """
+    Collects tables that were recreated and runs vacuum and analyze for
+    them in its own worker threads, only inside the maintenance window.
+    A table recreated again before its maintenance started is maintained
+    once, after the latest run.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        workers: int = 0,
+        window: Optional[str] = None,
+        creator_id: Optional[str] = None,
+        lease_seconds: int = 300,
+    ):
+        self.db_path = db_path
+        self.window = parse_window(window)
+        self.vacuum_lock = ClusterLock(
+            db_path, vacuum_lock_name, get_creator_id(creator_id), lease_seconds
+        )
+        self.pool = ThreadPoolExecutor(workers) if workers > 0 else None
+        self.pending: Dict[str, MaintenanceTask] = {}
+        self.running: Set[str] = set()
+        self.lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.pool is not None
+
+    def schedule(self, table: Table, ts: Timestamps, snapshot: bool = False):
+        if not self.enabled or table.vacuum == table.analyze == "never":
+            return
+        with self.lock:
+            # noinspection PyArgumentList
+            self.pending[table.name] = MaintenanceTask(table, ts, snapshot)
+
+    def run_pending(self, now: Optional[time] = None) -> List[str]:
+        """Starts pending tasks if we’re inside the window"""
+        if not self.enabled or not in_window(self.window, now or datetime.now().time()):
+            return []
+
+        with self.lock:
+            ready = [name for name in self.pending if name not in self.running]
+            tasks = [self.pending.pop(name) for name in ready]
+            self.running |= set(ready)
+
+        for task in tasks:
+            self.pool.submit(self._run, task)
+        return ready
+
+    def _run(self, task: MaintenanceTask):
+        try:
+            run_maintenance(task, self.db_path, self.vacuum_lock)
+        except Exception as e:
+            logger.error(e)
+            send_slack_notification(
+                str(e), f"Error while maintaining {task.table.name}"
+            )
+        finally:
+            with self.lock:
+                self.running.discard(task.table.name)
+
+
+@lru_cache()
+def get_maintenance_scheduler() -> MaintenanceScheduler:
+    global_config = load_global_config()
+    return MaintenanceScheduler(
+        global_config.db_path,
+        global_config.maintenance_workers,
+        global_config.maintenance_window,
+        global_config.creator_id,
+        global_config.lease_seconds,
+    )
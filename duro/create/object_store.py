@@ -0,0 +1,153 @@
+import os
+import shutil
+from functools import lru_cache
+from typing import List, Optional
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from credentials import s3_credentials
+
+# large files are uploaded in parts, several parts at a time
+multipart_config = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+
+class ObjectStore:
+    """
+    Minimal interface over a bucket: Redshift reads and writes data files
+    by their urls, duro itself only keeps small files (e.g., manifests).
+    """
+
+    authorization = ""
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def put(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> List[str]:
+        raise NotImplementedError
+
+    def upload(self, filename: str, key: str):
+        raise NotImplementedError
+
+    def download(self, key: str, filename: str):
+        raise NotImplementedError
+
+    def delete(self, keys: List[str]):
+        raise NotImplementedError
+
+
+class S3ObjectStore(ObjectStore):
+    def __init__(self, bucket: str, access_key_id: str, secret_access_key: str):
+        self.bucket = bucket
+        self.authorization = (
+            f"access_key_id '{access_key_id}' "
+            f"secret_access_key '{secret_access_key}'"
+        )
+        self.client = boto3.client(
+            "s3",
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+        )
+
+    def url(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def put(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise
+        return response["Body"].read()
+
+    def list(self, prefix: str) -> List[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        return [
+            item["Key"]
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix)
+            for item in page.get("Contents", [])
+        ]
+
+    def upload(self, filename: str, key: str):
+        self.client.upload_file(filename, self.bucket, key, Config=multipart_config)
+
+    def download(self, key: str, filename: str):
+        self.client.download_file(self.bucket, key, filename)
+
+    def delete(self, keys: List[str]):
+        # S3 deletes up to 1000 objects per request
+        for i in range(0, len(keys), 1000):
+            objects = [{"Key": key} for key in keys[i : i + 1000]]
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+
+class LocalObjectStore(ObjectStore):
+    """Stores objects as files in a folder, for tests and local runs"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def url(self, key: str) -> str:
+        return f"file://{self.path(key)}"
+
+    def put(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                key = os.path.relpath(os.path.join(folder, name), self.root)
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def upload(self, filename: str, key: str):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(filename, path)
+
+    def download(self, key: str, filename: str):
+        shutil.copyfile(self.path(key), filename)
+
+    def delete(self, keys: List[str]):
+        for key in keys:
+            os.remove(self.path(key))
+
+
+@lru_cache()
+def get_object_store() -> ObjectStore:
+    credentials = s3_credentials()
+    return S3ObjectStore(
+        credentials["bucket"],
+        credentials["aws_access_key_id"],
+        credentials["aws_secret_access_key"],
+    )
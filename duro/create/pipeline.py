@@ -0,0 +1,260 @@
+import csv
+import gzip
+import io
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Thread
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from create.object_store import ObjectStore
+from create.redshift import transaction
+from create.timestamps import Timestamps
+from create.venvs import processor_venv
+from utils.errors import ProcessorRunError
+from utils.logger import log_action, setup_logger
+from utils.table import Table
+
+logger = setup_logger()
+
+fetch_batch_size = 10000
+# uncompressed; gzip makes parts several times smaller
+part_bytes = 64 * 1024 * 1024
+upload_workers = 8
+# parts written but not uploaded yet, limits disk usage when S3 is slower
+max_pending_parts = 8
+
+
+class StageStats:
+    """Throughput of one pipeline stage, for tuning"""
+
+    def __init__(self, name: str, unit: str = "rows"):
+        self.name = name
+        self.unit = unit
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    def add(self, rows: int, size: int = 0):
+        self.rows += rows
+        self.bytes += size
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def __str__(self) -> str:
+        seconds = max(self.seconds, 0.001)
+        return (
+            f"{self.name}: {self.rows} {self.unit}, {self.bytes} bytes "
+            f"in {seconds:.1f}s ({self.rows / seconds:.0f} {self.unit}/s, "
+            f"{self.bytes / seconds:.0f} bytes/s)"
+        )
+
+
+def iter_csv_records(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Yields records as they are in the file. The csv reader finds where
+    they end, so quoted line breaks and escaped quotes (both "" and \\")
+    stay inside records; it reads lines only until the record is complete.
+    """
+    consumed = []
+
+    def read_lines() -> Iterator[str]:
+        for line in lines:
+            consumed.append(line)
+            yield line
+
+    for _ in csv.reader(read_lines(), delimiter=";", escapechar="\\"):
+        yield "".join(consumed)
+        consumed.clear()
+
+
+class SelectFeeder(Thread):
+    """Writes selected rows to the processor’s stdin as CSV"""
+
+    def __init__(self, query: str, connection, output, stats: StageStats, ts):
+        super().__init__(daemon=True)
+        self.query = query
+        self.connection = connection
+        self.output = output
+        self.stats = stats
+        self.ts = ts
+        self.error: Optional[Exception] = None
+
+    def run(self):
+        try:
+            with transaction(self.connection), self.connection.cursor(
+                "duro_select"
+            ) as cursor:
+                cursor.execute(self.query)
+                # named cursors get their description after the first fetch
+                batch = cursor.fetchmany(fetch_batch_size)
+                writer = csv.writer(self.output, delimiter=";", escapechar="\\")
+                writer.writerow([desc[0] for desc in cursor.description])
+                while batch:
+                    writer.writerows(batch)
+                    self.stats.add(len(batch))
+                    batch = cursor.fetchmany(fetch_batch_size)
+            self.stats.finish()
+            self.ts.log("select")
+        except BrokenPipeError:
+            # the processor stopped reading, its return code has the error
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self.output.close()
+            except OSError:
+                pass
+
+
+def write_parts(
+    records: Iterator[str], folder: str, stats: StageStats
+) -> Iterator[str]:
+    """
+    Yields gzipped parts of processed data as soon as they are written,
+    every part gets the header (COPY skips it in each file).
+    """
+    header = next(records, "")
+    part, size, index = None, 0, 0
+    for record in records:
+        if part is None:
+            path = os.path.join(folder, f"{index:04}.csv.gz")
+            part, size = gzip.open(path, "wt", compresslevel=6), 0
+            part.write(header)
+        part.write(record)
+        size += len(record)
+        stats.add(1, len(record))
+        if size >= part_bytes:
+            part.close()
+            yield path
+            part, index = None, index + 1
+
+    if part is not None:
+        part.close()
+        yield path
+    elif index == 0:
+        # manifests need at least one file
+        path = os.path.join(folder, f"{index:04}.csv.gz")
+        with gzip.open(path, "wt") as part:
+            part.write(header)
+        yield path
+    stats.finish()
+
+
+class PartsUploader:
+    """Uploads parts concurrently while the next ones are being written"""
+
+    def __init__(self, prefix: str, store: ObjectStore, stats: StageStats):
+        self.prefix = prefix
+        self.store = store
+        self.stats = stats
+        self.pool = ThreadPoolExecutor(upload_workers)
+        self.pending = BoundedSemaphore(max_pending_parts)
+        self.futures = []
+
+    def submit(self, path: str):
+        self.raise_failed()
+        # waits for uploads when too many parts are pending
+        self.pending.acquire()
+        future = self.pool.submit(self.upload, path)
+        future.add_done_callback(lambda _: self.pending.release())
+        self.futures.append(future)
+
+    def upload(self, path: str) -> Tuple[str, int]:
+        key = f"{self.prefix}{os.path.basename(path)}"
+        size = os.path.getsize(path)
+        self.store.upload(path, key)
+        os.remove(path)
+        self.stats.add(1, size)
+        return key, size
+
+    def raise_failed(self):
+        for future in self.futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+
+    def results(self) -> Tuple[List[str], List[int]]:
+        uploaded = [future.result() for future in self.futures]
+        self.stats.finish()
+        return [key for key, _ in uploaded], [size for _, size in uploaded]
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+@log_action("select, process and upload data in a pipeline")
+def run_pipeline(
+    table: Table,
+    processor_path: str,
+    views_path: str,
+    folder: str,
+    prefix: str,
+    connection,
+    store: ObjectStore,
+    ts: Timestamps,
+) -> Tuple[List[str], List[int]]:
+    """
+    Selected rows go to the processor’s stdin, and its output is cut into
+    gzipped parts that are uploaded while the processor is still running.
+    Pipes and the limit on pending parts keep fast stages from running
+    too far ahead. Returns uploaded keys and their sizes.
+    """
+    stats = [StageStats("select"), StageStats("process"), StageStats("upload", "parts")]
+    os.makedirs(folder, exist_ok=True)
+
+    stderr = tempfile.TemporaryFile("w+")
+    with processor_venv(views_path, table.name) as venv_path, stderr:
+        ts.log("venv")
+        # processors read and write files, pipes are files too
+        processor = subprocess.Popen(
+            [f"{venv_path}/bin/python", processor_path, "/dev/stdin", "/dev/stdout"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+        )
+        feeder = SelectFeeder(
+            table.query,
+            connection,
+            io.TextIOWrapper(processor.stdin, newline=""),
+            stats[0],
+            ts,
+        )
+        uploader = PartsUploader(prefix, store, stats[2])
+        try:
+            feeder.start()
+            records = iter_csv_records(io.TextIOWrapper(processor.stdout, newline=""))
+            for path in write_parts(records, folder, stats[1]):
+                uploader.submit(path)
+            processor.wait()
+            feeder.join()
+            ts.log("process")
+
+            if feeder.error is not None:
+                raise feeder.error
+            if processor.returncode != 0:
+                stderr.seek(0)
+                error_message = f"""Failed run for {venv_path}/bin/python/{processor_path}
+                stderr:
+                {stderr.read()}"""
+                raise ProcessorRunError(table.name, error_message)
+
+            uploaded = uploader.results()
+        finally:
+            if processor.poll() is None:
+                processor.kill()
+                processor.wait()
+            feeder.join()
+            uploader.close()
+
+    for stage in stats:
+        logger.info(f"{table.name}: {stage}")
+    return uploaded
@@ -0,0 +1,138 @@
+from typing import List, Dict, NamedTuple, Optional, Iterable
+
+import networkx as nx
+
+from create.priority import compute_priorities, Priority
+from create.sqlite import load_table_details, get_tables_stats
+from create.tree import should_be_created, list_children_for_table
+from utils.errors import CreationError, TableNotFoundInGraphError
+from notifications.slack import send_slack_notification
+from utils.global_config import GlobalConfig
+from utils.logger import setup_logger
+from utils.table import Table
+
+logger = setup_logger()
+
+
+class PlanNode(NamedTuple):
+    table: Table
+    children: List[str]
+    build: bool
+
+
+class CreationPlan:
+    """
+    Tables that should be checked during one creator tick: due roots and
+    all their children, each decided exactly once. `order` lists them
+    children first, so every table comes after all of its dependencies.
+    """
+
+    def __init__(
+        self,
+        roots: List[str],
+        nodes: Dict[str, PlanNode],
+        order: List[str],
+        priorities: Dict[str, Priority] = None,
+    ):
+        self.roots = roots
+        self.nodes = nodes
+        self.order = order
+        self.priorities = priorities or {}
+
+    def __len__(self):
+        return len(self.tables_to_create)
+
+    def __repr__(self):
+        return f"CreationPlan({self.roots}, {self.order})"
+
+    def __str__(self):
+        skipped = [name for name in self.order if not self.nodes[name].build]
+        created = " → ".join(self.tables_to_create) or "nothing"
+        skipped_str = f"; skip: {', '.join(skipped)}" if skipped else ""
+        return f"Plan for {', '.join(self.roots)}: create {created}{skipped_str}"
+
+    def priority(self, name: str) -> Priority:
+        return self.priorities.get(name, (False, 0))
+
+    @property
+    def tables_to_create(self) -> List[str]:
+        return [name for name in self.order if self.nodes[name].build]
+
+    def children_to_create(self, name: str) -> List[str]:
+        return [
+            child
+            for child in self.nodes[name].children
+            if child in self.nodes and self.nodes[child].build
+        ]
+
+    def parents(self, name: str) -> List[str]:
+        return [
+            parent
+            for parent in self.tables_to_create
+            if name in self.nodes[parent].children
+        ]
+
+
+def order_children_first(roots: Iterable[str], graph: Optional[nx.DiGraph]) -> List:
+    """
+    Post-order DFS from all roots: every table goes after its children.
+    Back edges of cycles are ignored instead of failing the whole plan.
+    """
+    if graph is None:
+        return list(dict.fromkeys(roots))
+
+    order, visited = [], set()
+    for root in roots:
+        if root in visited:
+            continue
+        for node in nx.dfs_postorder_nodes(graph, root):
+            if node not in visited:
+                visited.add(node)
+                order.append(node)
+    return order
+
+
+def inherited_interval(parents: List[PlanNode]) -> Optional[int]:
+    intervals = [p.table.interval for p in parents if p.table.interval is not None]
+    return min(intervals) if intervals else None
+
+
+def build_plan(roots: List[str], global_config: GlobalConfig) -> CreationPlan:
+    db, graph = global_config.db_path, global_config.graph
+    if graph is not None:
+        for root in [root for root in roots if root not in graph]:
+            error = TableNotFoundInGraphError(root)
+            logger.error(error)
+            send_slack_notification(error.message, f"Error while creating {root}")
+        roots = [root for root in roots if root in graph]
+
+    order = order_children_first(roots, graph)
+
+    nodes: Dict[str, PlanNode] = {}
+    for name in reversed(order):
+        parents = [
+            nodes[parent]
+            for parent in (graph.predecessors(name) if graph is not None else [])
+            if parent in nodes and nodes[parent].build
+        ]
+        if name not in roots and not parents:
+            continue
+
+        try:
+            table = load_table_details(db, name)
+        except CreationError as e:
+            logger.error(e)
+            send_slack_notification(e.message, f"Error while creating {e.table}")
+            continue
+
+        table.interval = table.interval or inherited_interval(parents)
+        build = should_be_created(db, table, global_config.lease_seconds)
+        children = list_children_for_table(name, graph) if graph is not None else []
+        nodes[name] = PlanNode(table, children, build)
+
+    priorities = compute_priorities(nodes.keys(), graph, get_tables_stats(db))
+    plan = CreationPlan(
+        roots, nodes, [name for name in order if name in nodes], priorities
+    )
+    logger.info(str(plan))
+    return plan
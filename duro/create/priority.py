@@ -0,0 +1,84 @@
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import arrow
+import networkx as nx
+
+from create.sqlite import TableStats
+
+Priority = Tuple[bool, float]
+
+# seconds added to every expected duration, so tables without any history
+# are still ordered by blocked roots and by how overdue they are
+base_duration = 60
+max_overdue_ratio = 10
+
+
+def expected_path(
+    name: str,
+    graph: Optional[nx.DiGraph],
+    stats: Dict[str, TableStats],
+    memo: Dict[str, float],
+    visiting: Set[str] = None,
+) -> float:
+    """
+    Expected time (based on history) from the start of this table till the
+    end of the longest chain of tables that depend on it and have to be
+    recreated after it.
+    """
+    if name in memo:
+        return memo[name]
+
+    visiting = (visiting or set()) | {name}
+    dependents = graph.predecessors(name) if graph is not None and name in graph else []
+    longest = max(
+        (
+            expected_path(dependent, graph, stats, memo, visiting)
+            for dependent in dependents
+            if dependent not in visiting
+        ),
+        default=0,
+    )
+
+    duration = stats[name].duration if name in stats else None
+    memo[name] = (duration or 0) + longest
+    return memo[name]
+
+
+def count_blocked_roots(name: str, graph: Optional[nx.DiGraph]) -> int:
+    if graph is None or name not in graph:
+        return 1
+    dependents = nx.ancestors(graph, name) | {name}
+    return sum(1 for node in dependents if graph.in_degree(node) == 0)
+
+
+def overdue_ratio(table_stats: Optional[TableStats], now: int) -> float:
+    if table_stats is None or not table_stats.interval:
+        return 0
+    if table_stats.last_created is None:
+        return 1
+    minutes_since_created = (now - table_stats.last_created) / 60
+    overdue = max(minutes_since_created - table_stats.interval, 0)
+    return min(overdue / table_stats.interval, max_overdue_ratio)
+
+
+def compute_priorities(
+    tables: Iterable[str], graph: Optional[nx.DiGraph], stats: Dict[str, TableStats]
+) -> Dict[str, Priority]:
+    """
+    Tables with the force flag go first, the rest are ordered by their
+    score: long chains of dependent tables, many roots waiting for the
+    table, and being overdue all make it start earlier.
+    """
+    now = arrow.now().timestamp
+    memo: Dict[str, float] = {}
+    priorities = {}
+    for name in tables:
+        table_stats = stats.get(name)
+        score = (
+            (expected_path(name, graph, stats, memo) + base_duration)
+            * (1 + count_blocked_roots(name, graph))
+            * (1 + overdue_ratio(table_stats, now))
+        )
+        force = bool(table_stats and table_stats.force)
+        priorities[name] = (force, score)
+    return priorities
@@ -1,85 +1,315 @@
 import csv
+import gzip
+import json
 import os
+import shutil
 import subprocess
-from typing import List, Dict, Tuple
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Tuple, NamedTuple, List, Optional
 
 import arrow
 import psycopg2
-import boto3
 
+from create.archive import escape_quotes
+from create.columnar import write_batches
+from create.object_store import ObjectStore, get_object_store
+from create.pipeline import iter_csv_records, run_pipeline
+from create.redshift import transaction
+from create.stream import stream_through_processor
 from create.timestamps import Timestamps
+from create.venvs import processor_venv
 from credentials import s3_credentials
 from utils.errors import RedshiftCopyError, ProcessorRunError
-from utils.file_utils import load_ddl_query, find_requirements_txt
-from utils.logger import log_action
+from utils.file_utils import load_ddl_query
+from utils.logger import log_action, setup_logger
 from utils.table import Table, temp_postfix
 
+logger = setup_logger()
+
+select_batch_size = 10000
+download_workers = 8
+upload_workers = 8
+# smaller parts make COPY slower than loading one file
+min_part_bytes = 16 * 1024 * 1024
+
+
+class SelectStats(NamedTuple):
+    rows: int
+    bytes: int
+
 
 def process_and_upload_data(
     table: Table, processor_path: str, connection, ts: Timestamps, views_path: str
 ):
-    data = select_data(table.query, connection)
-
     folder = s3_credentials()["folder"]
     os.makedirs(folder, exist_ok=True)
-    selected, processed = build_filenames(folder, table.name)
-    save_selected_to_csv(data, selected)
-    ts.log("select")
+    selected, processed = build_filenames(folder, table.name, table.processor_format)
+    parts_folder = f"{os.path.splitext(processed)[0]}_parts"
+    store = get_object_store()
+    prefix = f"processed/{os.path.basename(parts_folder)}/"
+    try:
+        if table.processor_mode == "pipe":
+            keys, sizes = run_pipeline(
+                table,
+                processor_path,
+                views_path,
+                parts_folder,
+                prefix,
+                connection,
+                store,
+                ts,
+            )
+        else:
+            parts = process_to_parts(
+                table,
+                processor_path,
+                views_path,
+                selected,
+                processed,
+                parts_folder,
+                connection,
+                ts,
+            )
+            keys = upload_parts(parts, prefix, store)
+            sizes = [os.path.getsize(part) for part in parts]
+        shutil.rmtree(parts_folder, ignore_errors=True)
+        manifest_key = write_manifest(keys, sizes, prefix, store)
+        ts.log("s3")
+
+        drop_and_create_query = build_drop_and_create_query(table, views_path)
+        copy_to_redshift(
+            store.url(manifest_key),
+            table.name,
+            connection,
+            drop_and_create_query,
+            store,
+            "parquet" if table.processor_format != "csv" else "csv",
+        )
+        ts.log("insert")
+    finally:
+        shutil.rmtree(parts_folder, ignore_errors=True)
+        # parts uploaded before a failure too
+        store.delete(store.list(prefix))
+    ts.log("clean_csv")
 
-    run_processor(views_path, processor_path, table.name, selected, processed)
+
+def process_to_parts(
+    table: Table,
+    processor_path: str,
+    views_path: str,
+    selected: str,
+    processed: str,
+    parts_folder: str,
+    connection,
+    ts: Timestamps,
+) -> List[str]:
+    if table.processor_mode == "stream":
+        rows = stream_through_processor(
+            table, processor_path, views_path, processed, connection, ts
+        )
+        logger.info(f"{table.name}: processor returned {rows} rows")
+        outputs = [processed]
+    else:
+        outputs = select_and_run_processor(
+            table, processor_path, views_path, selected, processed, connection, ts
+        )
     ts.log("process")
 
-    upload_to_s3(processed)
-    ts.log("s3")
+    if table.processor_format == "csv" and table.parallel > 1:
+        # outputs of chunks become parts as they are
+        parts = compress_to_parts(outputs, parts_folder)
+    elif table.processor_format == "csv":
+        parts_count = get_parts_count(processed, table.upload_parts, connection)
+        parts = split_to_parts(processed, parts_folder, parts_count)
+        os.remove(processed)
+    else:
+        # columnar processors write Parquet, it’s compressed already
+        os.makedirs(parts_folder, exist_ok=True)
+        parts = [shutil.move(processed, parts_folder)]
+    ts.log("csv")
+    return parts
 
-    os.remove(selected)
-    os.remove(processed)
 
-    drop_and_create_query = build_drop_and_create_query(table, views_path)
-    copy_to_redshift(processed, table.name, connection, drop_and_create_query)
-    ts.log("insert")
+def select_and_run_processor(
+    table: Table,
+    processor_path: str,
+    views_path: str,
+    selected: str,
+    processed: str,
+    connection,
+    ts: Timestamps,
+) -> List[str]:
+    if table.export == "unload":
+        stats = unload_to_csv(table.query, selected, connection)
+    elif table.processor_format != "csv":
+        stats = select_to_columnar(
+            table.query, selected, connection, table.processor_format
+        )
+    else:
+        stats = select_to_csv(table.query, selected, connection)
+    logger.info(f"{table.name}: selected {stats.rows} rows, {stats.bytes} bytes")
+    ts.log("select")
+
+    if table.parallel > 1:
+        outputs = run_processor_in_chunks(
+            views_path,
+            processor_path,
+            table.name,
+            selected,
+            processed,
+            table.parallel,
+            ts,
+        )
+    else:
+        run_processor(views_path, processor_path, table.name, selected, processed, ts)
+        outputs = [processed]
+    os.remove(selected)
+    return outputs
 
 
 @log_action("select data for processing")
-def select_data(query: str, connection) -> List[Dict]:
-    with connection.cursor() as cursor:
+def select_to_csv(
+    query: str, filename: str, connection, batch_size: int = select_batch_size
+) -> SelectStats:
+    """
+    Streams rows from a server-side cursor into the CSV file, so only one
+    batch of rows is in memory at a time. Redshift keeps cursors only
+    inside transactions.
+    """
+    rows = 0
+    with transaction(connection), connection.cursor("duro_select") as cursor:
         cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor]
+        # named cursors get their description after the first fetch
+        batch = cursor.fetchmany(batch_size)
+        with open(filename, "w") as output_file:
+            writer = csv.writer(output_file, delimiter=";", escapechar="\\")
+            writer.writerow([desc[0] for desc in cursor.description])
+            while batch:
+                writer.writerows(batch)
+                rows += len(batch)
+                batch = cursor.fetchmany(batch_size)
+
+    return SelectStats(rows, os.path.getsize(filename))
+
+
+@log_action("select data for processing to columnar file")
+def select_to_columnar(
+    query: str,
+    filename: str,
+    connection,
+    file_format: str,
+    batch_size: int = select_batch_size,
+) -> SelectStats:
+    """
+    Like `select_to_csv`, but writes Parquet or Arrow IPC file, with
+    column types from Redshift instead of text.
+    """
+    with transaction(connection), connection.cursor("duro_select") as cursor:
+        cursor.execute(query)
+        rows = write_batches(cursor, filename, file_format, batch_size)
+
+    return SelectStats(rows, os.path.getsize(filename))
+
+
+@log_action("unload data for processing")
+def unload_to_csv(
+    query: str, filename: str, connection, store: Optional[ObjectStore] = None
+) -> SelectStats:
+    """
+    Every slice unloads its part of the results to gzipped CSV in S3,
+    parts are downloaded concurrently and joined into one CSV file
+    (with one header) for the processor.
+    """
+    store = store or get_object_store()
+    name = os.path.splitext(os.path.basename(filename))[0]
+    prefix = f"unload/{name}/"
+    rows = unload_query(query, store.url(prefix), store, connection)
+
+    keys = store.list(prefix)
+    parts_folder = f"{os.path.splitext(filename)[0]}_parts"
+    os.makedirs(parts_folder, exist_ok=True)
+    try:
+        parts = download_parts(keys, parts_folder, store)
+        join_csv_parts(parts, filename)
+    finally:
+        shutil.rmtree(parts_folder, ignore_errors=True)
+        store.delete(keys)
+
+    return SelectStats(rows, os.path.getsize(filename))
+
+
+@log_action("unload query to S3")
+def unload_query(query: str, url: str, store: ObjectStore, connection) -> int:
+    query = escape_quotes(query.strip().rstrip(";"))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            unload ('{query}')
+            to '{url}'
+            {store.authorization}
+            format as csv
+            delimiter ';'
+            header
+            gzip
+            parallel on;
+        """
+        )
+        cursor.execute("select pg_last_unload_count();")
+        return cursor.fetchone()[0]
+
+
+@log_action("download unloaded parts")
+def download_parts(keys: List[str], folder: str, store: ObjectStore) -> List[str]:
+    filenames = [os.path.join(folder, os.path.basename(key)) for key in keys]
+    with ThreadPoolExecutor(download_workers) as pool:
+        # list() re-raises the first failed download
+        list(pool.map(store.download, keys, filenames))
+    return filenames
 
 
-def build_filenames(folder: str, table_name: str) -> Tuple[str, str]:
+def join_csv_parts(parts: List[str], filename: str):
+    """Concatenates gzipped CSV parts, keeping only the first header"""
+    with open(filename, "w") as output_file:
+        for i, part in enumerate(parts):
+            with gzip.open(part, "rt") as part_file:
+                header = part_file.readline()
+                if i == 0:
+                    output_file.write(header)
+                shutil.copyfileobj(part_file, output_file)
+
+
+def build_filenames(
+    folder: str, table_name: str, file_format: str = "csv"
+) -> Tuple[str, str]:
     current_time = arrow.now().strftime("%Y-%m-%d-%H-%M")
-    selected_filename = f"{folder}/{table_name}_select-{current_time}.csv"
-    processed_filename = f"{folder}/{table_name}-{current_time}.csv"
+    # processors always return columnar data as Parquet
+    output_format = "csv" if file_format == "csv" else "parquet"
+    selected_filename = f"{folder}/{table_name}_select-{current_time}.{file_format}"
+    processed_filename = f"{folder}/{table_name}-{current_time}.{output_format}"
     return selected_filename, processed_filename
 
 
-@log_action("create virtual environment and run processor")
+@log_action("prepare virtual environment and run processor")
 def run_processor(
     views_path: str,
     processor_path: str,
     table_name: str,
     selected_filename: str,
     processed_filename: str,
+    ts: Optional[Timestamps] = None,
 ):
-    venv_path = f"./venvs/{table_name}"
-    venv_creation_result = subprocess.run(["python3", "-m", "venv", venv_path])
-    if venv_creation_result.returncode != 0:
-        error_message = f"Couldn’t create venv: {venv_creation_result.stderr}"
-        raise ProcessorRunError(table_name, error_message)
-
-    requirements = find_requirements_txt(views_path, table_name)
-    if requirements:
-        subprocess.run([f"{venv_path}/bin/pip", "install", "-r", requirements])
-    run_result = subprocess.run(
-        [
-            f"{venv_path}/bin/python",
-            processor_path,
-            selected_filename,
-            processed_filename,
-        ]
-    )
+    with processor_venv(views_path, table_name) as venv_path:
+        if ts is not None:
+            ts.log("venv")
+        run_result = subprocess.run(
+            [
+                f"{venv_path}/bin/python",
+                processor_path,
+                selected_filename,
+                processed_filename,
+            ]
+        )
 
     if run_result.returncode != 0:
         error_message = f"""Failed run for {venv_path}/bin/python/{processor_path}
@@ -90,26 +320,180 @@ def run_processor(
         raise ProcessorRunError(table_name, error_message)
 
 
-@log_action("save selected data to CSV")
-def save_selected_to_csv(data: List[Dict], filename: str):
-    columns = data[0].keys()
-    with open(filename, "w") as output_file:
-        dict_writer = csv.DictWriter(
-            output_file, columns, delimiter=";", escapechar="\\"
-        )
-        dict_writer.writeheader()
-        dict_writer.writerows(data)
+@log_action("run processor on chunks in parallel", "table_name")
+def run_processor_in_chunks(
+    views_path: str,
+    processor_path: str,
+    table_name: str,
+    selected_filename: str,
+    processed_filename: str,
+    chunks_count: int,
+    ts: Optional[Timestamps] = None,
+) -> List[str]:
+    """
+    For processors that handle every row independently: selected data is
+    split into chunks, and the processor runs on all of them at once in
+    separate processes. Returns the output of every chunk.
+    """
+    chunks = split_to_chunks(selected_filename, chunks_count)
+    name = os.path.splitext(processed_filename)[0]
+    outputs = [f"{name}_chunk{i:02}.csv" for i in range(len(chunks))]
+    stderrs = [tempfile.TemporaryFile("w+") for _ in chunks]
+    try:
+        with processor_venv(views_path, table_name) as venv_path:
+            if ts is not None:
+                ts.log("venv")
+            processes = [
+                subprocess.Popen(
+                    [f"{venv_path}/bin/python", processor_path, chunk, output],
+                    stderr=stderr,
+                )
+                for chunk, output, stderr in zip(chunks, outputs, stderrs)
+            ]
+            failed = wait_for_chunks(processes)
+
+        if failed is not None:
+            stderrs[failed].seek(0)
+            error_message = f"""Failed run for {venv_path}/bin/python/{processor_path}
+            on chunk {failed} of {len(chunks)}
+            stderr:
+            {stderrs[failed].read()}"""
+            raise ProcessorRunError(table_name, error_message)
+    except Exception:
+        for output in outputs:
+            if os.path.exists(output):
+                os.remove(output)
+        raise
+    finally:
+        for chunk, stderr in zip(chunks, stderrs):
+            os.remove(chunk)
+            stderr.close()
+    return outputs
+
+
+def wait_for_chunks(processes: List[subprocess.Popen]) -> Optional[int]:
+    """Returns the index of the first failed chunk, other chunks are stopped"""
+    with ThreadPoolExecutor(len(processes)) as pool:
+        futures = {pool.submit(process.wait): i for i, process in enumerate(processes)}
+        for future in as_completed(futures):
+            if future.result() != 0:
+                for process in processes:
+                    if process.poll() is None:
+                        process.kill()
+                return futures[future]
+    return None
+
+
+def split_to_chunks(filename: str, chunks_count: int) -> List[str]:
+    """
+    Splits CSV into chunks of about the same size, keeping the order
+    of rows, every chunk gets the header.
+    """
+    name = os.path.splitext(filename)[0]
+    chunks = []
+    chunk_file = None
+    try:
+        with open(filename, newline="") as input_file:
+            records = iter_csv_records(input_file)
+            header = next(records, "")
+            data_size = os.path.getsize(filename) - len(header.encode())
+            chunk_size = max(data_size, 1) / chunks_count
+            written = 0
+            for record in records:
+                index = min(int(written // chunk_size), chunks_count - 1)
+                # wide rows can make it skip indexes
+                if index >= len(chunks):
+                    if chunk_file is not None:
+                        chunk_file.close()
+                    chunks.append(f"{name}_chunk{len(chunks):02}.csv")
+                    chunk_file = open(chunks[-1], "w", newline="")
+                    chunk_file.write(header)
+                chunk_file.write(record)
+                written += len(record.encode())
+    finally:
+        if chunk_file is not None:
+            chunk_file.close()
+
+    if not chunks:
+        # processors still get a file with the header
+        chunks.append(f"{name}_chunk00.csv")
+        shutil.copyfile(filename, chunks[0])
+    return chunks
+
+
+def compress_to_parts(filenames: List[str], folder: str) -> List[str]:
+    os.makedirs(folder, exist_ok=True)
+    parts = []
+    for i, filename in enumerate(filenames):
+        parts.append(os.path.join(folder, f"{i:04}.csv.gz"))
+        with open(filename, "rb") as input_file, gzip.open(
+            parts[-1], "wb", compresslevel=6
+        ) as part_file:
+            shutil.copyfileobj(input_file, part_file)
+        os.remove(filename)
+    return parts
+
 
+def get_parts_count(filename: str, upload_parts: int, connection) -> int:
+    """
+    COPY loads files in parallel, one file per slice, so by default
+    there are as many parts as slices in the cluster.
+    """
+    parts = upload_parts or get_slices_count(connection)
+    return max(1, min(parts, os.path.getsize(filename) // min_part_bytes))
 
-@log_action("upload processed data to CSV")
-def upload_to_s3(filename: str):
-    client = boto3.client(
-        "s3",
-        aws_access_key_id=s3_credentials()["aws_access_key_id"],
-        aws_secret_access_key=s3_credentials()["aws_secret_access_key"],
-    )
 
-    client.upload_file(filename, s3_credentials()["bucket"], filename)
+def get_slices_count(connection) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute("select count(*) from stv_slices;")
+        return cursor.fetchone()[0]
+
+
+@log_action("split processed data into gzipped parts")
+def split_to_parts(filename: str, folder: str, parts_count: int) -> List[str]:
+    """
+    Rows go to parts round-robin, every part gets the header
+    (COPY skips it in each file).
+    """
+    os.makedirs(folder, exist_ok=True)
+    parts = [os.path.join(folder, f"{i:04}.csv.gz") for i in range(parts_count)]
+    files = [gzip.open(part, "wt", compresslevel=6, newline="") for part in parts]
+    try:
+        with open(filename, newline="") as input_file:
+            records = iter_csv_records(input_file)
+            header = next(records, "")
+            for file in files:
+                file.write(header)
+            for i, record in enumerate(records):
+                files[i % parts_count].write(record)
+    finally:
+        for file in files:
+            file.close()
+    return parts
+
+
+@log_action("upload processed data to S3")
+def upload_parts(parts: List[str], prefix: str, store: ObjectStore) -> List[str]:
+    keys = [f"{prefix}{os.path.basename(part)}" for part in parts]
+    with ThreadPoolExecutor(upload_workers) as pool:
+        # list() re-raises the first failed upload
+        list(pool.map(store.upload, parts, keys))
+    return keys
+
+
+def write_manifest(
+    keys: List[str], sizes: List[int], prefix: str, store: ObjectStore
+) -> str:
+    # content_length is required for Parquet files
+    manifest = {
+        "entries": [
+            {"url": store.url(key), "mandatory": True, "meta": {"content_length": size}}
+            for key, size in zip(keys, sizes)
+        ]
+    }
+    manifest_key = f"{prefix}manifest.json"
+    store.put(manifest_key, json.dumps(manifest).encode())
+    return manifest_key
 
 
 @log_action("build query to drop old table and create a new one")
@@ -129,8 +513,20 @@ def build_drop_and_create_query(table: Table, views_path: str):
 
 @log_action("insert processed data into Redshift table")
 def copy_to_redshift(
-    filename: str, table_name: str, connection, drop_and_create_query: str
+    manifest_url: str,
+    table_name: str,
+    connection,
+    drop_and_create_query: str,
+    store: ObjectStore,
+    file_format: str = "csv",
 ):
+    if file_format == "parquet":
+        format_options = "format as parquet"
+    else:
+        format_options = """gzip
+                delimiter ';'
+                ignoreheader 1
+                emptyasnull blanksasnull csv"""
     try:
         with connection.cursor() as cursor:
             cursor.execute(drop_and_create_query)
@@ -138,12 +534,10 @@ def copy_to_redshift(
             cursor.execute(
                 f"""
                 COPY {table_name}{temp_postfix} 
-                FROM 's3://{s3_credentials()["bucket"]}/{filename}'
-                access_key_id '{s3_credentials()["aws_access_key_id"]}'
-                secret_access_key '{s3_credentials()["aws_secret_access_key"]}'
-                delimiter ';'
-                ignoreheader 1
-                emptyasnull blanksasnull csv;
+                FROM '{manifest_url}'
+                {store.authorization}
+                manifest
+                {format_options};
             """
             )
 
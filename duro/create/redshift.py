@@ -1,12 +1,26 @@
+import hashlib
+import json
+import time
+from contextlib import contextmanager
 from datetime import timedelta
-from typing import Tuple, List
+from functools import lru_cache
+from threading import Lock
+from typing import Tuple, List, Optional, Dict, Set
 
 import arrow
 import psycopg2
 from psycopg2.errorcodes import WRONG_OBJECT_TYPE, UNDEFINED_TABLE, UNDEFINED_COLUMN
 
+from create.archive import archive_expiring_rows
 from credentials import redshift_credentials
-from utils.errors import TableCreationError, RedshiftConnectionError
+from notifications.slack import send_slack_notification
+from scheduler.query import find_tables_in_query
+from utils.errors import (
+    TableCreationError,
+    RedshiftConnectionError,
+    FreshnessQueryError,
+)
+from utils.global_config import load_global_config
 from utils.logger import log_action
 from utils.table import Table, temp_postfix, history_postfix, old_postfix
 
@@ -21,6 +35,32 @@ def create_connection():
         raise RedshiftConnectionError
 
 
+@log_action("set statement timeout")
+def set_statement_timeout(connection, seconds: Optional[float]):
+    if not seconds:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"set statement_timeout to {int(seconds * 1000)};")
+
+
+@log_action("cancel running query")
+def cancel_query(connection):
+    # sends a cancel request to the backend, so Redshift frees the slot
+    # even though the query is being run in another thread
+    connection.cancel()
+
+
+@log_action("terminate backend running the query")
+def terminate_backend(pid: int):
+    # the running query holds the lock of its own connection, so we need another
+    connection = create_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("select pg_terminate_backend(%s);", (pid,))
+    finally:
+        connection.close()
+
+
 @log_action("create temporary table")
 def create_temp_table(table: Table, connection) -> int:
     create_query = table.get_query_with_dist_sort_keys()
@@ -38,6 +78,62 @@ def create_temp_table(table: Table, connection) -> int:
     return arrow.now().timestamp
 
 
+@log_action("get high-water mark")
+def get_high_water_mark(table: Table, connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'select max("{table.incremental_key}") from {table.name}')
+            return cursor.fetchone()[0]
+    except psycopg2.ProgrammingError as e:
+        if e.pgcode in (UNDEFINED_TABLE, UNDEFINED_COLUMN):
+            return None
+        raise
+
+
+@log_action("create table with new rows")
+def create_increment_table(table: Table, high_water_mark, connection):
+    try:
+        with connection.cursor() as cursor:
+            # queries may contain `%`, so the mark is quoted separately
+            literal = cursor.mogrify("%s", (high_water_mark,)).decode()
+            cursor.execute(f"drop table if exists {table.name}{temp_postfix};")
+            cursor.execute(table.get_increment_query(literal))
+    except psycopg2.ProgrammingError as e:
+        raise TableCreationError(table, str(e))
+
+
+@log_action("merge new rows")
+def merge_increment(table: Table, connection):
+    increment = f"{table.name}{temp_postfix}"
+    try:
+        with connection.cursor() as cursor:
+            if table.unique_key:
+                cursor.execute(
+                    f"""
+                    delete from {table.name}
+                    using {increment}
+                    where {table.name}."{table.unique_key}"
+                        = {increment}."{table.unique_key}";
+                """
+                )
+            cursor.execute(f"insert into {table.name} select * from {increment};")
+    except psycopg2.ProgrammingError as e:
+        raise TableCreationError(table, str(e))
+
+
+@contextmanager
+def transaction(connection):
+    connection.autocommit = False
+    try:
+        yield
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.autocommit = True
+
+
 @log_action("drop temporary table")
 def drop_temp_table(table_name: str, connection):
     drop_table(f"{table_name}{temp_postfix}", connection)
@@ -56,43 +152,177 @@ def drop_table(table_name: str, connection):
 
 @log_action("updating dependent views")
 def update_dependent_views(table_name: str, connection):
-    schema, table = table_name.split(".")
-    dependencies = get_dependencies(schema, table, connection)
+    dependencies = get_dependent_views_index().get(table_name, connection)
     if not dependencies:
         return
 
+    dependencies = get_current_definitions(dependencies, connection)
+
+    table = table_name.split(".")[-1]
     for view_name, old_definition in dependencies:
         definition = old_definition.replace(table, f"{table}{temp_postfix}").rstrip(";")
         update_view(view_name, definition, connection)
 
 
+# this is `information_schema.view_table_usage` without filtering by current user
+dependencies_query = """
+    select distinct nt.nspname + '.' + t.relname as table_name,
+        nv.nspname + '.' + v.relname as view_name,
+        pg_get_viewdef(v.oid) as view_definition
+    from pg_namespace nv, pg_class v, pg_depend dv,
+        pg_depend dt, pg_class t, pg_namespace nt
+    where nv.oid = v.relnamespace
+        and v.relkind = 'v'
+        and v.oid = dv.refobjid
+        and dv.refclassid = 'pg_class'::regclass::oid
+        and dv.classid = 'pg_rewrite'::regclass::oid
+        and dv.deptype = 'i'
+        and dv.objid = dt.objid
+        and dv.refobjid <> dt.refobjid
+        and dt.classid = 'pg_rewrite'::regclass::oid
+        and dt.refclassid = 'pg_class'::regclass::oid
+        and dt.refobjid = t.oid
+        and t.relnamespace = nt.oid
+        and (t.relkind = 'r' or t.relkind = 'v')
+"""
+
+
 @log_action("getting dependent views")
-def get_dependencies(schema_name: str, table_name: str, connection) -> List[Tuple[str, str]]:
-    # this is `information_schema.view_table_usage` without filtering by current user
+def get_dependencies(
+    schema_name: str, table_name: str, connection
+) -> List[Tuple[str, str]]:
     query = f"""
-        select distinct nv.nspname + '.' + v.relname as view_name,
-            pg_get_viewdef(v.oid) as view_definition
-        from pg_user, pg_namespace nv, pg_class v, pg_depend dv, 
-            pg_depend dt, pg_class t, pg_namespace nt
-        where nv.oid = v.relnamespace
-            and v.relkind = 'v'
-            and v.oid = dv.refobjid
-            and dv.refclassid = 'pg_class'::regclass::oid
-            and dv.classid = 'pg_rewrite'::regclass::oid
-            and dv.deptype = 'i'
-            and dv.objid = dt.objid
-            and dv.refobjid <> dt.refobjid
-            and dt.classid = 'pg_rewrite'::regclass::oid
-            and dt.refclassid = 'pg_class'::regclass::oid
-            and dt.refobjid = t.oid
-            and t.relnamespace = nt.oid
-            and (t.relkind = 'r' or t.relkind = 'v')
+        {dependencies_query}
             and nt.nspname = '{schema_name}'
-            and t.relname = '{table_name}'; 
+            and t.relname = '{table_name}';
     """
     with connection.cursor() as cursor:
         cursor.execute(query)
-        return cursor.fetchall()
+        return [(view, definition) for _, view, definition in cursor.fetchall()]
+
+
+@log_action("getting all dependent views")
+def get_all_dependencies(connection) -> Dict[str, List[Tuple[str, str]]]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"{dependencies_query};")
+        dependencies = {}
+        for table, view, definition in cursor.fetchall():
+            dependencies.setdefault(table, []).append((view, definition))
+        return dependencies
+
+
+def get_current_definitions(
+    views: List[Tuple[str, str]], connection
+) -> List[Tuple[str, str]]:
+    """
+    Definitions in the index can be old, views are rewritten from their
+    current definitions (views dropped since then are skipped).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            select schemaname || '.' || viewname, definition
+            from pg_views
+            where schemaname || '.' || viewname in %s
+        """,
+            (tuple(name for name, _ in views),),
+        )
+        current = dict(cursor.fetchall())
+    return [(name, current[name]) for name, _ in views if name in current]
+
+
+class DependentViewsIndex:
+    """
+    Views depending on each table (by `schema.table`), fetched from the
+    catalog when a new plan starts or when they are older than `max_age`
+    seconds. Tables whose views Duro rewrote are fetched again on the
+    next lookup.
+
+    With `late_binding`, dependent views are converted to late-binding
+    views, which don’t depend on tables and don’t need rewrites on swaps.
+    """
+
+    def __init__(self, late_binding: bool = False, max_age: int = 600):
+        self.views: Optional[Dict[str, List[Tuple[str, str]]]] = None
+        self.fetched_at = 0.0
+        self.max_age = max_age
+        self.stale: Set[str] = set()
+        self.late_binding = late_binding
+        self.unconvertible: Set[str] = set()
+        self.lock = Lock()
+
+    def reset(self):
+        with self.lock:
+            self.views = None
+            self.stale = set()
+
+    def get(self, table_name: str, connection) -> List[Tuple[str, str]]:
+        with self.lock:
+            if self.views is None or time.monotonic() - self.fetched_at > self.max_age:
+                self.views = get_all_dependencies(connection)
+                self.fetched_at = time.monotonic()
+                self.stale = set()
+            if table_name in self.stale:
+                schema, table = table_name.split(".")
+                self.views[table_name] = get_dependencies(schema, table, connection)
+                self.stale.discard(table_name)
+            return list(self.views.get(table_name, []))
+
+    def invalidate_view(self, view_name: str):
+        with self.lock:
+            if self.views is None:
+                return
+            for table_name, views in self.views.items():
+                if any(name == view_name for name, _ in views):
+                    self.stale.add(table_name)
+
+
+@lru_cache()
+def get_dependent_views_index() -> DependentViewsIndex:
+    return DependentViewsIndex(load_global_config().late_binding_views)
+
+
+@log_action("convert dependent views to late-binding", "table_names")
+def convert_dependent_views(table_names: List[str], connection) -> List[str]:
+    """
+    Recreates views depending on these tables `with no schema binding`.
+    Must run outside of transactions: failed views are left as they are
+    and reported once, their dependencies are still rewritten on swaps.
+    """
+    index = get_dependent_views_index()
+    if not index.late_binding:
+        return []
+
+    failed = []
+    for table_name in table_names:
+        views = [
+            view
+            for view in index.get(table_name, connection)
+            if view[0] not in index.unconvertible
+        ]
+        if not views:
+            continue
+
+        for view_name, definition in get_current_definitions(views, connection):
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"""
+                        create or replace view {view_name} as
+                        ({definition.rstrip().rstrip(";")})
+                        with no schema binding;
+                    """
+                    )
+                index.invalidate_view(view_name)
+            except psycopg2.Error as e:
+                index.unconvertible.add(view_name)
+                failed.append(f"{view_name}: {str(e).strip()}")
+
+    if failed:
+        send_slack_notification(
+            "\n".join(failed), "Couldn’t convert views to late-binding"
+        )
+    return failed
 
 
 def update_view(view_name: str, definition: str, connection):
@@ -102,24 +332,64 @@ def update_view(view_name: str, definition: str, connection):
             ({definition})
         """
         cursor.execute(query)
+    get_dependent_views_index().invalidate_view(view_name)
 
 
 @log_action("replace old table")
 def replace_old_table(table_name: str, connection):
-    short_table_name = table_name.split(".")[-1]
-
     drop_view(table_name, connection)
 
+    convert_dependent_views([table_name], connection)
     update_dependent_views(table_name, connection)
 
     with connection.cursor() as cursor:
-        query_replace = f"""
-            drop table if exists {table_name}{old_postfix};
-            create table if not exists {table_name} (id int);
-            alter table {table_name} rename to {short_table_name}{old_postfix};
-            alter table {table_name}{temp_postfix} rename to {short_table_name};
+        cursor.execute(build_rename_query(table_name))
+
+
+def build_rename_query(table_name: str) -> str:
+    short_table_name = table_name.split(".")[-1]
+    return f"""
+        drop table if exists {table_name}{old_postfix};
+        create table if not exists {table_name} (id int);
+        alter table {table_name} rename to {short_table_name}{old_postfix};
+        alter table {table_name}{temp_postfix} rename to {short_table_name};
+        """
+
+
+@log_action("swap staged tables", "table_names")
+def swap_staged_tables(table_names: List[str], connection):
+    """Replaces all tables with their temp versions in one transaction"""
+    views = find_views(table_names, connection)
+    with transaction(connection):
+        with connection.cursor() as cursor:
+            for table_name in table_names:
+                if table_name in views:
+                    cursor.execute(f"drop view {table_name};")
+                update_dependent_views(table_name, connection)
+                cursor.execute(build_rename_query(table_name))
+
+
+def find_views(names: List[str], connection) -> List[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
             """
-        cursor.execute(query_replace)
+            select schemaname || '.' || viewname
+            from pg_views
+            where schemaname || '.' || viewname in %s
+        """,
+            (tuple(names),),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+@log_action("drop old tables", "table_names")
+def drop_old_tables(table_names: List[str], connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "\n".join(
+                f"drop table if exists {name}{old_postfix};" for name in table_names
+            )
+        )
 
 
 def make_snapshot(table: Table, connection) -> bool:
@@ -191,13 +461,23 @@ def insert_new_snapshot_data(table_name: str, connection):
 
 @log_action("remove old snapshots")
 def remove_old_snapshots(table: Table, connection):
+    expired = (
+        "datediff('mins', snapshot_timestamp::timestamp, current_timestamp::timestamp)"
+        f" > {table.snapshots_stored_for_mins}"
+    )
+    if table.snapshots_archive:
+        archived_until = archive_expiring_rows(
+            table.name, "snapshot_timestamp", expired, connection
+        )
+        if archived_until is None:
+            return
+        expired = f"snapshot_timestamp <= '{archived_until}'"
+
     with connection.cursor() as cursor:
         cursor.execute(
             f"""
             delete from {table.name}{history_postfix}
-            where datediff('mins', 
-                snapshot_timestamp::timestamp, 
-                current_timestamp::timestamp) > {table.snapshots_stored_for_mins}
+            where {expired}
         """
         )
 
@@ -211,3 +491,93 @@ def drop_view(table_name: str, connection):
                 connection.rollback()
             else:
                 raise
+
+
+@log_action("fingerprint table inputs")
+def get_inputs_fingerprint(table: Table, connection) -> Optional[str]:
+    """
+    Hash of everything the table is built from: results of its freshness
+    query or, by default, row counts and last inserts and deletes of the
+    tables used in its query. None if we can’t tell (e.g., it reads views).
+    """
+    with connection.cursor() as cursor:
+        if table.freshness_query:
+            try:
+                cursor.execute(table.freshness_query)
+            except psycopg2.ProgrammingError as e:
+                raise FreshnessQueryError(table.name, str(e))
+            return hash_rows(cursor.fetchall())
+
+        names = [n for n in find_tables_in_query(table.query) if n != table.name]
+        if not names:
+            return None
+
+        return hash_inputs(names, cursor)
+
+
+def hash_inputs(names: List[str], cursor) -> Optional[str]:
+    try:
+        cursor.execute(
+            """
+            select n.nspname || '.' || c.relname, c.relkind
+            from pg_class c
+            join pg_namespace n on n.oid = c.relnamespace
+            where n.nspname || '.' || c.relname in %s
+                and c.relkind in ('r', 'v')
+        """,
+            (tuple(names),),
+        )
+        relations = cursor.fetchall()
+        if not relations or any(kind == "v" for _, kind in relations):
+            return None
+
+        found = {name for name, _ in relations}
+        if has_unresolved_inputs([n for n in names if n not in found], cursor):
+            return None
+
+        cursor.execute(
+            """
+            select ti."schema" || '.' || ti."table", ti.table_id, ti.tbl_rows,
+                ins.last_insert, del.last_delete
+            from svv_table_info ti
+            left join (
+                select tbl, max(endtime) as last_insert from stl_insert group by tbl
+            ) ins on ins.tbl = ti.table_id
+            left join (
+                select tbl, max(endtime) as last_delete from stl_delete group by tbl
+            ) del on del.tbl = ti.table_id
+            where ti."schema" || '.' || ti."table" in %s
+            order by 1
+        """,
+            (tuple(name for name, _ in relations),),
+        )
+        return hash_rows(cursor.fetchall())
+    except psycopg2.ProgrammingError:
+        # no access to system tables: can’t tell, so the table is rebuilt
+        return None
+
+
+def has_unresolved_inputs(names: List[str], cursor) -> bool:
+    """
+    Names missing from pg_class are either not tables at all (e.g., `alias.column`
+    from the query) or tables we can’t fingerprint (e.g., Spectrum tables).
+    The latter are in existing schemas, local or external.
+    """
+    schemas = {name.split(".")[0] for name in names}
+    if not schemas:
+        return False
+
+    cursor.execute(
+        """
+        select nspname from pg_namespace where nspname in %s
+        union
+        select schemaname from svv_external_schemas where schemaname in %s
+    """,
+        (tuple(schemas), tuple(schemas)),
+    )
+    return len(cursor.fetchall()) > 0
+
+
+def hash_rows(rows: List[Tuple]) -> str:
+    serialized = json.dumps([list(row) for row in rows], default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
@@ -0,0 +1,187 @@
+from datetime import timedelta
+from typing import List, Tuple
+
+import arrow
+
+from create.archive import archive_expiring_rows, build_spectrum_table_query
+from create.redshift import make_snapshot, transaction
+from create.sqlite import get_last_snapshot, update_last_snapshot
+from utils.errors import HistoryTableCreationError
+from utils.logger import log_action
+from utils.table import Table, history_postfix
+
+validity_columns = ("valid_from", "valid_to")
+
+
+def take_snapshot(table: Table, db_path: str, connection) -> bool:
+    if table.snapshots_mode == "delta":
+        return make_delta_snapshot(table, db_path, connection)
+    return make_snapshot(table, connection)
+
+
+def make_delta_snapshot(table: Table, db_path: str, connection) -> bool:
+    """
+    Keeps only changed versions of rows in `_history`: each version is
+    valid from the snapshot it first appeared in till the one where it
+    changed or disappeared (`valid_to` is null for current versions).
+    Versions don’t show when the diff last ran, so that time is kept
+    in the db. Returns True if any versions were added or closed.
+    """
+    columns = get_columns(table.name, connection)
+    history_columns = dict(get_columns(f"{table.name}{history_postfix}", connection))
+
+    if not history_columns:
+        create_delta_history_table(table, columns, connection)
+    elif not all(column in history_columns for column in validity_columns):
+        raise HistoryTableCreationError(
+            table.name,
+            f"{table.name}{history_postfix} has full snapshots, "
+            "drop or rename it to switch to delta snapshots",
+        )
+    else:
+        last_snapshot = get_last_snapshot(db_path, table.name)
+        interval = timedelta(minutes=table.snapshots_interval_mins)
+        if last_snapshot and arrow.now() - arrow.get(last_snapshot) < interval:
+            return False
+
+        missing = [(c, t) for c, t in columns if c not in history_columns]
+        add_history_columns(table.name, missing, connection)
+
+    started = arrow.now().timestamp
+    changed_rows = insert_delta(table, [column for column, _ in columns], connection)
+    update_last_snapshot(db_path, table.name, started)
+    remove_old_versions(table, connection)
+    return changed_rows > 0
+
+
+@log_action("get columns", "table_name")
+def get_columns(table_name: str, connection) -> List[Tuple[str, str]]:
+    schema, table = table_name.split(".")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            select a.attname, format_type(a.atttypid, a.atttypmod)
+            from pg_attribute a
+            join pg_class c on c.oid = a.attrelid
+            join pg_namespace n on n.oid = c.relnamespace
+            where n.nspname = %s and c.relname = %s
+                and a.attnum > 0 and not a.attisdropped
+            order by a.attnum
+        """,
+            (schema, table),
+        )
+        return [(column, column_type) for column, column_type in cursor.fetchall()]
+
+
+@log_action("create delta snapshots table")
+def create_delta_history_table(
+    table: Table, columns: List[Tuple[str, str]], connection
+):
+    definitions = [f'"{column}" {column_type}' for column, column_type in columns]
+    definitions += [f'"{column}" timestamp' for column in validity_columns]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            create table {table.name}{history_postfix} (
+                {", ".join(definitions)}
+            );
+        """
+        )
+
+
+@log_action("add new columns to snapshots table")
+def add_history_columns(table_name: str, columns: List[Tuple[str, str]], connection):
+    # Redshift adds one column per statement
+    with connection.cursor() as cursor:
+        for column, column_type in columns:
+            cursor.execute(
+                f"""
+                alter table {table_name}{history_postfix}
+                add column "{column}" {column_type};
+            """
+            )
+
+
+@log_action("insert changed rows into snapshots table")
+def insert_delta(table: Table, columns: List[str], connection) -> int:
+    """Returns the number of versions closed and inserted"""
+    history = f"{table.name}{history_postfix}"
+    fields = ", ".join(f'"{column}"' for column in columns)
+    # keys can be null, and null = null isn’t true
+    keys = " and ".join(
+        f'({history}."{key}" = changed."{key}" '
+        f'or ({history}."{key}" is null and changed."{key}" is null))'
+        for key in table.snapshots_key
+    )
+    with transaction(connection), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            create temp table changed as (
+                select {fields} from {history} where valid_to is null
+                except
+                select {fields} from {table.name}
+            );
+
+            create temp table fresh as (
+                select {fields} from {table.name}
+                except
+                select {fields} from {history} where valid_to is null
+            );
+        """
+        )
+        cursor.execute(
+            f"""
+            update {history} set valid_to = sysdate
+            from changed
+            where {history}.valid_to is null and {keys};
+        """
+        )
+        closed = cursor.rowcount
+        cursor.execute(
+            f"""
+            insert into {history} ({fields}, valid_from, valid_to)
+            select {fields}, sysdate, null from fresh;
+        """
+        )
+        inserted = cursor.rowcount
+        cursor.execute("drop table changed; drop table fresh;")
+    return closed + inserted
+
+
+@log_action("remove old versions")
+def remove_old_versions(table: Table, connection):
+    if not table.snapshots_stored_for_mins:
+        return
+    expired = f"valid_to < dateadd('mins', -{table.snapshots_stored_for_mins}, sysdate)"
+    if table.snapshots_archive:
+        archived_until = archive_expiring_rows(
+            table.name, "valid_to", expired, connection
+        )
+        if archived_until is None:
+            return
+        expired = f"valid_to <= '{archived_until}'"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            delete from {table.name}{history_postfix}
+            where {expired}
+        """
+        )
+
+
+def build_as_of_query(table_name: str, as_of: str) -> str:
+    """Query for the table as it was at `as_of` (e.g., '2018-03-27 12:00')"""
+    return f"""
+        select *
+        from {table_name}{history_postfix}
+        where valid_from <= '{as_of}'
+            and (valid_to is null or valid_to > '{as_of}')
+    """
+
+
+@log_action("create Spectrum table for archived snapshots", "table_name")
+def create_archive_spectrum_table(table_name: str, external_schema: str, connection):
+    columns = get_columns(f"{table_name}{history_postfix}", connection)
+    with connection.cursor() as cursor:
+        cursor.execute(build_spectrum_table_query(table_name, columns, external_schema))
@@ -1,6 +1,6 @@
 import json
 import sqlite3
-from typing import List, Tuple
+from typing import List, Tuple, Optional, Dict, NamedTuple
 
 import arrow
 
@@ -9,6 +9,14 @@ from utils.errors import TableNotFoundInDBError
 from utils.table import Table
 
 
+class TableStats(NamedTuple):
+    name: str
+    interval: Optional[int]
+    last_created: Optional[int]
+    force: bool
+    duration: Optional[float]
+
+
 def load_table_details(db_str: str, table: str) -> Table:
     with sqlite3.connect(db_str) as connection:
         connection.row_factory = sqlite3.Row
@@ -41,7 +49,13 @@ def load_table_details(db_str: str, table: str) -> Table:
             raise TableNotFoundInDBError(table)
 
 
-def update_last_created(db_str: str, table: str, timestamp: int, duration: int):
+def update_last_created(
+    db_str: str,
+    table: str,
+    timestamp: int,
+    duration: int,
+    fingerprint: Optional[str] = None,
+):
     with sqlite3.connect(db_str) as connection:
         cursor = connection.cursor()
         cursor.execute(
@@ -67,44 +81,95 @@ def update_last_created(db_str: str, table: str, timestamp: int, duration: int):
                     
                 started = NULL,
                 force = NULL,
-                waiting = NULL
+                waiting = NULL,
+                fingerprint = ?
             WHERE table_name = ? 
             """,
-            (timestamp, duration, duration, table),
+            (timestamp, duration, duration, fingerprint, table),
+        )
+
+
+def mark_table_as_skipped(db_str: str, table: str, timestamp: int):
+    """Counts as created for scheduling, but leaves the stats alone"""
+    with sqlite3.connect(db_str) as connection:
+        connection.execute(
+            """
+            UPDATE tables
+            SET last_created = ?, started = NULL, force = NULL, waiting = NULL
+            WHERE table_name = ?
+        """,
+            (timestamp, table),
+        )
+
+
+def get_fingerprint(db_str: str, table: str) -> Optional[str]:
+    with sqlite3.connect(db_str) as connection:
+        cursor = connection.execute(
+            "SELECT fingerprint FROM tables WHERE table_name = ?", (table,)
+        )
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+
+def get_last_snapshot(db_str: str, table: str) -> Optional[int]:
+    with sqlite3.connect(db_str) as connection:
+        cursor = connection.execute(
+            "SELECT last_snapshot FROM tables WHERE table_name = ?", (table,)
+        )
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+
+def update_last_snapshot(db_str: str, table: str, timestamp: int):
+    with sqlite3.connect(db_str) as connection:
+        connection.execute(
+            "UPDATE tables SET last_snapshot = ? WHERE table_name = ?",
+            (timestamp, table),
         )
 
 
 def log_timestamps(db_str: str, table: str, timestamps: Timestamps):
+    columns = ", ".join(f'"{event}"' for event in ["table", *timestamps.events])
+    question_marks = ", ".join("?" for _ in range(len(timestamps.values) + 1))
+    query = f"INSERT INTO timestamps ({columns}) VALUES ({question_marks})"
     with sqlite3.connect(db_str) as connection:
-        question_marks = f'{"?, " * len(timestamps.values)} ?'
         try:
-            connection.execute(
-                f"""
-                INSERT INTO timestamps
-                VALUES ({question_marks})
-            """,
-                (table, *timestamps.values),
-            )
+            connection.execute(query, (table, *timestamps.values))
 
         except sqlite3.OperationalError:
             connection.execute(f"{build_query_to_create_timestamps_table()}")
-            connection.execute(
-                f"""
-                INSERT INTO timestamps
-                VALUES ({question_marks})
-            """,
-                (table, *timestamps.values),
-            )
+            add_missing_timestamps_columns(connection)
+            connection.execute(query, (table, *timestamps.values))
+
+
+def update_timestamps(db_str: str, table: str, timestamps: Timestamps, events: List):
+    """Adds events logged after the run was saved (e.g., maintenance steps)"""
+    assignments = ", ".join(f'"{event}" = ?' for event in events)
+    query = f'UPDATE timestamps SET {assignments} WHERE "table" = ? AND start = ?'
+    values = [getattr(timestamps, event, None) for event in events]
+    with sqlite3.connect(db_str) as connection:
+        try:
+            connection.execute(query, (*values, table, timestamps.start))
+        except sqlite3.OperationalError:
+            add_missing_timestamps_columns(connection)
+            connection.execute(query, (*values, table, timestamps.start))
+
+
+def add_missing_timestamps_columns(connection):
+    existing = {row[1] for row in connection.execute("PRAGMA table_info(timestamps)")}
+    for event in Timestamps.__slots__:
+        if event not in existing:
+            connection.execute(f'ALTER TABLE timestamps ADD COLUMN "{event}" int')
 
 
 def log_start(db_str: str, table: str, start_ts: int):
     with sqlite3.connect(db_str) as connection:
         connection.execute(
             """
-            UPDATE tables SET started = ?
+            UPDATE tables SET started = ?, heartbeat = ?, phase = 'start'
             WHERE table_name = ?
         """,
-            (start_ts, table),
+            (start_ts, start_ts, table),
         )
 
 
@@ -212,6 +277,35 @@ def get_time_waiting(db_str: str, table: str) -> int:
         return result[0] if result else None
 
 
+def log_phase(db_str: str, table: str, phase: str):
+    with sqlite3.connect(db_str) as connection:
+        connection.execute(
+            """
+            UPDATE tables SET phase = ?, heartbeat = strftime('%s', 'now')
+            WHERE table_name = ?
+        """,
+            (phase, table),
+        )
+
+
+def get_heartbeat(db_str: str, table: str) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Phase of a running table and seconds since its last heartbeat.
+    Starts logged without heartbeats count as one.
+    """
+    with sqlite3.connect(db_str) as connection:
+        cursor = connection.execute(
+            """
+            SELECT phase, strftime('%s', 'now') - COALESCE(heartbeat, started)
+            FROM tables
+            WHERE table_name = ? AND started IS NOT NULL
+        """,
+            (table,),
+        )
+        result = cursor.fetchone()
+        return (result[0], result[1]) if result else (None, None)
+
+
 def get_average_completion_time(db_str: str, table: str) -> int:
     with sqlite3.connect(db_str) as connection:
         cursor = connection.cursor()
@@ -250,7 +344,163 @@ def get_tables_to_create(db_str: str) -> List[Tuple]:
                     OR last_created IS NULL
                 )
                 AND deleted IS NULL
+                AND (lease_expires IS NULL
+                    OR lease_expires < strftime('%s', 'now'))
             ORDER BY force DESC
         """
         )
         return cursor.fetchall()
+
+
+def get_seconds_till_next_due(db_str: str) -> Optional[int]:
+    with sqlite3.connect(db_str) as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+            SELECT MIN(last_created + (interval + 1) * 60 - now)
+            FROM tables, (SELECT CAST(strftime('%s', 'now') AS INTEGER) AS now)
+            WHERE last_created + (interval + 1) * 60 > now
+                AND deleted IS NULL
+        """
+        )
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+
+def get_tables_stats(db_str: str, history_days: int = 7) -> Dict[str, TableStats]:
+    with sqlite3.connect(db_str) as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+            SELECT t.table_name, t.interval, t.last_created, t.force,
+                COALESCE(recent.duration, t.mean)
+            FROM tables t
+            LEFT JOIN (
+                SELECT "table", AVG(finish - start) AS duration
+                FROM timestamps
+                WHERE finish IS NOT NULL
+                    AND start > strftime('%s', 'now') - ? * 86400
+                GROUP BY "table"
+            ) recent ON recent."table" = t.table_name
+            WHERE t.deleted IS NULL
+        """,
+            (history_days,),
+        )
+        return {
+            row[0]: TableStats(row[0], row[1], row[2], bool(row[3]), row[4])
+            for row in cursor.fetchall()
+        }
+
+
+def claim_table(db_str: str, table: str, owner: str, lease_seconds: int) -> bool:
+    """
+    Takes a lease on the table unless another creator holds a valid one.
+    The check and the update are a single statement, so only one of the
+    creators sharing this database can win.
+    """
+    now = arrow.now().timestamp
+    with sqlite3.connect(db_str) as connection:
+        cursor = connection.execute(
+            """
+            UPDATE tables
+            SET lease_owner = ?, lease_expires = ?
+            WHERE table_name = ?
+                AND (lease_owner IS NULL
+                    OR lease_owner = ?
+                    OR lease_expires < ?)
+        """,
+            (owner, now + lease_seconds, table, owner, now),
+        )
+        return cursor.rowcount == 1
+
+
+def renew_lease(db_str: str, table: str, owner: str, lease_seconds: int) -> bool:
+    with sqlite3.connect(db_str) as connection:
+        cursor = connection.execute(
+            """
+            UPDATE tables
+            SET lease_expires = ?, heartbeat = strftime('%s', 'now')
+            WHERE table_name = ? AND lease_owner = ?
+        """,
+            (arrow.now().timestamp + lease_seconds, table, owner),
+        )
+        return cursor.rowcount == 1
+
+
+def release_lease(db_str: str, table: str, owner: str):
+    with sqlite3.connect(db_str) as connection:
+        connection.execute(
+            """
+            UPDATE tables SET lease_owner = NULL, lease_expires = NULL
+            WHERE table_name = ? AND lease_owner = ?
+        """,
+            (table, owner),
+        )
+
+
+def claim_lock(db_str: str, name: str, owner: str, lease_seconds: int) -> bool:
+    """Same as claim_table, for things shared by all creators (e.g., vacuum)"""
+    now = arrow.now().timestamp
+    with sqlite3.connect(db_str) as connection:
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS locks
+            (name text PRIMARY KEY, owner text, expires integer)
+        """
+        )
+        connection.execute("INSERT OR IGNORE INTO locks (name) VALUES (?)", (name,))
+        cursor = connection.execute(
+            """
+            UPDATE locks
+            SET owner = ?, expires = ?
+            WHERE name = ?
+                AND (owner IS NULL OR owner = ? OR expires < ?)
+        """,
+            (owner, now + lease_seconds, name, owner, now),
+        )
+        return cursor.rowcount == 1
+
+
+def renew_lock(db_str: str, name: str, owner: str, lease_seconds: int) -> bool:
+    with sqlite3.connect(db_str) as connection:
+        cursor = connection.execute(
+            "UPDATE locks SET expires = ? WHERE name = ? AND owner = ?",
+            (arrow.now().timestamp + lease_seconds, name, owner),
+        )
+        return cursor.rowcount == 1
+
+
+def release_lock(db_str: str, name: str, owner: str):
+    with sqlite3.connect(db_str) as connection:
+        connection.execute(
+            """
+            UPDATE locks SET owner = NULL, expires = NULL
+            WHERE name = ? AND owner = ?
+        """,
+            (name, owner),
+        )
+
+
+def reclaim_expired_leases(db_str: str) -> List[str]:
+    """
+    Resets tables whose creators stopped renewing their leases, and starts
+    left without any lease (e.g., by a creator killed before leases).
+    """
+    now = arrow.now().timestamp
+    with sqlite3.connect(db_str) as connection:
+        condition = """
+            lease_expires < ? OR (started IS NOT NULL AND lease_owner IS NULL)
+        """
+        cursor = connection.execute(
+            f"SELECT table_name FROM tables WHERE {condition}", (now,)
+        )
+        reclaimed = [row[0] for row in cursor.fetchall()]
+        connection.execute(
+            f"""
+            UPDATE tables
+            SET started = NULL, lease_owner = NULL, lease_expires = NULL
+            WHERE {condition}
+        """,
+            (now,),
+        )
+        return reclaimed
@@ -0,0 +1,213 @@
+import csv
+import json
+import os
+import subprocess
+from functools import lru_cache
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from create.redshift import transaction
+from create.timestamps import Timestamps
+from create.venvs import processor_venv
+from utils.errors import ProcessorRunError
+from utils.logger import log_action, setup_logger
+from utils.table import Table
+
+logger = setup_logger()
+
+worker_script = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "stream_worker.py"
+)
+stream_batch_size = 10000
+
+
+class ProcessorWorker:
+    """
+    Python process in the processor’s virtual environment that runs
+    processors one job at a time (see `stream_worker.py` for the protocol).
+    """
+
+    def __init__(self, venv_path: str):
+        self.venv_path = venv_path
+        self.process = subprocess.Popen(
+            [f"{venv_path}/bin/python", worker_script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        )
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(
+        self,
+        table_name: str,
+        processor_path: str,
+        columns: List[str],
+        rows: Iterable[Sequence],
+        output_filename: str,
+        on_input_done: Optional[Callable] = None,
+    ) -> int:
+        """Streams rows through the processor into CSV, returns output rows"""
+        self.send({"processor": os.path.abspath(processor_path), "columns": columns})
+        feeding = RowsFeeder(self, rows, on_input_done)
+        feeding.start()
+
+        with open(output_filename, "w") as output_file:
+            writer = csv.writer(output_file, delimiter=";", escapechar="\\")
+            result = self._write_output(writer)
+        feeding.join()
+
+        if feeding.error is not None:
+            raise feeding.error
+        if "error" in result:
+            raise ProcessorRunError(table_name, result["error"])
+        return result["done"]
+
+    def send(self, message):
+        self.process.stdin.write(json.dumps(message, default=str) + "\n")
+
+    def _write_output(self, writer) -> Dict:
+        header_written = False
+        for line in self.process.stdout:
+            message = json.loads(line)
+            if "row" not in message:
+                return message
+            row = message["row"]
+            if not header_written:
+                # COPY skips the header, columns are matched by position
+                writer.writerow(
+                    list(row.keys())
+                    if isinstance(row, dict)
+                    else [f"column_{i}" for i in range(len(row))]
+                )
+                header_written = True
+            writer.writerow(list(row.values()) if isinstance(row, dict) else row)
+        return {"error": "Worker stopped unexpectedly"}
+
+    def close(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+
+
+class RowsFeeder(Thread):
+    """Sends rows to the worker while its output is being read"""
+
+    def __init__(
+        self,
+        worker: ProcessorWorker,
+        rows: Iterable[Sequence],
+        on_done: Optional[Callable],
+    ):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self.rows = rows
+        self.on_done = on_done
+        self.error: Optional[Exception] = None
+
+    def run(self):
+        try:
+            for row in self.rows:
+                self.worker.send(list(row))
+            self.worker.send(None)
+            self.worker.process.stdin.flush()
+            if self.on_done is not None:
+                self.on_done()
+        except BrokenPipeError:
+            # the worker failed, its output has the error
+            pass
+        except Exception as e:
+            self.error = e
+            # closing stdin makes the worker stop waiting for rows
+            try:
+                self.worker.process.stdin.close()
+            except OSError:
+                pass
+
+
+class WorkerPool:
+    """Idle workers for each virtual environment"""
+
+    def __init__(self):
+        self.idle: Dict[str, List[ProcessorWorker]] = {}
+        self.lock = Lock()
+
+    def acquire(self, venv_path: str) -> ProcessorWorker:
+        with self.lock:
+            workers = self.idle.get(venv_path, [])
+            while workers:
+                worker = workers.pop()
+                if worker.alive:
+                    return worker
+        return ProcessorWorker(venv_path)
+
+    def release(self, worker: ProcessorWorker):
+        if not worker.alive:
+            return
+        with self.lock:
+            self.idle.setdefault(worker.venv_path, []).append(worker)
+
+    def close(self):
+        with self.lock:
+            workers = [w for venv_workers in self.idle.values() for w in venv_workers]
+            self.idle = {}
+        for worker in workers:
+            worker.close()
+
+
+@lru_cache()
+def get_worker_pool() -> WorkerPool:
+    return WorkerPool()
+
+
+def fetch_in_batches(cursor, batch_size: int = stream_batch_size):
+    batch = cursor.fetchmany(batch_size)
+    while batch:
+        yield from batch
+        batch = cursor.fetchmany(batch_size)
+
+
+@log_action("stream selected data through processor")
+def stream_through_processor(
+    table: Table,
+    processor_path: str,
+    views_path: str,
+    output_filename: str,
+    connection,
+    ts: Timestamps,
+) -> int:
+    """
+    Rows go from a server-side cursor straight to a worker process running
+    the processor, and its output goes to the CSV for upload.
+    """
+    pool = get_worker_pool()
+    with processor_venv(views_path, table.name) as venv_path:
+        ts.log("venv")
+        worker = pool.acquire(venv_path)
+        try:
+            with transaction(connection), connection.cursor("duro_select") as cursor:
+                cursor.execute(table.query)
+                # named cursors get their description after the first fetch
+                first = cursor.fetchmany(1)
+                columns = [desc[0] for desc in cursor.description]
+                rows = worker.run(
+                    table.name,
+                    processor_path,
+                    columns,
+                    iter_rows(first, cursor),
+                    output_filename,
+                    lambda: ts.log("select"),
+                )
+        except Exception:
+            worker.close()
+            raise
+
+    pool.release(worker)
+    return rows
+
+
+def iter_rows(first: List, cursor):
+    yield from first
+    yield from fetch_in_batches(cursor)
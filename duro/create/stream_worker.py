@@ -0,0 +1,74 @@
+"""
+Long-lived worker for streaming processors. It runs in the processor’s
+virtual environment (so it can use only the standard library) and talks
+to duro through stdin and stdout, one JSON value per line:
+
+    → {"processor": path, "columns": [...]}    starts a job
+    → [value, ...]                             input rows
+    → null                                     end of input
+    ← {"row": [...] or {...}}                  output rows
+    ← {"done": rows} or {"error": traceback}   end of the job
+
+Processors are modules with `process(rows)`: it gets an iterable of dicts
+(column → value) and returns or yields output rows.
+"""
+import importlib.util
+import json
+import os
+import sys
+import traceback
+
+modules = {}
+
+
+def load_processor(path: str):
+    """Modules are reloaded when processor files change"""
+    key = (path, os.path.getmtime(path))
+    if key not in modules:
+        spec = importlib.util.spec_from_file_location(f"processor_{len(modules)}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        modules[key] = module
+    return modules[key]
+
+
+def read_rows(columns, stdin):
+    for line in stdin:
+        row = json.loads(line)
+        if row is None:
+            return
+        yield dict(zip(columns, row))
+    # duro stopped sending rows (e.g., the select failed)
+    sys.exit(1)
+
+
+def write(message, output):
+    output.write(json.dumps(message, default=str) + "\n")
+
+
+def serve(stdin, output):
+    for line in stdin:
+        job = json.loads(line)
+        try:
+            module = load_processor(job["processor"])
+            rows = read_rows(job["columns"], stdin)
+            count = 0
+            for row in module.process(rows):
+                write({"row": row}, output)
+                count += 1
+            # input that the processor didn’t read
+            for _ in rows:
+                pass
+            write({"done": count}, output)
+            output.flush()
+        except Exception:
+            write({"error": traceback.format_exc()}, output)
+            output.flush()
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    # processors printing something shouldn’t break the protocol
+    protocol_output = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    sys.stdout = sys.stderr
+    serve(sys.stdin, protocol_output)
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 import arrow
 
@@ -6,6 +6,7 @@ events = {
     "start": "Started",
     "connect": "Connected to Redshift",
     "select": "Selected data from Redshift",
+    "venv": "Prepared virtual environment",
     "create_temp": "Created temporary table",
     "process": "Processed selected data",
     "csv": "Exported processed data to CSV",
@@ -15,7 +16,11 @@ events = {
     "tests": "Run tests",
     "replace_old": "Replaced old table",
     "drop_old": "Dropped old table",
-    "make_snapshot": "Made snapshot"
+    "merge": "Merged new rows into table",
+    "make_snapshot": "Made snapshot",
+    "vacuum": "Vacuumed table",
+    "analyze": "Analyzed table",
+    "skipped": "Skipped, inputs unchanged",
 }
 
 
@@ -26,16 +31,16 @@ class Timestamps:
 
     def log(self, event: str):
         setattr(self, event, arrow.now().timestamp)
-        if event in ("drop_old", "insert"):
+        if event in ("drop_old", "insert", "merge"):
             self.finish = getattr(self, event)
 
     @property
     def events(self) -> List:
-        return self.__slots__
+        return Timestamps.__slots__
 
     @property
     def values(self) -> List:
-        return [getattr(self, event, None) for event in self.__slots__]
+        return [getattr(self, event, None) for event in Timestamps.__slots__]
 
     # pylint: disable=no-member
     # noinspection PyUnresolvedReferences
@@ -44,3 +49,16 @@ class Timestamps:
         if getattr(self, "finish", None):
             return self.finish - self.start
         return None
+
+
+class ProgressTimestamps(Timestamps):
+    """Timestamps that also report every logged event as the current phase"""
+
+    __slots__ = ["report"]
+
+    def __init__(self, report: Callable[[str], None]):
+        self.report = report
+
+    def log(self, event: str):
+        super().log(event)
+        self.report(event)
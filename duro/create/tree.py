@@ -5,16 +5,14 @@ import arrow
 import networkx as nx
 
 from create.sqlite import (
-    load_table_details,
     is_running,
     reset_start,
-    get_average_completion_time,
-    get_time_running,
+    get_heartbeat,
     is_waiting,
     mark_table_as_not_waiting,
-    mark_table_as_waiting,
 )
 from create.create_table import run_create_table
+from create.lease import Lease, get_creator_id
 from utils.errors import (
     MaterializationError,
     TableNotFoundInGraphError,
@@ -27,19 +25,24 @@ from utils.table import Table
 
 logger = setup_logger()
 
+# builds renew their heartbeat at least every third of this
+default_stale_after = 300
 
-def create_tree(root: str, global_config: GlobalConfig, interval: int = None):
-    db = global_config.db_path
-    table = load_table_details(db, root)
-    table.interval = table.interval or interval
 
-    if not should_be_created(db, table):
+def create_planned_table(table: Table, global_config: GlobalConfig):
+    db = global_config.db_path
+    lease = Lease(
+        db,
+        table.name,
+        get_creator_id(global_config.creator_id),
+        global_config.lease_seconds,
+    )
+    if not lease.claim():
+        logger.info(f"{table.name} is being created by another creator, waiting")
+        wait_till_finished(db, table.name, global_config.lease_seconds)
         return
 
-    children = list_children_for_table(root, global_config.graph)
-
-    create_children(children, global_config, table)
-
+    lease.start()
     try:
         logger.info(f"Creating {table.name}")
         run_create_table(table, db, global_config.views_path)
@@ -51,16 +54,10 @@ def create_tree(root: str, global_config: GlobalConfig, interval: int = None):
         logger.error(e)
         reset_start(db, table.name)
         send_slack_notification(str(e), f"Error while creating {table.name}")
-
-
-def create_children(children: List, global_config: GlobalConfig, table: Table):
-    if children:
-        logger.info(f"Creating children for {table.name}")
-
-    for child in children:
-        mark_table_as_waiting(global_config.db_path, table.name)
-        create_tree(child, global_config, table.interval)
-        mark_table_as_not_waiting(global_config.db_path, table.name)
+    finally:
+        # staged tables stay leased till their batch is swapped or discarded
+        if table.batch is None or not table.batch.hold(table.name, lease):
+            lease.release()
 
 
 def list_children_for_table(root: str, graph: nx.DiGraph) -> List:
@@ -72,7 +69,9 @@ def list_children_for_table(root: str, graph: nx.DiGraph) -> List:
         raise TableNotFoundInGraphError(e)
 
 
-def should_be_created(db_path: str, table: Table) -> bool:
+def should_be_created(
+    db_path: str, table: Table, stale_after: int = default_stale_after
+) -> bool:
     waiting, waiting_too_long = is_waiting(db_path, table.name)
 
     if waiting and not waiting_too_long:
@@ -87,7 +86,7 @@ def should_be_created(db_path: str, table: Table) -> bool:
 
     if is_running(db_path, table.name):
         logger.info("Already running, waiting till done")
-        finished = wait_till_finished(db_path, table.name)
+        finished = wait_till_finished(db_path, table.name, stale_after)
 
         if finished:
             return False
@@ -109,21 +108,25 @@ def should_be_created(db_path: str, table: Table) -> bool:
     return True
 
 
-def wait_till_finished(db_str: str, table: str, timeout: int = 10) -> bool:
-    average_time = get_average_completion_time(db_str, table)
-    if not average_time:
-        logger.info(f"No stats for this table yet, not waiting for completion")
-        reset_start(db_str, table)
-        return False
-    logger.info(f"Average completion time: {average_time}")
+def wait_till_finished(
+    db_str: str, table: str, stale_after: int = default_stale_after, timeout: int = 10
+) -> bool:
+    """
+    Waits while the table is running and its creator keeps sending heartbeats.
+    Returns False (and resets the start) if there were no heartbeats for
+    `stale_after` seconds: whoever was creating the table is dead.
+    """
     while True:
-        time.sleep(timeout)
-        time_running = get_time_running(db_str, table)
-        if time_running is None:
+        phase, since_heartbeat = get_heartbeat(db_str, table)
+        if since_heartbeat is None:
             logger.info("Waited until completion")
             return True
-        if average_time and time_running > average_time * 5:
-            logger.info("Can’t be running for so long, resetting")
+        if since_heartbeat > stale_after:
+            logger.info(
+                f"{table}: no heartbeat for {since_heartbeat} seconds "
+                f"(last phase: {phase}), resetting"
+            )
             reset_start(db_str, table)
             return False
-        logger.info(f"Runs for {time_running} seconds")
+        logger.info(f"{table} is alive, phase: {phase}")
+        time.sleep(timeout)
@@ -0,0 +1,135 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List, Optional
+
+from utils.errors import ProcessorRunError
+from utils.file_utils import find_requirements_txt
+from utils.logger import log_action, setup_logger
+
+logger = setup_logger()
+
+venvs_folder = "./venvs"
+ready_marker = ".duro_ready"
+
+
+@lru_cache()
+def get_python_version() -> str:
+    result = subprocess.run(["python3", "--version"], stdout=subprocess.PIPE)
+    return result.stdout.decode().strip()
+
+
+def get_venv_key(requirements: Optional[str]) -> str:
+    """Processors with the same requirements share one environment"""
+    content = ""
+    if requirements:
+        with open(requirements) as file:
+            content = "\n".join(sorted(line.strip() for line in file if line.strip()))
+    key = f"{get_python_version()}\n{content}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+@contextmanager
+def lock_venv(venv_path: str, exclusive: bool, blocking: bool = True):
+    """
+    File locks work both for threads and for several creators on one host:
+    processors hold shared locks while they run, creation and removal of
+    an environment need an exclusive one.
+    """
+    os.makedirs(os.path.dirname(venv_path), exist_ok=True)
+    with open(f"{venv_path}.lock", "w") as lock_file:
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        fcntl.flock(lock_file, operation if blocking else operation | fcntl.LOCK_NB)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def is_ready(venv_path: str) -> bool:
+    return os.path.exists(os.path.join(venv_path, ready_marker))
+
+
+@contextmanager
+def processor_venv(views_path: str, table_name: str):
+    """
+    Yields the path to a ready environment for the processor, creating
+    it only if there is no environment for these requirements yet.
+    """
+    requirements = find_requirements_txt(views_path, table_name)
+    venv_path = os.path.join(venvs_folder, get_venv_key(requirements))
+
+    while True:
+        if not is_ready(venv_path):
+            with lock_venv(venv_path, exclusive=True):
+                if not is_ready(venv_path):
+                    create_venv(venv_path, requirements, table_name)
+
+        with lock_venv(venv_path, exclusive=False):
+            # could’ve been collected between the locks
+            if is_ready(venv_path):
+                # marks the environment as used for garbage collection
+                os.utime(os.path.join(venv_path, ready_marker))
+                yield venv_path
+                return
+
+
+@log_action("create virtual environment")
+def create_venv(venv_path: str, requirements: Optional[str], table_name: str):
+    # leftovers of an interrupted installation
+    shutil.rmtree(venv_path, ignore_errors=True)
+
+    venv_creation_result = subprocess.run(
+        ["python3", "-m", "venv", venv_path], stderr=subprocess.PIPE
+    )
+    if venv_creation_result.returncode != 0:
+        error_message = f"Couldn’t create venv: {venv_creation_result.stderr}"
+        raise ProcessorRunError(table_name, error_message)
+
+    if requirements:
+        install_result = subprocess.run(
+            [f"{venv_path}/bin/pip", "install", "-r", requirements],
+            stderr=subprocess.PIPE,
+        )
+        if install_result.returncode != 0:
+            shutil.rmtree(venv_path, ignore_errors=True)
+            error_message = f"Couldn’t install requirements: {install_result.stderr}"
+            raise ProcessorRunError(table_name, error_message)
+
+    open(os.path.join(venv_path, ready_marker), "w").close()
+
+
+def collect_unused_venvs(max_idle_days: int) -> List[str]:
+    """Removes environments that no processor has used for a while"""
+    if not os.path.isdir(venvs_folder):
+        return []
+
+    threshold = time.time() - max_idle_days * 24 * 60 * 60
+    removed = []
+    for name in os.listdir(venvs_folder):
+        venv_path = os.path.join(venvs_folder, name)
+        if not os.path.isdir(venv_path):
+            continue
+
+        if get_last_used(venv_path) > threshold:
+            continue
+
+        try:
+            with lock_venv(venv_path, exclusive=True, blocking=False):
+                # checking again, it could’ve been used before we got the lock
+                if get_last_used(venv_path) <= threshold:
+                    shutil.rmtree(venv_path, ignore_errors=True)
+                    removed.append(name)
+        except BlockingIOError:
+            logger.info(f"{name} is in use, not removing it")
+    return removed
+
+
+def get_last_used(venv_path: str) -> float:
+    marker = os.path.join(venv_path, ready_marker)
+    return os.path.getmtime(marker if os.path.exists(marker) else venv_path)
@@ -1,9 +1,9 @@
 import argparse
 
+from create.connection_pool import redshift_connection
 from create.data_tests import run_tests, load_tests
 from create.process import process_and_upload_data
 from create.redshift import (
-    create_connection,
     drop_old_table,
     replace_old_table,
     drop_temp_table,
@@ -22,26 +22,26 @@ def create_table(table: Table, views_path: str, verbose=False):
     if verbose:
         logger.info(f"Using views path: {views_path}")
 
-    connection = create_connection()
+    with redshift_connection() as connection:
+        processor = find_processor(views_path, table.name)
 
-    processor = find_processor(views_path, table.name)
+        if verbose:
+            logger.info(f"Loaded processor: {processor}")
+        if processor:
+            process_and_upload_data(
+                table, processor, connection, Timestamps(), views_path
+            )
+        else:
+            create_temp_table(table, connection)
 
-    if verbose:
-        logger.info(f"Loaded processor: {processor}")
-    if processor:
-        process_and_upload_data(table, processor, connection, Timestamps(), views_path)
-    else:
-        create_temp_table(table, connection)
-
-    tests_queries = load_tests(table.name, views_path)
-    test_results, _ = run_tests(tests_queries, connection)
-    if not test_results:
-        drop_temp_table(table.name, connection)
-        return
+        tests_queries = load_tests(table.name, views_path)
+        test_results, _ = run_tests(tests_queries, connection, table.combine_tests)
+        if not test_results:
+            drop_temp_table(table.name, connection)
+            return
 
-    replace_old_table(table.name, connection)
-    drop_old_table(table.name, connection)
-    connection.close()
+        replace_old_table(table.name, connection)
+        drop_old_table(table.name, connection)
 
 
 if __name__ == "__main__":
@@ -13,6 +13,7 @@ from utils.file_utils import load_tables_in_path
 from utils.global_config import load_global_config
 from utils.graph_utils import find_roots_without_interval
 from utils.logger import setup_logger
+from utils.wakeup import notify_creator
 
 logger = setup_logger("scheduler")
 
@@ -39,7 +40,13 @@ def build_notification_message(new: List, updated: List) -> str:
     return f"{new_str}{updated_str}"
 
 
-def schedule(views_path: str, db_path: str, strict=False, use_git=False):
+def schedule(
+    views_path: str,
+    db_path: str,
+    strict=False,
+    use_git=False,
+    wakeup_socket: str = None,
+):
     latest_commit = None
 
     if use_git:
@@ -76,6 +83,7 @@ def schedule(views_path: str, db_path: str, strict=False, use_git=False):
 
     if updated or new:
         send_slack_notification(message, "Rescheduled views", message_type="success")
+        notify_creator(wakeup_socket)
 
 
 if __name__ == "__main__":
@@ -86,6 +94,7 @@ if __name__ == "__main__":
             global_config.db_path,
             strict=False,
             use_git=global_config.use_git,
+            wakeup_socket=global_config.wakeup_socket,
         )
     except SchedulerError as e:
         send_slack_notification(str(e), "Scheduler error")
@@ -1,4 +1,5 @@
 import re
+from typing import List
 
 
 def is_table_used_in_query(table_name: str, query: str) -> bool:
@@ -7,6 +8,24 @@ def is_table_used_in_query(table_name: str, query: str) -> bool:
     return bool(re.search(fr"\b\"?{schema}\"?\.\"?{table}\"?\b", clean_query))
 
 
+def replace_table_in_query(table_name: str, new_name: str, query: str) -> str:
+    schema, table = table_name.split(".")
+    pattern = fr"(?<![\w.])\"?{schema}\"?\.\"?{table}\"?(?![\w$])"
+    return re.sub(pattern, new_name, query)
+
+
+def find_tables_in_query(query: str) -> List[str]:
+    """
+    Everything that looks like `schema.table`. Aliased columns (`t.city`)
+    match too, so callers should check names against the database.
+    """
+    clean_query = remove_comments(query)
+    names = re.findall(
+        r"\b\"?([a-z_][\w$]*)\"?\.\"?([a-z_][\w$]*)\"?", clean_query, re.I
+    )
+    return sorted({f"{schema}.{table}".lower() for schema, table in names})
+
+
 def remove_comments(query: str) -> str:
     lines = query.split("\n")
     lines_without_comments = [
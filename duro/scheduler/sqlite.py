@@ -68,6 +68,8 @@ def insert_table(table: Table, cursor):
     cursor.execute(
         """
             INSERT INTO tables
+                (table_name, query, interval, config, last_created, mean,
+                times_run, force, started, deleted, waiting)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
         (
             table.name,
@@ -130,7 +132,13 @@ def create_tables_table(cursor):
            force integer, 
            started integer, 
            deleted integer,
-           waiting integer);"""
+           waiting integer,
+           lease_owner text,
+           lease_expires integer,
+           heartbeat integer,
+           phase text,
+           fingerprint text,
+           last_snapshot integer);"""
     )
 
 
@@ -1,3 +1,4 @@
+import importlib.util
 import os
 from functools import reduce
 from typing import Dict, List, Set
@@ -81,8 +82,21 @@ def build_table_configs(graph: nx.DiGraph, views_path: str) -> List[Table]:
     ]
 
 
+strategies = ("full", "incremental")
+snapshots_modes = ("full", "delta")
+maintenance_modes = ("always", "threshold", "never")
+export_modes = ("cursor", "unload")
+processor_modes = ("csv", "stream", "pipe")
+processor_formats = ("csv", "parquet", "arrow")
+
+
 def check_config_fields(tables: List[Table], views_path: str):
     for table in tables:
+        check_strategy_fields(table, views_path)
+        check_snapshots_fields(table)
+        check_maintenance_fields(table)
+        check_export_fields(table)
+
         distkey, sortkey = table.config.get("distkey"), table.config.get("sortkey")
         if not distkey and not sortkey:
             continue
@@ -112,3 +126,84 @@ def check_config_fields(tables: List[Table], views_path: str):
             raise ConfigFieldError(
                 f"Sortkey {sortkey} missing from select query for {table.name}."
             )
+
+
+def check_strategy_fields(table: Table, views_path: str):
+    strategy = table.config.get("strategy") or "full"
+    if strategy not in strategies:
+        raise ConfigFieldError(f"Unknown strategy {strategy} for {table.name}.")
+
+    if strategy != "incremental":
+        return
+
+    if find_processor(views_path, table.name):
+        raise ConfigFieldError(
+            f"Incremental strategy isn’t supported for processors ({table.name})."
+        )
+
+    key = table.config.get("incremental_key")
+    if not key:
+        raise ConfigFieldError(f"Incremental_key missing for {table.name}.")
+
+    for field in (key, table.config.get("unique_key")):
+        if field and not (field in table.query or "*" in table.query):
+            raise ConfigFieldError(
+                f"Field {field} missing from select query for {table.name}."
+            )
+
+
+def check_snapshots_fields(table: Table):
+    mode = table.config.get("snapshots_mode") or "full"
+    if mode not in snapshots_modes:
+        raise ConfigFieldError(f"Unknown snapshots mode {mode} for {table.name}.")
+
+    if mode == "delta" and not table.config.get("snapshots_key"):
+        raise ConfigFieldError(f"Snapshots_key missing for {table.name}.")
+
+
+def check_maintenance_fields(table: Table):
+    for step in ("analyze", "vacuum"):
+        mode = table.config.get(step) or "threshold"
+        if mode not in maintenance_modes:
+            raise ConfigFieldError(f"Unknown {step} mode {mode} for {table.name}.")
+
+
+def check_export_fields(table: Table):
+    mode = table.config.get("export") or "cursor"
+    if mode not in export_modes:
+        raise ConfigFieldError(f"Unknown export mode {mode} for {table.name}.")
+
+    processor_mode = table.config.get("processor_mode") or "csv"
+    if processor_mode not in processor_modes:
+        raise ConfigFieldError(
+            f"Unknown processor mode {processor_mode} for {table.name}."
+        )
+
+    if processor_mode != "csv" and mode == "unload":
+        raise ConfigFieldError(
+            f"{processor_mode.capitalize()} processors read from a cursor, "
+            f"can’t unload {table.name}."
+        )
+
+    processor_format = table.config.get("processor_format") or "csv"
+    if processor_format not in processor_formats:
+        raise ConfigFieldError(
+            f"Unknown processor format {processor_format} for {table.name}."
+        )
+
+    if processor_format != "csv":
+        if processor_mode != "csv" or mode == "unload":
+            raise ConfigFieldError(
+                f"Columnar format works only for processors reading files "
+                f"selected with a cursor, check {table.name}."
+            )
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ConfigFieldError(
+                f"Install pyarrow to use {processor_format} format for {table.name}."
+            )
+
+    parallel = int(table.config.get("parallel") or 1)
+    if parallel > 1 and (processor_mode != "csv" or processor_format != "csv"):
+        raise ConfigFieldError(
+            f"Parallel processing works only for CSV processors, check {table.name}."
+        )
@@ -9,7 +9,7 @@ def print_log(log: Dict, tz="local") -> List:
     result = [f'{format_as_ts(log["start"], tz)}']
     prev_ts = log["start"]
     for key in events:
-        if log[key] is not None and key != "start":
+        if log.get(key) is not None and key != "start":
             next_ts = log[key]
             result.append(
                 f"{format_as_short_ts(log[key], tz)}: "
@@ -21,8 +21,10 @@ from server.sqlite import (
     get_overview_stats,
 )
 from utils.global_config import load_global_config
+from utils.wakeup import notify_creator
 
 DATABASE = load_global_config().db_path
+WAKEUP_SOCKET = load_global_config().wakeup_socket
 
 app = Flask(__name__)
 app.config.update({"DATABASE": DATABASE})
@@ -109,6 +111,7 @@ def register_update_request():
         return jsonify({"message": "Already running"})
 
     set_table_for_update(get_db(), table, force_tree_update)
+    notify_creator(WAKEUP_SOCKET)
     return jsonify({"message": f"Scheduled {table} for update", "table": table})
 
 
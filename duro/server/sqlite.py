@@ -25,7 +25,7 @@ def get_jobs(floor: int, ceiling: int, db) -> Tuple[Row]:
         """
         SELECT "table", 
             "start",
-            COALESCE(drop_old, "insert") AS "finish"
+            COALESCE(drop_old, "insert", merge, skipped) AS "finish"
         FROM timestamps
         WHERE "start" BETWEEN ? AND ?
         
@@ -47,14 +47,15 @@ def get_table_details(db, table: str, limit: int = 100):
     return db.execute(
         """
         SELECT t.table_name, t.interval,
-            ts.start, ts.connect, ts."select", ts.create_temp,
+            ts.start, ts.connect, ts."select", ts.venv, ts.create_temp,
             ts.process, ts.csv, ts.s3, ts."insert", ts.clean_csv,
-            ts.tests, ts.replace_old, ts.drop_old, ts.make_snapshot, 
+            ts.tests, ts.replace_old, ts.drop_old, ts.merge, ts.make_snapshot,
+            ts.vacuum, ts.analyze, ts.skipped,
             ts.finish
         FROM tables t
         LEFT JOIN timestamps ts ON t.table_name = ts."table"
         WHERE t.table_name = ?
-        ORDER BY ts.finish DESC
+        ORDER BY COALESCE(ts.finish, ts.skipped) DESC
         LIMIT ?
     """,
         (table, limit),
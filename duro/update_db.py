@@ -3,7 +3,20 @@ import sqlite3
 from utils.global_config import load_global_config
 from utils.logger import setup_logger
 
-updates = [(101, "ALTER TABLE tables ADD COLUMN waiting integer")]
+updates = [
+    (101, "ALTER TABLE tables ADD COLUMN waiting integer"),
+    (102, "ALTER TABLE tables ADD COLUMN lease_owner text"),
+    (103, "ALTER TABLE tables ADD COLUMN lease_expires integer"),
+    (104, "ALTER TABLE tables ADD COLUMN heartbeat integer"),
+    (105, "ALTER TABLE tables ADD COLUMN phase text"),
+    (106, "ALTER TABLE tables ADD COLUMN fingerprint text"),
+    (107, "ALTER TABLE timestamps ADD COLUMN skipped int"),
+    (108, "ALTER TABLE timestamps ADD COLUMN merge int"),
+    (109, "ALTER TABLE timestamps ADD COLUMN vacuum int"),
+    (110, 'ALTER TABLE timestamps ADD COLUMN "analyze" int'),
+    (111, "ALTER TABLE timestamps ADD COLUMN venv int"),
+    (112, "ALTER TABLE tables ADD COLUMN last_snapshot integer"),
+]
 
 
 def get_version(connection) -> int:
@@ -30,7 +43,12 @@ def get_version(connection) -> int:
 
 
 def apply_update(connection, update):
-    connection.execute(update)
+    try:
+        connection.execute(update)
+    except sqlite3.OperationalError as e:
+        # creator adds missing timestamps columns when it logs a run
+        if not str(e).startswith("duplicate column name"):
+            raise
     connection.commit()
 
 
@@ -107,8 +107,24 @@ class QueryTimeoutError(CreationError):
         super().__init__(table, f"Took longer than {int(timeout)} seconds, resetting")
 
 
+class FreshnessQueryError(CreationError):
+    """Freshness query from table config failed"""
+
+    def __init__(self, table, details=None):
+        message = f"""*Freshness query failed for `{table}`* ```{details}```"""
+        super().__init__(table, message)
+
+
 class ProcessorRunError(CreationError):
     """Processor process return nonzero code after completion"""
     def __init__(self, table, details=None):
         message = f"""*Select query failed for `{table}`* ```{details}```"""
         super().__init__(table, message)
+
+
+class SnapshotsArchiveError(CreationError):
+    """Couldn’t unload old snapshots to object storage"""
+
+    def __init__(self, table, details=None):
+        message = f"""*Archiving old snapshots failed for `{table}`* ```{details}```"""
+        super().__init__(table, message)
@@ -10,6 +10,18 @@ class GlobalConfig(NamedTuple):
     logs_path: str
     graph: nx.DiGraph
     use_git: bool
+    workers: int = 1
+    wakeup_socket: Optional[str] = None
+    poll_interval: int = 30
+    pool_size: int = 5
+    pool_max_idle: int = 300
+    creator_id: Optional[str] = None
+    lease_seconds: int = 300
+    batch_swaps: bool = False
+    late_binding_views: bool = False
+    maintenance_workers: int = 0
+    maintenance_window: Optional[str] = None
+    venvs_max_idle_days: int = 7
 
 
 class SlackConfig(NamedTuple):
@@ -29,12 +41,42 @@ def load_global_config(config_file="config.conf") -> GlobalConfig:
         graph_file_path = config["main"].get("graph", "dependencies.dot")
         logs_path = config["main"].get("logs", "./logs")
         use_git = config["main"].getboolean("use_git", False)
+        workers = config["main"].getint("workers", 1)
+        wakeup_socket = config["main"].get("wakeup_socket")
+        poll_interval = config["main"].getint("poll_interval", 30)
+        pool_size = config["main"].getint("pool_size", 5)
+        pool_max_idle = config["main"].getint("pool_max_idle", 300)
+        creator_id = config["main"].get("creator_id")
+        lease_seconds = config["main"].getint("lease_seconds", 300)
+        batch_swaps = config["main"].getboolean("batch_swaps", False)
+        late_binding_views = config["main"].getboolean("late_binding_views", False)
+        maintenance_workers = config["main"].getint("maintenance_workers", 0)
+        maintenance_window = config["main"].get("maintenance_window") or None
+        venvs_max_idle_days = config["main"].getint("venvs_max_idle_days", 7)
         try:
             graph = nx.nx_pydot.read_dot(graph_file_path)
         except FileNotFoundError:
             graph = None
         # noinspection PyArgumentList
-        return GlobalConfig(db_path, views_path, logs_path, graph, use_git)
+        return GlobalConfig(
+            db_path,
+            views_path,
+            logs_path,
+            graph,
+            use_git,
+            workers,
+            wakeup_socket,
+            poll_interval,
+            pool_size,
+            pool_max_idle,
+            creator_id,
+            lease_seconds,
+            batch_swaps,
+            late_binding_views,
+            maintenance_workers,
+            maintenance_window,
+            venvs_max_idle_days,
+        )
     except (configparser.NoSectionError, KeyError):
         raise ValueError(
             "No ’main’ section in config.conf (or maybe file doesn’t exist at all)"
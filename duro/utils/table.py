@@ -1,7 +1,7 @@
 import json
 from typing import NamedTuple, Dict, Optional
 
-from utils.utils import convert_interval_to_integer
+from utils.utils import convert_interval_to_integer, convert_to_bool
 
 temp_postfix = "_duro_temp"
 old_postfix = "_duro_old"
@@ -33,6 +33,7 @@ class Table:
         self.last_created = last_created
         self.force = force
         self.waiting = waiting
+        self.batch = None
 
         self.snapshots_interval_mins = convert_interval_to_integer(
             self.config.get("snapshots_interval")
@@ -42,6 +43,36 @@ class Table:
             self.config.get("snapshots_stored_for")
         )
 
+        self.snapshots_mode = self.config.get("snapshots_mode") or "full"
+        self.snapshots_key = [
+            key.strip()
+            for key in (self.config.get("snapshots_key") or "").split(",")
+            if key.strip()
+        ]
+        self.snapshots_archive = convert_to_bool(self.config.get("snapshots_archive"))
+
+        self.strategy = self.config.get("strategy") or "full"
+        self.incremental_key = self.config.get("incremental_key")
+        self.unique_key = self.config.get("unique_key")
+
+        self.combine_tests = convert_to_bool(self.config.get("combine_tests"))
+        self.export = self.config.get("export") or "cursor"
+        self.processor_mode = self.config.get("processor_mode") or "csv"
+        self.processor_format = self.config.get("processor_format") or "csv"
+        self.upload_parts = int(self.config.get("upload_parts") or 0)
+        self.parallel = int(self.config.get("parallel") or 1)
+
+        self.analyze = self.config.get("analyze") or "threshold"
+        self.vacuum = self.config.get("vacuum") or "threshold"
+        self.analyze_threshold = float(self.config.get("analyze_threshold") or 10)
+        self.vacuum_threshold = float(self.config.get("vacuum_threshold") or 20)
+
+        self.freshness_query = self.config.get("freshness_query")
+        self.skip_unchanged = (
+            convert_to_bool(self.config.get("skip_unchanged"))
+            or self.freshness_query is not None
+        )
+
     def __repr__(self):
         return f"Table({self.name}, {self.query}, {self.interval}, {self.config}, {self.last_created}, {self.force}, {self.waiting})"
 
@@ -78,6 +109,20 @@ class Table:
             );
         """
 
+    def get_increment_query(self, high_water_mark: str) -> str:
+        query = self.query.rstrip(";\n")
+        keys = self.load_dist_sort_keys()
+        return f"""
+            create table {self.name}{temp_postfix}
+            {keys.distkey} {keys.sortkey} {keys.diststyle}
+            as (
+                select * from (
+                    {query}
+                ) as increment
+                where "{self.incremental_key}" > {high_water_mark}
+            );
+        """
+
     def load_grant_select_statements(self) -> str:
         if not self.config:
             return ""
@@ -94,3 +139,7 @@ class Table:
     @property
     def store_snapshots(self) -> bool:
         return bool(self.snapshots_interval_mins)
+
+    @property
+    def incremental(self) -> bool:
+        return self.strategy == "incremental"
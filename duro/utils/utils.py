@@ -1,5 +1,7 @@
 from typing import Optional
 
+true_values = ("true", "yes", "on", "1")
+
 
 def convert_interval_to_integer(interval: Optional[str]) -> Optional[int]:
     if interval is None:
@@ -14,3 +16,9 @@ def convert_interval_to_integer(interval: Optional[str]) -> Optional[int]:
         return value * units[unit]
     except ValueError:
         raise ValueError("Invalid interval")
+
+
+def convert_to_bool(value: Optional[str]) -> bool:
+    if value is None:
+        return False
+    return str(value).strip().lower() in true_values
@@ -0,0 +1,46 @@
+import os
+import select
+import socket
+from typing import Optional
+
+wakeup_message = b"wakeup"
+
+
+def open_wakeup_socket(path: str) -> socket.socket:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    sock.setblocking(False)
+    return sock
+
+
+def notify_creator(path: Optional[str]) -> bool:
+    """
+    Wakes creator up if it listens on `path`. Creator will still find new
+    tables by polling, so it’s fine if nobody is listening.
+    """
+    if not path:
+        return False
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.sendto(wakeup_message, path)
+            return True
+        except OSError:
+            return False
+
+
+def wait_for_wakeup(sock: socket.socket, timeout: float) -> bool:
+    ready, _, _ = select.select([sock], [], [], max(timeout, 0))
+    if not ready:
+        return False
+
+    while True:
+        try:
+            sock.recv(len(wakeup_message))
+        except BlockingIOError:
+            return True
@@ -2,15 +2,20 @@ import os
 import re
 import shutil
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
 import sys
+from unittest.mock import MagicMock
 
 sys.path.append("../duro")
 
 import logzero
+import networkx as nx
 import pytest
 from git import Repo
 
+import create.pipeline as pipeline_module
+import create.process as process_module
 from duro.utils.table import Table
 from tests.create_test_db import ddl, inserts
 
@@ -173,6 +178,57 @@ def table_without_config():
     )
 
 
+@pytest.fixture
+def diamond() -> nx.DiGraph:
+    return nx.DiGraph(
+        [
+            ["second.parent", "second.child"],
+            ["second.parent", "first.countries"],
+            ["second.child", "first.cities"],
+            ["first.countries", "first.cities"],
+        ]
+    )
+
+
+@pytest.fixture
+def venv_path(tmpdir, monkeypatch) -> str:
+    """
+    Environment with only bin/python (the one running tests), processors
+    get it instead of installing their requirements.
+    """
+    venv = tmpdir.mkdir("venv")
+    venv.mkdir("bin").join("python").mksymlinkto(sys.executable)
+
+    @contextmanager
+    def processor_venv(views_path, table_name):
+        yield str(venv)
+
+    monkeypatch.setattr(process_module, "processor_venv", processor_venv)
+    monkeypatch.setattr(pipeline_module, "processor_venv", processor_venv)
+    return str(venv)
+
+
+def mock_connection(fetchone=None, fetchall=None, execute=None, rowcount=0):
+    """
+    Redshift connection and the cursor it opens; fetchone and fetchall
+    return the given results one by one.
+    """
+    connection = MagicMock()
+    connection.autocommit = True
+    cursor = connection.cursor.return_value.__enter__.return_value
+    if fetchone is not None:
+        cursor.fetchone.side_effect = fetchone
+    if fetchall is not None:
+        cursor.fetchall.side_effect = fetchall
+    cursor.execute.side_effect = execute
+    cursor.rowcount = rowcount
+    return connection, cursor
+
+
+def executed_queries(cursor) -> list:
+    return [call[0][0] for call in cursor.execute.call_args_list]
+
+
 def similar_query(first_query: str, second_query: str, *args) -> bool:
     """
     True if all strings are the same after we remove all spaces,
@@ -188,3 +244,5 @@ def similar_query(first_query: str, second_query: str, *args) -> bool:
 
 def pytest_configure():
     pytest.similar = similar_query
+    pytest.mock_connection = mock_connection
+    pytest.executed_queries = executed_queries
@@ -19,7 +19,13 @@ create table tables
     force integer,
     started integer,
     deleted integer,
-    waiting integer
+    waiting integer,
+    lease_owner text,
+    lease_expires integer,
+    heartbeat integer,
+    phase text,
+    fingerprint text,
+    last_snapshot integer
 );
 
 create table timestamps
@@ -28,6 +34,7 @@ create table timestamps
     start int,
     connect int,
     "select" int,
+    venv int,
     create_temp int,
     process int,
     csv int,
@@ -37,7 +44,11 @@ create table timestamps
     tests int,
     replace_old int,
     drop_old int,
+    merge int,
     make_snapshot int,
+    vacuum int,
+    analyze int,
+    skipped int,
     finish int
 );
 
@@ -55,18 +66,18 @@ from first.cities_raw', 1440,
 '{"grant_select": "jane, john"}', 
 null, 0, 0, null, null, null, null);
 
-INSERT INTO tables  
+INSERT INTO tables (table_name, query, interval, config, last_created, mean, times_run, force, started, deleted, waiting) 
 VALUES ('first.countries', 'select country, continent
 from first.countries_raw;', 60, 
 '{"grant_select": "joan, john"}',
 null, 0, 0, null, null, null, null);
 
-INSERT INTO tables 
+INSERT INTO tables (table_name, query, interval, config, last_created, mean, times_run, force, started, deleted, waiting) 
 VALUES ('second.child', 'select city, country from first.cities', null, 
 '{"diststyle": "all", "distkey": "city", "snapshots_interval": "24d", "snapshots_stored_for": "90d"}', 
 null, 0, 0, null, null, null, null);
 
-INSERT INTO tables  
+INSERT INTO tables (table_name, query, interval, config, last_created, mean, times_run, force, started, deleted, waiting) 
 VALUES ('second.parent', 'select * from second.child limit 10', 24, 
 '{"diststyle": "even"}', null, 0, 0, null, null, null, null);
 
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+import pytest
+
+from duro.create.archive import (
+    ArchivedRange,
+    archive_expiring_rows,
+    build_restore_query,
+    build_spectrum_table_query,
+    load_manifest,
+    restore_archived_rows,
+    save_manifest,
+)
+from duro.create.object_store import LocalObjectStore
+
+expired = "valid_to < dateadd('mins', -60, sysdate)"
+
+
+@pytest.fixture
+def store(tmpdir) -> LocalObjectStore:
+    return LocalObjectStore(str(tmpdir))
+
+
+def test_local_object_store(store):
+    assert store.get("archive/first.cities/manifest.json") is None
+    store.put("archive/first.cities/manifest.json", b"{}")
+    store.put("archive/first.countries/manifest.json", b"{}")
+    assert store.get("archive/first.cities/manifest.json") == b"{}"
+    assert store.list("archive/first.cities") == ["archive/first.cities/manifest.json"]
+
+
+def test_nothing_to_archive(store):
+    conn, cursor = pytest.mock_connection(fetchone=[(None, None, 0)])
+    assert (
+        archive_expiring_rows("first.cities", "valid_to", expired, conn, store) is None
+    )
+    assert len(pytest.executed_queries(cursor)) == 1
+    assert load_manifest("first.cities", store) == []
+
+
+def test_archive_expiring_rows(store):
+    start, end = datetime(2018, 3, 1, 12), datetime(2018, 3, 2, 12)
+    conn, cursor = pytest.mock_connection(fetchone=[(start, end, 42)])
+    archived_until = archive_expiring_rows(
+        "first.cities", "valid_to", expired, conn, store
+    )
+    assert archived_until == "2018-03-02 12:00:00"
+
+    unload = pytest.executed_queries(cursor)[1]
+    assert pytest.similar(
+        unload,
+        f"""
+        unload ('select * from first.cities_history
+            where valid_to < dateadd(\\'mins\\', -60, sysdate)
+            and valid_to <= \\'2018-03-02 12:00:00\\'')
+        to 'file://{store.root}/archive/first.cities/data/20180301120000-20180302120000_'
+        format as parquet;
+        """,
+    )
+
+    (archived,) = load_manifest("first.cities", store)
+    assert archived.start == "2018-03-01 12:00:00"
+    assert archived.rows == 42
+    assert archived.prefix == "archive/first.cities/data/20180301120000-20180302120000_"
+
+
+def test_archive_skips_archived_rows(store):
+    # noinspection PyArgumentList
+    save_manifest(
+        "first.cities",
+        [ArchivedRange("2018-03-01 12:00:00", "2018-03-02 12:00:00", 42, "p_", "")],
+        store,
+    )
+
+    conn, cursor = pytest.mock_connection(fetchone=[(None, None, 0)])
+    archived_until = archive_expiring_rows(
+        "first.cities", "valid_to", expired, conn, store
+    )
+    # rows archived before but not deleted yet can be deleted now
+    assert archived_until == "2018-03-02 12:00:00"
+    assert "valid_to > '2018-03-02 12:00:00'" in pytest.executed_queries(cursor)[0]
+
+    conn, _ = pytest.mock_connection(
+        fetchone=[(datetime(2018, 3, 3), datetime(2018, 3, 4), 10)]
+    )
+    archive_expiring_rows("first.cities", "valid_to", expired, conn, store)
+    assert [r.rows for r in load_manifest("first.cities", store)] == [42, 10]
+
+
+def test_restore_archived_rows(store):
+    # noinspection PyArgumentList
+    ranges = [
+        ArchivedRange("2018-03-01 12:00:00", "2018-03-02 12:00:00", 42, "a_", ""),
+        ArchivedRange("2018-03-03 12:00:00", "2018-03-04 12:00:00", 10, "b_", ""),
+    ]
+    save_manifest("first.cities", ranges, store)
+
+    conn, cursor = pytest.mock_connection()
+    restored = restore_archived_rows(
+        "first.cities", "2018-03-02", "2018-03-03", conn, store=store
+    )
+    assert restored == ranges[:1]
+    assert pytest.executed_queries(cursor) == [
+        build_restore_query("first.cities_history", ranges[0], store)
+    ]
+    assert pytest.similar(
+        pytest.executed_queries(cursor)[0],
+        f"""
+        copy first.cities_history
+        from 'file://{store.root}/a_'
+        format as parquet;
+        """,
+    )
+
+
+def test_build_spectrum_table_query(store):
+    columns = [("city", "character varying(256)"), ("valid_to", "timestamp")]
+    assert pytest.similar(
+        build_spectrum_table_query("first.cities", columns, "archive", store),
+        f"""
+        create external table archive.first_cities_history (
+            "city" character varying(256), "valid_to" timestamp
+        )
+        stored as parquet
+        location 'file://{store.root}/archive/first.cities/data/';
+        """,
+    )
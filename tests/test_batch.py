@@ -0,0 +1,114 @@
+from duro.create.batch import SwapBatch, build_batches
+from duro.create.executor import CreationExecutor
+from duro.create.lease import Lease
+from duro.create.plan import CreationPlan, PlanNode
+from duro.create.timestamps import Timestamps
+from duro.utils.global_config import GlobalConfig
+from duro.utils.table import Table
+
+
+def node(name: str, query: str, children):
+    return PlanNode(Table(name, query, 60), children, True)
+
+
+def test_build_batches():
+    nodes = {
+        "first.cities": node("first.cities", "select 1", []),
+        "first.countries": node("first.countries", "select 1", ["first.cities"]),
+        "second.child": node("second.child", "select 1", ["first.cities"]),
+        "second.parent": node(
+            "second.parent", "select 1", ["second.child", "first.countries"]
+        ),
+        "second.lonely": node("second.lonely", "select 1", []),
+    }
+    order = [
+        "first.cities",
+        "first.countries",
+        "second.child",
+        "second.parent",
+        "second.lonely",
+    ]
+    batches = build_batches(CreationPlan(["second.parent"], nodes, order))
+
+    assert batches["first.cities"] is batches["second.parent"]
+    assert batches["second.child"] is batches["first.countries"]
+    assert batches["second.lonely"] is not batches["first.cities"]
+    assert batches["second.parent"].order == order[:4]
+
+
+def test_swap_batch_prepare():
+    batch = SwapBatch(
+        {"first.cities", "second.child"}, ["first.cities", "second.child"]
+    )
+    cities = Table("first.cities", "select 1", 60)
+    batch.stage(cities, Timestamps(), None)
+    assert batch.finish("first.cities") is False
+
+    child = Table("second.child", 'select * from "first"."cities" c', 60)
+    batch.prepare(child, ["first.cities"])
+    assert child.query == "select * from first.cities_duro_temp c"
+    assert child.batch is batch
+
+    not_staged = Table("second.child", "select * from first.countries", 60)
+    batch.prepare(not_staged, ["first.countries"])
+    assert not_staged.query == "select * from first.countries"
+
+    assert batch.finish("second.child") is True
+    assert [s.table.name for s in batch.staged_in_order] == ["first.cities"]
+
+
+def test_executor_swaps_batches(db_str, diamond):
+    queries, swapped = {}, []
+
+    def create(table, _):
+        queries[table.name] = table.query
+        ts = Timestamps()
+        ts.log("start")
+        table.batch.stage(table, ts, None)
+
+    def swap(batch, _):
+        swapped.append([s.table.name for s in batch.staged_in_order])
+        in_progress.append(set(executor.in_progress))
+
+    in_progress = []
+    config = GlobalConfig(db_str, "./views", "./logs", diamond, False, batch_swaps=True)
+    executor = CreationExecutor(workers=2, swap=swap)
+    executor.submit(["second.parent"], config, create)
+    executor.shutdown()
+
+    assert len(swapped) == 1
+    assert swapped[0][0] == "first.cities"
+    assert swapped[0][-1] == "second.parent"
+    assert "second.child_duro_temp" in queries["second.parent"]
+    # staged tables aren’t planned again before the swap
+    assert in_progress == [set(diamond.nodes())]
+    assert not executor.busy
+
+
+def test_swap_batch_holds_leases(db_str, db_cursor):
+    def get_owner(table: str):
+        db_cursor.execute(
+            "SELECT lease_owner FROM tables WHERE table_name = ?", (table,)
+        )
+        return db_cursor.fetchone()[0]
+
+    batch = SwapBatch(
+        {"first.cities", "first.countries"}, ["first.cities", "first.countries"]
+    )
+    batch.stage(Table("first.cities", "select 1", 60), Timestamps(), None)
+    leases = [
+        Lease(db_str, name, "node-a", 60)
+        for name in ("first.cities", "first.countries")
+    ]
+    for lease in leases:
+        assert lease.claim()
+        lease.start()
+
+    assert batch.hold("first.cities", leases[0])
+    assert not batch.hold("first.countries", leases[1])
+    leases[1].release()
+    assert get_owner("first.cities") == "node-a"
+    assert get_owner("first.countries") is None
+
+    batch.release_leases()
+    assert get_owner("first.cities") is None
@@ -0,0 +1,91 @@
+from threading import Thread
+from unittest.mock import MagicMock
+
+import pytest
+
+from duro.create.connection_pool import ConnectionPool
+
+
+def fake_connect():
+    connection = MagicMock()
+    connection.closed = 0
+    connection.autocommit = True
+    fake_connect.created.append(connection)
+    return connection
+
+
+def new_pool(**kwargs) -> ConnectionPool:
+    fake_connect.created = []
+    return ConnectionPool(fake_connect, **kwargs)
+
+
+def test_reuses_connections():
+    pool = new_pool(max_size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert len(fake_connect.created) == 1
+
+    queries = [c[0][0] for c in first.cursor().__enter__().execute.call_args_list]
+    assert queries == ["reset all;", "select 1", "reset all;"]
+
+
+def test_returns_connection_on_error():
+    pool = new_pool(max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("Query failed")
+
+    assert pool.in_use == 0
+    assert len(pool.idle) == 1
+
+
+def test_drops_broken_connections():
+    pool = new_pool()
+    with pool.connection() as first:
+        first.closed = 1
+    assert pool.idle == []
+
+    with pool.connection() as second:
+        pass
+    second.cursor.return_value.__enter__.return_value.execute.side_effect = Exception
+    with pool.connection() as third:
+        assert third is not second
+    assert second.close.called
+    assert len(fake_connect.created) == 3
+
+
+def test_evicts_idle_connections():
+    pool = new_pool(max_idle=0)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is not first
+    assert first.close.called
+
+
+def test_max_size():
+    pool = new_pool(max_size=1)
+    acquired = []
+
+    first = pool.acquire()
+    waiting = Thread(target=lambda: acquired.append(pool.acquire()))
+    waiting.start()
+    waiting.join(0.2)
+    assert acquired == []
+
+    pool.release(first)
+    waiting.join(1)
+    assert acquired == [first]
+    assert len(fake_connect.created) == 1
+
+
+def test_failed_connect_frees_slot():
+    def failing_connect():
+        raise ConnectionError
+
+    pool = ConnectionPool(failing_connect, max_size=1)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.in_use == 0
@@ -16,6 +16,9 @@ from duro.create.sqlite import (
     get_average_completion_time,
     build_query_to_create_timestamps_table,
     get_tables_to_create,
+    get_seconds_till_next_due,
+    log_phase,
+    get_heartbeat,
 )
 from duro.create.timestamps import Timestamps
 from utils.errors import TableNotFoundInDBError
@@ -256,9 +259,10 @@ def test_build_query_to_create_timestamps_table():
         """
         CREATE TABLE IF NOT EXISTS timestamps 
         ("table" text, 
-        "start" int, "connect" int, "select" int, "create_temp" int,
+        "start" int, "connect" int, "select" int, "venv" int, "create_temp" int,
         "process" int, "csv" int, "s3" int, "insert" int, "clean_csv" int,
-        "tests" int, "replace_old" int, "drop_old" int, "make_snapshot" int,
+        "tests" int, "replace_old" int, "drop_old" int, "merge" int, "make_snapshot" int,
+        "vacuum" int, "analyze" int, "skipped" int,
         "finish" int)
     """,
     )
@@ -312,3 +316,31 @@ def test_get_tables_to_create(db_str, db_connection, db_cursor):
     )
     tables = get_tables_to_create(db_str)
     assert tables == [("second.parent",)]
+
+
+def test_get_seconds_till_next_due(db_str):
+    assert get_seconds_till_next_due(db_str) is None
+
+    now = arrow.now().timestamp
+    update_last_created(db_str, "first.countries", now - 600, 10)
+    assert 3000 <= get_seconds_till_next_due(db_str) <= 3060
+
+    update_last_created(db_str, "second.parent", now - 600, 10)
+    assert 840 <= get_seconds_till_next_due(db_str) <= 900
+
+    update_last_created(db_str, "second.parent", now - 6000, 10)
+    assert 3000 <= get_seconds_till_next_due(db_str) <= 3060
+
+
+def test_get_heartbeat(db_str):
+    assert get_heartbeat(db_str, "first.cities") == (None, None)
+
+    log_start(db_str, "first.cities", arrow.now().replace(seconds=-600).timestamp)
+    phase, since_heartbeat = get_heartbeat(db_str, "first.cities")
+    assert phase == "start"
+    assert 599 <= since_heartbeat <= 601
+
+    log_phase(db_str, "first.cities", "tests")
+    phase, since_heartbeat = get_heartbeat(db_str, "first.cities")
+    assert phase == "tests"
+    assert since_heartbeat <= 1
@@ -0,0 +1,193 @@
+from contextlib import contextmanager
+from threading import Event
+from unittest.mock import MagicMock
+
+import pytest
+from psycopg2.extensions import QueryCanceledError
+
+import duro.create.create_table as create_table_module
+from duro.create.create_table import (
+    run_create_table,
+    get_timeout,
+    create_table,
+    is_unchanged,
+)
+from duro.create.sqlite import update_last_created, load_table_details
+from duro.create.timestamps import Timestamps
+from duro.server.sqlite import get_table_details
+from duro.utils.table import Table
+from utils import errors
+from utils.errors import QueryTimeoutError
+
+
+def test_get_timeout(db_str):
+    assert get_timeout(db_str, "first.cities") is None
+    update_last_created(db_str, "first.cities", 1522151698, 127)
+    assert get_timeout(db_str, "first.cities") == 635
+
+
+def pooled(connection):
+    @contextmanager
+    def redshift_connection():
+        try:
+            yield connection
+        finally:
+            connection.returned_to_pool = True
+
+    return redshift_connection
+
+
+def test_run_create_table_cancels_query_on_timeout(db_str, table, monkeypatch):
+    cancelled = Event()
+    connection = MagicMock()
+    connection.cancel = cancelled.set
+
+    def blocking_create_table(*args):
+        cancelled.wait(10)
+        raise QueryCanceledError("canceling statement due to user request")
+
+    monkeypatch.setattr(create_table_module, "redshift_connection", pooled(connection))
+    monkeypatch.setattr(create_table_module, "get_timeout", lambda *args: 0.2)
+    monkeypatch.setattr(create_table_module, "create_table", blocking_create_table)
+
+    with pytest.raises(QueryTimeoutError):
+        run_create_table(table, db_str, "./views")
+
+    assert cancelled.is_set()
+    assert connection.returned_to_pool is True
+    assert not connection.close.called
+    statement_timeout = connection.cursor.return_value.__enter__.return_value.execute
+    statement_timeout.assert_called_with("set statement_timeout to 200;")
+
+
+def test_run_create_table_terminates_query_ignoring_cancel(db_str, table, monkeypatch):
+    finished = Event()
+    returned = Event()
+    terminated = []
+    connection = MagicMock()
+    connection.get_backend_pid.return_value = 42
+
+    def stuck_create_table(*args):
+        finished.wait(10)
+
+    @contextmanager
+    def redshift_connection():
+        try:
+            yield connection
+        finally:
+            returned.set()
+
+    monkeypatch.setattr(create_table_module, "redshift_connection", redshift_connection)
+    monkeypatch.setattr(create_table_module, "get_timeout", lambda *args: 0.2)
+    monkeypatch.setattr(create_table_module, "cancel_grace_period", 0.1)
+    monkeypatch.setattr(create_table_module, "terminate_backend", terminated.append)
+    monkeypatch.setattr(create_table_module, "create_table", stuck_create_table)
+
+    with pytest.raises(QueryTimeoutError):
+        run_create_table(table, db_str, "./views")
+
+    assert connection.cancel.called
+    assert terminated == [42]
+    assert not connection.close.called
+    # the connection goes back to the pool only when the thread is done with it
+    assert not returned.is_set()
+    finished.set()
+    assert returned.wait(5)
+
+
+def test_run_create_table_converts_server_side_timeouts(db_str, table, monkeypatch):
+    def cancelled_create_table(*args):
+        raise QueryCanceledError("canceling statement due to statement timeout")
+
+    monkeypatch.setattr(create_table_module, "redshift_connection", pooled(MagicMock()))
+    monkeypatch.setattr(create_table_module, "get_timeout", lambda *args: 10)
+    monkeypatch.setattr(create_table_module, "create_table", cancelled_create_table)
+
+    with pytest.raises(QueryTimeoutError):
+        run_create_table(table, db_str, "./views")
+
+
+def test_create_table_skips_unchanged_inputs(db_str, db_cursor, monkeypatch):
+    update_last_created(db_str, "first.cities", 1522151698, 127, "abc")
+    table = Table(
+        "first.cities", "select * from first.countries", 60, {"skip_unchanged": "yes"}
+    )
+    monkeypatch.setattr(
+        create_table_module, "get_inputs_fingerprint", lambda *args: "abc"
+    )
+
+    ts = Timestamps()
+    ts.log("start")
+    create_table(table, db_str, "./views", MagicMock(), ts)
+
+    details = get_table_details(db_cursor, "first.cities")[0]
+    assert details["skipped"] == ts.start
+    assert details["finish"] is None
+
+    cities = load_table_details(db_str, "first.cities")
+    assert cities.last_created == ts.start
+    db_cursor.execute("SELECT mean FROM tables WHERE table_name = 'first.cities'")
+    assert db_cursor.fetchone()[0] == 127
+
+
+def test_is_unchanged(db_str):
+    update_last_created(db_str, "first.cities", 1522151698, 127, "abc")
+    table = Table("first.cities", "", 60, {"skip_unchanged": "yes"})
+    assert is_unchanged(table, db_str, "abc") is True
+    assert is_unchanged(table, db_str, "def") is False
+    assert is_unchanged(table, db_str, None) is False
+
+    table.force = True
+    assert is_unchanged(table, db_str, "abc") is False
+
+
+def test_create_table_updates_incrementally(db_str, db_cursor, monkeypatch):
+    table = Table(
+        "first.cities",
+        "select * from first.cities_raw",
+        60,
+        {"strategy": "incremental", "incremental_key": "updated"},
+    )
+    steps = []
+    monkeypatch.setattr(create_table_module, "get_high_water_mark", lambda *a: 10)
+    monkeypatch.setattr(
+        create_table_module,
+        "create_increment_table",
+        lambda t, mark, c: steps.append(("increment", mark)),
+    )
+    monkeypatch.setattr(
+        create_table_module, "merge_increment", lambda *a: steps.append("merge")
+    )
+    monkeypatch.setattr(
+        create_table_module, "drop_temp_table", lambda *a: steps.append("drop")
+    )
+    monkeypatch.setattr(
+        create_table_module, "replace_old_table", lambda *a: steps.append("replace")
+    )
+    monkeypatch.setattr(create_table_module, "run_tests", lambda *a: (True, None))
+
+    connection = MagicMock()
+    ts = Timestamps()
+    ts.log("start")
+    create_table(table, db_str, "./views", connection, ts)
+
+    assert steps == [("increment", 10), "merge", "drop"]
+    assert connection.commit.called
+    assert get_table_details(db_cursor, "first.cities")[0]["merge"] == ts.finish
+
+    steps.clear()
+    monkeypatch.setattr(create_table_module, "run_tests", lambda *a: (False, ["x"]))
+    with pytest.raises(errors.TestsFailedError):
+        create_table(table, db_str, "./views", connection, Timestamps())
+    assert steps == [("increment", 10), "merge", "drop"]
+    assert connection.rollback.called
+
+    steps.clear()
+    table.force = True
+    monkeypatch.setattr(create_table_module, "run_tests", lambda *a: (True, None))
+    monkeypatch.setattr(create_table_module, "create_temp_table", lambda *a: None)
+    monkeypatch.setattr(create_table_module, "drop_old_table", lambda *a: None)
+    ts = Timestamps()
+    ts.log("start")
+    create_table(table, db_str, "./views", connection, ts)
+    assert steps == ["replace"]
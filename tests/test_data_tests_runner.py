@@ -1,6 +1,14 @@
+import psycopg2
 import pytest
 
-from duro.create.data_tests import parse_tests_results, load_tests
+from duro.create.data_tests import (
+    parse_tests_results,
+    load_tests,
+    parse_simple_test,
+    build_combined_tests_query,
+    build_test_column,
+    run_tests,
+)
 
 
 def test_parse_tests_results():
@@ -32,3 +40,124 @@ def test_load_tests(views_path):
 
     countries_tests = load_tests("first.countries", views_path)
     assert pytest.similar(countries_reference, countries_tests)
+
+
+def test_parse_simple_test():
+    test = parse_simple_test(
+        """
+        select (city = 'Paris') as correct_capital_of_france
+        from first.cities_duro_temp
+        where country = 'France'
+    """
+    )
+    assert test.name == "correct_capital_of_france"
+    assert test.expression == "(city = 'Paris')"
+    assert test.table == "first.cities_duro_temp"
+    assert test.condition == "country = 'France'"
+
+    aggregate = parse_simple_test("select count(*) > 0 as not_empty from first.cities")
+    assert aggregate.expression == "count(*) > 0"
+    assert aggregate.condition is None
+
+    assert parse_simple_test("select cast(id as int) > 0 as positive from t").name == (
+        "positive"
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "select count(*) > 0 as has_french from first.cities where country = 'FR'",
+        "select count(*) as cities, 1 as one from first.cities",
+        "select (c.city = 'Paris') as paris from first.cities c join first.countries",
+        "select count(*) = 1 as single from first.cities group by city",
+        "select (select 1) = 1 as nested from first.cities",
+        "select (city = 'Paris') from first.cities",
+        "select (city = 'Paris') as paris from first.cities -- comment",
+        "\n",
+    ],
+)
+def test_tests_that_cant_be_combined(query):
+    assert parse_simple_test(query) is None
+
+
+def test_build_combined_tests_query():
+    queries = [
+        "select (city = 'Paris') as paris from first.cities where country = 'France'",
+        "select count(*) > 0 as not_empty from first.cities",
+        "select (continent = 'Europe') as europe from first.countries",
+    ]
+    query = build_combined_tests_query([parse_simple_test(q) for q in queries])
+    assert pytest.similar(
+        query,
+        """
+        select * from (
+            select bool_and(
+                case when country = 'France' then coalesce((city = 'Paris'), false) end
+            ) as paris,
+                count(*) > 0 as not_empty
+            from first.cities
+        ) as tests_0 cross join (
+            select bool_and(coalesce((continent = 'Europe'), false)) as europe
+            from first.countries
+        ) as tests_1
+    """,
+    )
+
+
+def test_combined_row_tests_fail_on_nulls():
+    test = parse_simple_test("select population > 0 as populated from first.countries")
+    assert pytest.similar(
+        build_test_column(test),
+        "bool_and(coalesce(population > 0, false)) as populated",
+    )
+
+    conditional = parse_simple_test(
+        "select population > 0 as populated from first.countries where area > 10"
+    )
+    assert pytest.similar(
+        build_test_column(conditional),
+        """
+        bool_and(case when area > 10 then coalesce(population > 0, false) end)
+            as populated
+        """,
+    )
+
+
+class Column:
+    def __init__(self, name):
+        self.name = name
+
+
+tests_queries = """
+    select (city = 'Paris') as paris from first.cities where country = 'France';
+    select (city = 'Ottawa') as ottawa from first.cities where country = 'Canada';
+    select count(*) as cities, 1 as one from first.cities
+"""
+
+
+def test_run_combined_tests():
+    def execute(query):
+        if query.startswith("select * from"):
+            cursor.description = [Column("paris"), Column("ottawa")]
+            cursor.fetchone.return_value = (True, False)
+        else:
+            cursor.description = [Column("cities")]
+            cursor.fetchone.return_value = (10,)
+
+    conn, cursor = pytest.mock_connection(execute=execute)
+    assert run_tests(tests_queries, conn, combine=True) == (False, ["ottawa"])
+    assert cursor.execute.call_count == 2
+
+
+def test_run_combined_tests_fallback():
+    def execute(query):
+        if query.startswith("select * from"):
+            raise psycopg2.ProgrammingError("function bool_and(integer) does not exist")
+        name = "cities" if "count" in query else "paris"
+        cursor.description = [Column(name)]
+        cursor.fetchone.return_value = (True,)
+
+    conn, cursor = pytest.mock_connection(execute=execute)
+    assert run_tests(tests_queries, conn, combine=True) == (True, None)
+    assert cursor.execute.call_count == 4
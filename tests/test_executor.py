@@ -0,0 +1,58 @@
+import time
+from threading import Lock, Event
+
+from duro.create.executor import CreationExecutor, PriorityPool, list_tree
+from duro.utils.global_config import GlobalConfig
+
+
+def test_list_tree(diamond):
+    assert list_tree("second.child", diamond) == {"second.child", "first.cities"}
+    assert list_tree("unknown.table", diamond) == {"unknown.table"}
+    assert list_tree("unknown.table", None) == {"unknown.table"}
+
+
+def test_creation_executor(db_str, diamond):
+    running, max_running, created = [0], [0], []
+    lock = Lock()
+
+    def create(table, _):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.2)
+        with lock:
+            running[0] -= 1
+            created.append(table.name)
+
+    config = GlobalConfig(db_str, "./views", "./logs", diamond, False)
+    executor = CreationExecutor(workers=3)
+    plan = executor.submit(["second.parent", "first.countries"], config, create)
+    assert len(plan) == 4
+
+    assert len(executor.submit(["second.child"], config, create)) == 0
+    executor.shutdown()
+
+    assert max_running[0] == 2
+    assert sorted(created) == sorted(plan.tables_to_create)
+    assert created[0] == "first.cities"
+    assert created[-1] == "second.parent"
+    assert executor.busy is False
+
+
+def test_priority_pool():
+    started, created = Event(), []
+
+    def blocking():
+        started.set()
+        time.sleep(0.2)
+
+    pool = PriorityPool(workers=1)
+    pool.submit((False, 0), blocking)
+    started.wait(1)
+    pool.submit((False, 10), created.append, "short")
+    pool.submit((False, 1000), created.append, "long")
+    pool.submit((True, 0), created.append, "forced")
+    pool.submit((False, 100), created.append, "medium")
+    pool.shutdown()
+
+    assert created == ["forced", "long", "medium", "short"]
@@ -0,0 +1,108 @@
+import time
+from multiprocessing import Pool
+
+import arrow
+
+from duro.create.lease import Lease, get_creator_id
+from duro.create.sqlite import (
+    claim_table,
+    renew_lease,
+    release_lease,
+    reclaim_expired_leases,
+    log_start,
+    claim_lock,
+    renew_lock,
+    release_lock,
+)
+
+
+def get_lease(db_cursor, table: str):
+    db_cursor.execute(
+        "SELECT lease_owner, lease_expires FROM tables WHERE table_name = ?", (table,)
+    )
+    return tuple(db_cursor.fetchone())
+
+
+def test_claim_table(db_str, db_cursor):
+    assert claim_table(db_str, "first.cities", "node-a", 60)
+    owner, expires = get_lease(db_cursor, "first.cities")
+    assert owner == "node-a"
+    assert expires >= arrow.now().timestamp + 59
+
+    assert not claim_table(db_str, "first.cities", "node-b", 60)
+    assert claim_table(db_str, "first.cities", "node-a", 60)
+    assert not claim_table(db_str, "non-existent", "node-a", 60)
+
+
+def test_claim_expired_lease(db_str, db_cursor):
+    assert claim_table(db_str, "first.cities", "node-a", -10)
+    assert claim_table(db_str, "first.cities", "node-b", 60)
+    assert get_lease(db_cursor, "first.cities")[0] == "node-b"
+
+
+def test_renew_and_release_lease(db_str, db_cursor):
+    claim_table(db_str, "first.cities", "node-a", 10)
+    assert renew_lease(db_str, "first.cities", "node-a", 600)
+    assert get_lease(db_cursor, "first.cities")[1] >= arrow.now().timestamp + 599
+    assert not renew_lease(db_str, "first.cities", "node-b", 600)
+
+    release_lease(db_str, "first.cities", "node-b")
+    assert get_lease(db_cursor, "first.cities")[0] == "node-a"
+    release_lease(db_str, "first.cities", "node-a")
+    assert get_lease(db_cursor, "first.cities") == (None, None)
+
+
+def test_claim_lock(db_str):
+    assert claim_lock(db_str, "vacuum", "node-a", 60)
+    assert not claim_lock(db_str, "vacuum", "node-b", 60)
+    assert claim_lock(db_str, "other", "node-b", 60)
+    assert renew_lock(db_str, "vacuum", "node-a", -10)
+    assert not renew_lock(db_str, "vacuum", "node-b", 60)
+
+    # expired
+    assert claim_lock(db_str, "vacuum", "node-b", 60)
+    release_lock(db_str, "vacuum", "node-a")
+    assert not claim_lock(db_str, "vacuum", "node-a", 60)
+    release_lock(db_str, "vacuum", "node-b")
+    assert claim_lock(db_str, "vacuum", "node-a", 60)
+
+
+def test_reclaim_expired_leases(db_str, db_cursor):
+    claim_table(db_str, "first.cities", "node-a", -10)
+    log_start(db_str, "first.cities", arrow.now().timestamp)
+    claim_table(db_str, "first.countries", "node-b", 600)
+    log_start(db_str, "first.countries", arrow.now().timestamp)
+    log_start(db_str, "second.child", arrow.now().timestamp)
+
+    assert sorted(reclaim_expired_leases(db_str)) == ["first.cities", "second.child"]
+    db_cursor.execute(
+        """SELECT table_name FROM tables
+        WHERE started IS NOT NULL OR lease_owner IS NOT NULL"""
+    )
+    assert [row[0] for row in db_cursor.fetchall()] == ["first.countries"]
+
+
+def test_lease_heartbeat(db_str, db_cursor):
+    lease = Lease(db_str, "first.cities", "node-a", 3)
+    assert lease.claim()
+    claimed_till = get_lease(db_cursor, "first.cities")[1]
+    with lease:
+        time.sleep(1.5)
+        assert get_lease(db_cursor, "first.cities")[1] > claimed_till
+    assert get_lease(db_cursor, "first.cities") == (None, None)
+
+
+def test_get_creator_id():
+    assert get_creator_id("node-a") == "node-a"
+    assert ":" in get_creator_id()
+
+
+def claim_in_process(args) -> bool:
+    db_str, owner = args
+    return claim_table(db_str, "first.cities", owner, 60)
+
+
+def test_only_one_process_claims_table(db_str):
+    with Pool(8) as pool:
+        results = pool.map(claim_in_process, [(db_str, f"node-{i}") for i in range(8)])
+    assert results.count(True) == 1
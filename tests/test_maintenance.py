@@ -0,0 +1,186 @@
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Barrier
+from datetime import time
+from unittest.mock import MagicMock
+
+import pytest
+
+import duro.create.maintenance as maintenance_module
+from duro.create.maintenance import (
+    MaintenanceScheduler,
+    MaintenanceTask,
+    TableInfo,
+    in_window,
+    parse_window,
+    plan_steps,
+    run_maintenance,
+    run_step,
+)
+from duro.create.lease import ClusterLock
+from duro.create.sqlite import claim_lock, release_lock
+from duro.create.timestamps import Timestamps
+from duro.utils.table import Table
+
+
+def table(config=None) -> Table:
+    return Table("first.cities", "select * from first.cities_raw", 60, config)
+
+
+def test_maintenance_config():
+    default = table()
+    assert (default.analyze, default.vacuum) == ("threshold", "threshold")
+    assert (default.analyze_threshold, default.vacuum_threshold) == (10, 20)
+
+    configured = table({"analyze": "always", "vacuum_threshold": "5"})
+    assert configured.analyze == "always"
+    assert configured.vacuum_threshold == 5
+
+
+def test_parse_window():
+    assert parse_window(None) is None
+    assert parse_window("01:00-06:30") == (time(1), time(6, 30))
+    with pytest.raises(ValueError):
+        parse_window("at night")
+
+
+def test_in_window():
+    assert in_window(None, time(12))
+    assert in_window((time(1), time(6)), time(3))
+    assert not in_window((time(1), time(6)), time(12))
+    assert in_window((time(22), time(4)), time(23))
+    assert in_window((time(22), time(4)), time(1))
+    assert not in_window((time(22), time(4)), time(12))
+
+
+def test_plan_steps():
+    fresh = TableInfo(stats_off=0, unsorted=0, rows=100, visible_rows=100)
+    assert plan_steps(table(), fresh) == []
+
+    stale = TableInfo(stats_off=50, unsorted=None, rows=100, visible_rows=70)
+    assert stale.deleted == 30
+    assert plan_steps(table(), stale) == ["vacuum", "analyze"]
+    assert plan_steps(table({"vacuum": "never"}), stale) == ["analyze"]
+    assert plan_steps(table({"vacuum_threshold": "40"}), stale) == ["analyze"]
+
+    assert plan_steps(table({"analyze": "always"}), fresh) == ["analyze"]
+    assert plan_steps(table({"analyze": "always"}), None) == ["analyze"]
+    assert plan_steps(table(), None) == []
+
+
+def test_run_maintenance(db_str, monkeypatch):
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [
+        ("first.cities", 0, 0, 100, 100),
+        ("first.cities_history", 30, 50, 100, 100),
+    ]
+
+    @contextmanager
+    def redshift_connection():
+        yield connection
+
+    updates = []
+    monkeypatch.setattr(maintenance_module, "redshift_connection", redshift_connection)
+    monkeypatch.setattr(
+        maintenance_module,
+        "update_timestamps",
+        lambda db, name, ts, events: updates.append((name, events)),
+    )
+
+    ts = Timestamps()
+    ts.log("start")
+    # noinspection PyArgumentList
+    vacuum_lock = ClusterLock(db_str, "vacuum", "node-a", 60)
+    events = run_maintenance(MaintenanceTask(table(), ts, True), db_str, vacuum_lock)
+
+    assert events == ["vacuum", "analyze"]
+    assert updates == [("first.cities", ["vacuum", "analyze"])]
+    queries = [call[0][0] for call in cursor.execute.call_args_list]
+    assert queries[1:] == [
+        "vacuum first.cities_history;",
+        "analyze first.cities_history;",
+    ]
+    assert cursor.execute.call_args_list[0][0][1] == (
+        ("first.cities", "first.cities_history"),
+    )
+
+
+def test_vacuums_run_one_at_a_time(db_str):
+    vacuums, overlap = [0], [0]
+    # both analyzes have to run at the same time to pass it
+    analyzes = Barrier(2, timeout=5)
+
+    def execute(query):
+        if query.startswith("analyze"):
+            analyzes.wait()
+            return
+        vacuums[0] += 1
+        overlap[0] = max(overlap[0], vacuums[0])
+        time_module.sleep(0.05)
+        vacuums[0] -= 1
+
+    connection = MagicMock()
+    connection.cursor.return_value.__enter__.return_value.execute = execute
+
+    vacuum_lock = ClusterLock(db_str, "vacuum", "node-a", 60)
+    steps = ["vacuum", "vacuum", "vacuum", "analyze", "analyze"]
+    with ThreadPoolExecutor(len(steps)) as pool:
+        list(
+            pool.map(
+                lambda step: run_step(step, "first.cities", connection, vacuum_lock),
+                steps,
+            )
+        )
+
+    assert overlap == [1]
+
+
+def test_vacuum_waits_for_other_creators(db_str):
+    vacuum_lock = ClusterLock(db_str, "vacuum", "node-a", 60, poll_seconds=0.05)
+    assert claim_lock(db_str, "vacuum", "other-host:1", 60)
+    connection = MagicMock()
+    execute = connection.cursor.return_value.__enter__.return_value.execute
+
+    with ThreadPoolExecutor(1) as pool:
+        vacuum = pool.submit(
+            run_step, "vacuum", "first.cities", connection, vacuum_lock
+        )
+        time_module.sleep(0.2)
+        assert not execute.called
+        release_lock(db_str, "vacuum", "other-host:1")
+        vacuum.result(timeout=5)
+
+    execute.assert_called_once_with("vacuum first.cities;")
+    # released after the vacuum
+    assert claim_lock(db_str, "vacuum", "other-host:1", 60)
+
+
+def test_scheduler_runs_only_in_window(monkeypatch):
+    maintained = []
+    monkeypatch.setattr(
+        maintenance_module,
+        "run_maintenance",
+        lambda task, *args: maintained.append(task.table.name),
+    )
+
+    scheduler = MaintenanceScheduler("db", 1, "01:00-06:00")
+    ts = Timestamps()
+    scheduler.schedule(table(), ts)
+    scheduler.schedule(table(), ts)
+    scheduler.schedule(table({"analyze": "never", "vacuum": "never"}), ts)
+    assert list(scheduler.pending) == ["first.cities"]
+
+    assert scheduler.run_pending(time(12)) == []
+    assert scheduler.run_pending(time(2)) == ["first.cities"]
+    scheduler.pool.shutdown()
+    assert maintained == ["first.cities"]
+    assert not scheduler.pending and not scheduler.running
+
+
+def test_disabled_scheduler():
+    scheduler = MaintenanceScheduler("db")
+    scheduler.schedule(table(), Timestamps())
+    assert not scheduler.pending
+    assert scheduler.run_pending(time(2)) == []
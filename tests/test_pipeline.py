@@ -0,0 +1,102 @@
+import gzip
+from unittest.mock import MagicMock
+
+import pytest
+
+import create.pipeline as pipeline_module
+from create.object_store import LocalObjectStore
+from create.pipeline import iter_csv_records, run_pipeline
+from create.timestamps import Timestamps
+from utils.errors import ProcessorRunError
+from utils.table import Table
+
+processor_code = """
+import csv
+import sys
+
+with open(sys.argv[1]) as input_file, open(sys.argv[2], "w") as output_file:
+    reader = csv.reader(input_file, delimiter=";")
+    writer = csv.writer(output_file, delimiter=";")
+    writer.writerow(next(reader) + ["length"])
+    for row in reader:
+        if row[0] == "fail":
+            sys.exit("can’t process " + row[0])
+        writer.writerow(row + [len(row[0])])
+"""
+
+
+@pytest.fixture
+def processor(tmpdir, venv_path) -> str:
+    path = tmpdir.join("processor.py")
+    path.write(processor_code)
+    return str(path)
+
+
+def mock_connection(batches: list) -> MagicMock:
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.description = [("city",)]
+    cursor.fetchmany.side_effect = batches + [[]]
+    return connection
+
+
+def test_iter_csv_records():
+    lines = ['a;"b\n', 'c";d\n', 'e;"f ""g"""\n']
+    assert list(iter_csv_records(lines)) == ['a;"b\nc";d\n', 'e;"f ""g"""\n']
+
+
+def test_iter_csv_records_with_escaped_quotes():
+    lines = ['a;"b \\"c\n', 'd";e\n', 'f;"\\""\n', "g;h\r\n"]
+    assert list(iter_csv_records(lines)) == [
+        'a;"b \\"c\nd";e\n',
+        'f;"\\""\n',
+        "g;h\r\n",
+    ]
+
+
+def test_run_pipeline(processor, tmpdir, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "part_bytes", 10)
+    store = LocalObjectStore(str(tmpdir.join("bucket")))
+    table = Table("first.cities", "select city from first.cities_raw", 60)
+    connection = mock_connection([[("Paris",), ("Oslo",)], [("Ulaanbaatar",)]])
+    ts = Timestamps()
+
+    keys, sizes = run_pipeline(
+        table,
+        processor,
+        "views",
+        str(tmpdir.join("parts")),
+        "processed/cities/",
+        connection,
+        store,
+        ts,
+    )
+
+    assert keys == ["processed/cities/0000.csv.gz", "processed/cities/0001.csv.gz"]
+    contents = [gzip.decompress(store.get(key)).decode() for key in keys]
+    assert contents == [
+        "city;length\r\nParis;5\r\nOslo;4\r\n",
+        "city;length\r\nUlaanbaatar;11\r\n",
+    ]
+    assert sizes == [len(store.get(key)) for key in keys]
+    assert ts.select and ts.process
+    assert tmpdir.join("parts").listdir() == []
+
+
+def test_run_pipeline_processor_error(processor, tmpdir):
+    store = LocalObjectStore(str(tmpdir.join("bucket")))
+    table = Table("first.cities", "select city from first.cities_raw", 60)
+    connection = mock_connection([[("Paris",), ("fail",)]])
+
+    with pytest.raises(ProcessorRunError) as e:
+        run_pipeline(
+            table,
+            processor,
+            "views",
+            str(tmpdir.join("parts")),
+            "processed/cities/",
+            connection,
+            store,
+            Timestamps(),
+        )
+    assert "can’t process fail" in str(e.value)
@@ -0,0 +1,60 @@
+import networkx as nx
+
+from duro.create.plan import build_plan, order_children_first
+from duro.create.sqlite import update_last_created
+from duro.utils.global_config import GlobalConfig
+
+
+def global_config(db_str: str, graph: nx.DiGraph) -> GlobalConfig:
+    return GlobalConfig(db_str, "./views", "./logs", graph, False)
+
+
+def test_order_children_first(diamond):
+    order = order_children_first(["second.parent", "first.countries"], diamond)
+    assert len(order) == 4
+    assert order[0] == "first.cities"
+    assert order[-1] == "second.parent"
+
+    cycle = nx.DiGraph([["a", "b"], ["b", "a"]])
+    assert order_children_first(["a"], cycle) == ["b", "a"]
+    assert order_children_first(["a", "b", "a"], None) == ["a", "b"]
+
+
+def test_build_plan(db_str, diamond):
+    plan = build_plan(
+        ["second.parent", "first.countries"], global_config(db_str, diamond)
+    )
+    assert plan.order[0] == "first.cities"
+    assert plan.order[-1] == "second.parent"
+    assert len(plan) == 4
+    assert sorted(plan.children_to_create("second.parent")) == [
+        "first.countries",
+        "second.child",
+    ]
+    assert sorted(plan.parents("first.cities")) == ["first.countries", "second.child"]
+    assert plan.nodes["second.child"].table.interval == 24
+    assert plan.nodes["first.countries"].table.interval == 60
+    assert str(plan).startswith("Plan for second.parent, first.countries: create")
+
+
+def test_build_plan_skips_fresh_tables(db_str, diamond):
+    update_last_created(db_str, "first.cities", 2_000_000_000, 10)
+    plan = build_plan(["second.parent"], global_config(db_str, diamond))
+    assert "first.cities" not in plan.tables_to_create
+    assert plan.nodes["first.cities"].build is False
+    assert plan.children_to_create("first.countries") == []
+    assert str(plan).endswith("skip: first.cities")
+
+    update_last_created(db_str, "second.parent", 2_000_000_000, 10)
+    plan = build_plan(["second.parent"], global_config(db_str, diamond))
+    assert plan.tables_to_create == []
+    assert list(plan.nodes) == ["second.parent"]
+
+
+def test_build_plan_skips_tables_missing_from_graph(db_str):
+    plan = build_plan(
+        ["first.cities", "second.parent"],
+        global_config(db_str, nx.DiGraph([["second.parent", "second.child"]])),
+    )
+    assert plan.roots == ["second.parent"]
+    assert plan.tables_to_create == ["second.child", "second.parent"]
@@ -0,0 +1,92 @@
+import arrow
+import networkx as nx
+
+from duro.create.priority import (
+    expected_path,
+    count_blocked_roots,
+    overdue_ratio,
+    compute_priorities,
+)
+from duro.create.sqlite import TableStats, get_tables_stats, update_last_created
+
+graph = nx.DiGraph(
+    [
+        ["first.report", "first.wide"],
+        ["second.report", "first.wide"],
+        ["third.report", "third.narrow"],
+        ["first.wide", "first.raw"],
+    ]
+)
+
+
+def stats(name, duration, interval=60, last_created=None, force=False):
+    return name, TableStats(name, interval, last_created, force, duration)
+
+
+all_stats = dict(
+    [
+        stats("first.report", 100),
+        stats("second.report", 300),
+        stats("third.report", 10),
+        stats("first.wide", 2000),
+        stats("third.narrow", 50),
+        stats("first.raw", 10, force=True),
+    ]
+)
+
+
+def test_expected_path():
+    memo = {}
+    assert expected_path("first.report", graph, all_stats, memo) == 100
+    assert expected_path("first.wide", graph, all_stats, memo) == 2300
+    assert expected_path("first.raw", graph, all_stats, memo) == 2310
+    assert expected_path("unknown", graph, all_stats, memo) == 0
+
+    cycle = nx.DiGraph(
+        [["first.report", "second.report"], ["second.report", "first.report"]]
+    )
+    assert expected_path("first.report", cycle, all_stats, {}) == 400
+
+
+def test_count_blocked_roots():
+    assert count_blocked_roots("first.raw", graph) == 2
+    assert count_blocked_roots("third.narrow", graph) == 1
+    assert count_blocked_roots("third.report", graph) == 1
+    assert count_blocked_roots("unknown", None) == 1
+
+
+def test_overdue_ratio():
+    now = arrow.now().timestamp
+    assert overdue_ratio(None, now) == 0
+    assert overdue_ratio(TableStats("a", None, now, False, 1), now) == 0
+    assert overdue_ratio(TableStats("a", 60, None, False, 1), now) == 1
+    assert overdue_ratio(TableStats("a", 60, now - 30 * 60, False, 1), now) == 0
+    assert overdue_ratio(TableStats("a", 60, now - 90 * 60, False, 1), now) == 0.5
+    assert overdue_ratio(TableStats("a", 60, now - 9000 * 60, False, 1), now) == 10
+
+
+def test_compute_priorities():
+    priorities = compute_priorities(all_stats.keys(), graph, all_stats)
+    ordered = sorted(priorities, key=lambda name: priorities[name], reverse=True)
+    assert ordered == [
+        "first.raw",
+        "first.wide",
+        "second.report",
+        "first.report",
+        "third.narrow",
+        "third.report",
+    ]
+
+
+def test_get_tables_stats(db_str):
+    update_last_created(db_str, "first.countries", arrow.now().timestamp, 367)
+    tables_stats = get_tables_stats(db_str)
+    assert set(tables_stats) == {
+        "first.cities",
+        "first.countries",
+        "second.child",
+        "second.parent",
+    }
+    assert tables_stats["first.countries"].duration == 367
+    assert tables_stats["first.cities"].interval == 1440
+    assert tables_stats["first.cities"].force is False
@@ -1,8 +1,31 @@
 import os
 import csv
+import gzip
+import json
+from collections import namedtuple
+from decimal import Decimal
+from unittest.mock import MagicMock
 
-from create.process import run_processor
+import pytest
+
+from create.object_store import LocalObjectStore
+from create.timestamps import Timestamps
+from create.process import (
+    copy_to_redshift,
+    process_to_parts,
+    run_processor,
+    run_processor_in_chunks,
+    select_to_columnar,
+    select_to_csv,
+    split_to_chunks,
+    split_to_parts,
+    unload_to_csv,
+    upload_parts,
+    write_manifest,
+)
+from utils.errors import ProcessorRunError
 from utils.file_utils import find_processor
+from utils.table import Table
 
 
 def test_run_processor(views_path):
@@ -24,3 +47,330 @@ def test_run_processor(views_path):
 
     os.remove(selected)
     os.remove(processed)
+
+
+def test_select_to_csv(tmpdir):
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.description = [("country",), ("continent",)]
+    cursor.fetchmany.side_effect = [
+        [("France", "Europe"), ("Canada", None)],
+        [("Japan;Nippon", "Asia")],
+        [],
+    ]
+    filename = str(tmpdir.join("selected.csv"))
+
+    stats = select_to_csv("select * from first.countries", filename, connection, 2)
+
+    connection.cursor.assert_called_once_with("duro_select")
+    with open(filename) as csvfile:
+        content = csvfile.read()
+    assert content.splitlines() == [
+        "country;continent",
+        "France;Europe",
+        "Canada;",
+        '"Japan;Nippon";Asia',
+    ]
+    assert stats.rows == 3
+    assert stats.bytes == os.path.getsize(filename)
+
+
+def test_unload_to_csv(tmpdir):
+    store = LocalObjectStore(str(tmpdir.join("bucket")))
+    parts = {
+        "0000_part_00.gz": "country;continent\nFrance;Europe\n",
+        "0001_part_00.gz": 'country;continent\nCanada;America\n"Japan;Nippon";Asia\n',
+        "0002_part_00.gz": "country;continent\n",
+    }
+
+    def execute(query):
+        if query.strip().startswith("unload"):
+            execute.unload = query
+            for name, content in parts.items():
+                store.put(f"unload/countries/{name}", gzip.compress(content.encode()))
+
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.execute.side_effect = execute
+    cursor.fetchone.return_value = (3,)
+    filename = str(tmpdir.join("countries.csv"))
+
+    stats = unload_to_csv(
+        "select * from first.countries where continent <> 'Asia';\n",
+        filename,
+        connection,
+        store,
+    )
+
+    assert pytest.similar(
+        execute.unload,
+        f"""
+        unload ('select * from first.countries where continent <> \\'Asia\\'')
+        to 'file://{store.root}/unload/countries/'
+        format as csv
+        delimiter ';'
+        header
+        gzip
+        parallel on;
+        """,
+    )
+    with open(filename) as csvfile:
+        assert list(csv.reader(csvfile, delimiter=";")) == [
+            ["country", "continent"],
+            ["France", "Europe"],
+            ["Canada", "America"],
+            ["Japan;Nippon", "Asia"],
+        ]
+    assert stats.rows == 3
+    assert store.list("unload") == []
+    assert not os.path.exists(str(tmpdir.join("countries_parts")))
+
+
+def test_split_to_parts(tmpdir):
+    filename = str(tmpdir.join("processed.csv"))
+    with open(filename, "w") as csvfile:
+        csvfile.write('country;note\nFrance;"two\nlines"\nCanada;\nJapan;"a ""b"""\n')
+
+    parts = split_to_parts(filename, str(tmpdir.join("parts")), 2)
+
+    contents = []
+    for part in parts:
+        with gzip.open(part, "rt") as part_file:
+            contents.append(part_file.read())
+    assert contents == [
+        'country;note\nFrance;"two\nlines"\nJapan;"a ""b"""\n',
+        "country;note\nCanada;\n",
+    ]
+
+
+def test_upload_and_copy_parts(tmpdir):
+    store = LocalObjectStore(str(tmpdir.join("bucket")))
+    parts = [str(tmpdir.join(f"{i:04}.csv.gz")) for i in range(2)]
+    for part in parts:
+        with gzip.open(part, "wt") as part_file:
+            part_file.write("country\n")
+
+    keys = upload_parts(parts, "processed/countries/", store)
+    manifest_key = write_manifest(keys, [10, 20], "processed/countries/", store)
+
+    assert store.list("processed") == [
+        "processed/countries/0000.csv.gz",
+        "processed/countries/0001.csv.gz",
+        "processed/countries/manifest.json",
+    ]
+    assert json.loads(store.get(manifest_key)) == {
+        "entries": [
+            {
+                "url": store.url("processed/countries/0000.csv.gz"),
+                "mandatory": True,
+                "meta": {"content_length": 10},
+            },
+            {
+                "url": store.url("processed/countries/0001.csv.gz"),
+                "mandatory": True,
+                "meta": {"content_length": 20},
+            },
+        ]
+    }
+
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    copy_to_redshift(
+        store.url(manifest_key), "first.countries", connection, "create", store
+    )
+    assert pytest.similar(
+        cursor.execute.call_args[0][0],
+        f"""
+        COPY first.countries_duro_temp
+        FROM 'file://{store.root}/processed/countries/manifest.json'
+        manifest
+        gzip
+        delimiter ';'
+        ignoreheader 1
+        emptyasnull blanksasnull csv;
+        """,
+    )
+
+
+def test_copy_parquet_to_redshift(tmpdir):
+    store = LocalObjectStore(str(tmpdir.join("bucket")))
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+
+    copy_to_redshift(
+        store.url("processed/countries/manifest.json"),
+        "first.countries",
+        connection,
+        "create",
+        store,
+        "parquet",
+    )
+    assert pytest.similar(
+        cursor.execute.call_args[0][0],
+        f"""
+        COPY first.countries_duro_temp
+        FROM 'file://{store.root}/processed/countries/manifest.json'
+        manifest
+        format as parquet;
+        """,
+    )
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_select_to_columnar(tmpdir, file_format):
+    pa = pytest.importorskip("pyarrow")
+    Column = namedtuple("Column", ["name", "type_code", "precision", "scale"])
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.description = [
+        Column("country", 1043, None, None),
+        Column("population", 20, None, None),
+        Column("area", 1700, 12, 2),
+    ]
+    cursor.fetchmany.side_effect = [
+        [("France", 67000000, Decimal("643801.00"))],
+        [("Japan;Nippon", None, None)],
+        [],
+    ]
+    filename = str(tmpdir.join(f"selected.{file_format}"))
+
+    stats = select_to_columnar(
+        "select * from first.countries", filename, connection, file_format, 1
+    )
+
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(filename)
+    else:
+        table = pa.ipc.open_file(pa.memory_map(filename)).read_all()
+    assert table.schema.types == [pa.string(), pa.int64(), pa.decimal128(12, 2)]
+    assert table.to_pydict() == {
+        "country": ["France", "Japan;Nippon"],
+        "population": [67000000, None],
+        "area": [Decimal("643801.00"), None],
+    }
+    assert stats.rows == 2
+
+
+def test_split_to_chunks(tmpdir):
+    filename = str(tmpdir.join("selected.csv"))
+    with open(filename, "w") as csvfile:
+        csvfile.write('city\nParis\n"Ulaan\nbaatar"\nOslo\nRome\n')
+
+    chunks = split_to_chunks(filename, 2)
+
+    contents = []
+    for chunk in chunks:
+        with open(chunk) as chunk_file:
+            contents.append(chunk_file.read())
+    assert contents == ['city\nParis\n"Ulaan\nbaatar"\n', "city\nOslo\nRome\n"]
+
+
+def test_split_to_chunks_after_wide_row(tmpdir):
+    filename = str(tmpdir.join("selected.csv"))
+    with open(filename, "w") as csvfile:
+        csvfile.write("city\n" + "x" * 1000 + "\n")
+        csvfile.writelines(f"city{i}\n" for i in range(20))
+
+    chunks = split_to_chunks(filename, 4)
+
+    assert [os.path.basename(chunk) for chunk in chunks] == [
+        f"selected_chunk{i:02}.csv" for i in range(len(chunks))
+    ]
+    assert len(chunks) > 1
+    rows = []
+    for chunk in chunks:
+        with open(chunk) as chunk_file:
+            lines = chunk_file.read().splitlines()
+        assert lines[0] == "city"
+        rows += lines[1:]
+    assert rows == ["x" * 1000] + [f"city{i}" for i in range(20)]
+
+
+@pytest.fixture
+def chunks_processor(tmpdir, venv_path) -> str:
+    path = tmpdir.join("processor.py")
+    path.write(
+        "import sys\n"
+        "with open(sys.argv[1]) as input_file:\n"
+        "    lines = input_file.read().splitlines()\n"
+        "if 'fail' in lines:\n"
+        "    sys.exit('failed on ' + lines[1])\n"
+        "with open(sys.argv[2], 'w') as output_file:\n"
+        "    output_file.writelines(line.upper() + '\\n' for line in lines)\n"
+    )
+    return str(path)
+
+
+def test_run_processor_in_chunks(chunks_processor, tmpdir):
+    selected = str(tmpdir.join("selected.csv"))
+    with open(selected, "w") as csvfile:
+        csvfile.write("city\nParis\nOslo\nRome\n")
+
+    outputs = run_processor_in_chunks(
+        "views",
+        chunks_processor,
+        "first.cities",
+        selected,
+        str(tmpdir.join("processed.csv")),
+        3,
+    )
+
+    contents = []
+    for output in outputs:
+        with open(output) as output_file:
+            contents.append(output_file.read())
+    assert contents == ["CITY\nPARIS\n", "CITY\nOSLO\n", "CITY\nROME\n"]
+    assert sorted(tmpdir.listdir(lambda p: p.ext == ".csv")) == sorted(
+        [tmpdir.join("selected.csv")]
+        + [tmpdir.join(os.path.basename(o)) for o in outputs]
+    )
+
+
+def test_run_processor_in_chunks_error(chunks_processor, tmpdir):
+    selected = str(tmpdir.join("selected.csv"))
+    with open(selected, "w") as csvfile:
+        csvfile.write("city\nParis\nOslo\nfail\n")
+
+    with pytest.raises(ProcessorRunError) as e:
+        run_processor_in_chunks(
+            "views",
+            chunks_processor,
+            "first.cities",
+            selected,
+            str(tmpdir.join("processed.csv")),
+            3,
+        )
+    assert "chunk 2 of 3" in str(e.value)
+    assert "failed on fail" in str(e.value)
+    assert tmpdir.listdir(lambda p: p.ext == ".csv") == [tmpdir.join("selected.csv")]
+
+
+@pytest.mark.parametrize("rows", [[], [("Paris",)]])
+def test_process_to_parts_in_one_chunk(chunks_processor, tmpdir, rows):
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.description = [("city",)]
+    cursor.fetchmany.side_effect = [rows, []]
+    table = Table(
+        "first.cities", "select * from first.countries", None, {"parallel": 4}
+    )
+
+    parts = process_to_parts(
+        table,
+        chunks_processor,
+        "views",
+        str(tmpdir.join("selected.csv")),
+        str(tmpdir.join("processed.csv")),
+        str(tmpdir.join("parts")),
+        connection,
+        Timestamps(),
+    )
+
+    contents = []
+    for part in parts:
+        with gzip.open(part, "rt") as part_file:
+            contents.append(part_file.read())
+    assert contents == ["CITY\n" + "".join(f"{row[0].upper()}\n" for row in rows)]
+    assert tmpdir.listdir(lambda p: p.ext == ".csv") == []
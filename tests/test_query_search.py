@@ -1,6 +1,11 @@
 import pytest
 
-from duro.scheduler.query import is_table_used_in_query, remove_comments
+from duro.scheduler.query import (
+    is_table_used_in_query,
+    remove_comments,
+    find_tables_in_query,
+    replace_table_in_query,
+)
 
 
 def test_remove_comments():
@@ -60,3 +65,37 @@ def test_is_table_used_in_query():
     results = [(query, is_table_used_in_query(table, query)) for query, _ in queries]
 
     assert results == queries
+
+
+def test_find_tables_in_query():
+    query = """
+        select c.city, "first"."countries".continent
+        from first.cities c -- join second.removed
+        join "first"."countries" on c.country = countries.country
+    """
+    assert find_tables_in_query(query) == [
+        "c.city",
+        "c.country",
+        "countries.country",
+        "first.cities",
+        "first.countries",
+    ]
+
+
+def test_replace_table_in_query():
+    query = """
+        select * from first.cities c
+        join "first"."cities" x on x.id = first.cities.id
+        join first.cities_raw r on r.id = c.id
+        join a.first.cities y on y.id = c.id
+    """
+    expected = """
+        select * from first.cities_duro_temp c
+        join first.cities_duro_temp x on x.id = first.cities_duro_temp.id
+        join first.cities_raw r on r.id = c.id
+        join a.first.cities y on y.id = c.id
+    """
+    assert (
+        replace_table_in_query("first.cities", "first.cities_duro_temp", query)
+        == expected
+    )
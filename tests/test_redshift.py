@@ -1,7 +1,11 @@
+import time
 from unittest.mock import MagicMock
 
+import psycopg2
 import pytest
 
+import duro.create.redshift as redshift_module
+
 from duro.create.redshift import (
     create_temp_table,
     drop_table,
@@ -14,7 +18,18 @@ from duro.create.redshift import (
     insert_new_snapshot_data,
     remove_old_snapshots,
     get_dependencies,
+    DependentViewsIndex,
+    get_dependent_views_index,
+    convert_dependent_views,
     update_view,
+    update_dependent_views,
+    set_statement_timeout,
+    merge_increment,
+    transaction,
+    swap_staged_tables,
+    drop_old_tables,
+    hash_inputs,
+    terminate_backend,
 )
 
 
@@ -153,14 +168,31 @@ def test_remove_old_snapshots(table):
     )
 
 
+def test_remove_old_snapshots_after_archiving(table, monkeypatch):
+    table.snapshots_stored_for_mins = 180
+    table.snapshots_archive = True
+    monkeypatch.setattr(
+        redshift_module, "archive_expiring_rows", lambda *args: "2018-03-02 12:00:00"
+    )
+    remove_old_snapshots(table, connection())
+    assert pytest.similar(
+        redshift_execute.last_query,
+        """
+           delete from first.cities_history
+           where snapshot_timestamp <= '2018-03-02 12:00:00'
+        """,
+    )
+
+
 def test_get_dependencies():
     get_dependencies("first", "cities", connection())
     assert pytest.similar(
         redshift_execute.last_query,
         """
-            select distinct nv.nspname + '.' + v.relname as view_name,
+            select distinct nt.nspname + '.' + t.relname as table_name,
+                nv.nspname + '.' + v.relname as view_name,
                 pg_get_viewdef(v.oid) as view_definition
-            from pg_user, pg_namespace nv, pg_class v, pg_depend dv, 
+            from pg_namespace nv, pg_class v, pg_depend dv, 
                 pg_depend dt, pg_class t, pg_namespace nt
             where nv.oid = v.relnamespace
                 and v.relkind = 'v'
@@ -181,6 +213,70 @@ def test_get_dependencies():
     )
 
 
+def test_dependent_views_index():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [
+        ("first.cities", "first.cities_view", "select * from first.cities"),
+        ("first.cities", "second.both", "select * from first.cities, second.child"),
+        ("second.child", "second.both", "select * from first.cities, second.child"),
+    ]
+
+    index = DependentViewsIndex()
+    assert [v for v, _ in index.get("first.cities", conn)] == [
+        "first.cities_view",
+        "second.both",
+    ]
+    assert index.get("first.countries", conn) == []
+    assert cursor.execute.call_count == 1
+
+    index.invalidate_view("first.cities_view")
+    cursor.fetchall.return_value = [
+        ("first.cities", "first.cities_view", "select 1 from first.cities")
+    ]
+    assert index.get("first.cities", conn) == [
+        ("first.cities_view", "select 1 from first.cities")
+    ]
+    assert len(index.get("second.child", conn)) == 1
+    assert cursor.execute.call_count == 2
+
+    index.reset()
+    index.get("first.cities", conn)
+    assert cursor.execute.call_count == 3
+
+    index.fetched_at -= index.max_age + 1
+    index.get("first.cities", conn)
+    assert cursor.execute.call_count == 4
+
+
+def test_update_dependent_views_uses_current_definitions(monkeypatch):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    index = DependentViewsIndex()
+    index.views = {
+        "first.cities": [
+            ("first.cities_view", "select * from first.cities"),
+            ("first.dropped", "select * from first.cities"),
+        ]
+    }
+    index.fetched_at = time.monotonic()
+    monkeypatch.setattr(redshift_module, "get_dependent_views_index", lambda: index)
+    cursor.fetchall.return_value = [
+        ("first.cities_view", "select id from first.cities where id > 0;")
+    ]
+
+    update_dependent_views("first.cities", conn)
+
+    assert cursor.execute.call_count == 2
+    assert pytest.similar(
+        cursor.execute.call_args[0][0],
+        """
+        create or replace view first.cities_view as
+        (select id from first.cities_duro_temp where id > 0)
+        """,
+    )
+
+
 def test_update_view():
     view = "first.cities_view"
     definition = "select * from first.cities_duro_temp limit 20"
@@ -192,3 +288,169 @@ def test_update_view():
             (select * from first.cities_duro_temp limit 20)
         """,
     )
+
+
+def test_set_statement_timeout():
+    conn = connection()
+    set_statement_timeout(conn, 12.5)
+    assert pytest.similar(
+        redshift_execute.last_query, "set statement_timeout to 12500;"
+    )
+
+    redshift_execute.last_query = None
+    set_statement_timeout(conn, None)
+    assert redshift_execute.last_query is None
+
+
+def test_terminate_backend(monkeypatch):
+    conn = MagicMock()
+    monkeypatch.setattr(redshift_module, "create_connection", lambda: conn)
+    terminate_backend(42)
+    execute = conn.cursor.return_value.__enter__.return_value.execute
+    execute.assert_called_once_with("select pg_terminate_backend(%s);", (42,))
+    assert conn.close.called
+
+
+def test_merge_increment(table):
+    conn = MagicMock()
+    queries = conn.cursor.return_value.__enter__.return_value.execute
+    table.unique_key = "city"
+    merge_increment(table, conn)
+    delete, insert = [call[0][0] for call in queries.call_args_list]
+    assert pytest.similar(
+        delete,
+        """
+        delete from first.cities using first.cities_duro_temp
+        where first.cities."city" = first.cities_duro_temp."city";
+        """,
+    )
+    assert pytest.similar(
+        insert, "insert into first.cities select * from first.cities_duro_temp;"
+    )
+
+    queries.reset_mock()
+    table.unique_key = None
+    merge_increment(table, conn)
+    assert len(queries.call_args_list) == 1
+
+
+def test_transaction():
+    conn = MagicMock()
+    with transaction(conn):
+        assert conn.autocommit is False
+    assert conn.commit.called
+    assert conn.autocommit is True
+
+    conn = MagicMock()
+    with pytest.raises(ValueError):
+        with transaction(conn):
+            raise ValueError
+    assert conn.rollback.called
+    assert not conn.commit.called
+    assert conn.autocommit is True
+
+
+def test_swap_staged_tables():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.side_effect = [[("first.cities",)], []]
+    get_dependent_views_index().reset()
+    swap_staged_tables(["first.cities", "second.child"], conn)
+
+    queries = [call[0][0] for call in cursor.execute.call_args_list]
+    assert "pg_views" in queries[0]
+    assert queries[1] == "drop view first.cities;"
+    assert "pg_get_viewdef" in queries[2]
+    assert "alter table first.cities_duro_temp rename to cities;" in queries[3]
+    assert "alter table second.child_duro_temp rename to child;" in queries[4]
+    assert conn.commit.call_count == 1
+    assert conn.autocommit is True
+
+
+def test_drop_old_tables():
+    drop_old_tables(["first.cities", "second.child"], connection())
+    assert pytest.similar(
+        redshift_execute.last_query,
+        """
+        drop table if exists first.cities_duro_old;
+        drop table if exists second.child_duro_old;
+        """,
+    )
+
+
+def test_convert_dependent_views(monkeypatch):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    dependencies = [
+        ("first.cities", "first.cities_view", "select * from first.cities;"),
+        ("first.cities", "first.broken", "select * from pg_user, first.cities"),
+    ]
+
+    def execute(query, *args):
+        execute.last_query = query
+        if "first.broken" in query:
+            raise psycopg2.ProgrammingError("system tables aren’t supported")
+
+    def fetchall():
+        if "pg_views" in execute.last_query:
+            return [(view, definition) for _, view, definition in dependencies]
+        return dependencies
+
+    cursor.execute.side_effect = execute
+    cursor.fetchall.side_effect = fetchall
+    notifications = []
+    index = DependentViewsIndex(late_binding=True)
+    monkeypatch.setattr(redshift_module, "get_dependent_views_index", lambda: index)
+    monkeypatch.setattr(
+        redshift_module,
+        "send_slack_notification",
+        lambda *args: notifications.append(args),
+    )
+
+    failed = convert_dependent_views(["first.cities"], conn)
+    assert len(failed) == 1 and failed[0].startswith("first.broken")
+    assert len(notifications) == 1
+    converted = cursor.execute.call_args_list[2][0][0]
+    assert pytest.similar(
+        converted,
+        """
+        create or replace view first.cities_view as
+        (select * from first.cities)
+        with no schema binding;
+        """,
+    )
+    assert "first.cities" in index.stale
+
+    dependencies = [("first.cities", "first.broken", "select 1")]
+    assert convert_dependent_views(["first.cities"], conn) == []
+    assert len(notifications) == 1
+
+    index.late_binding = False
+    cursor.execute.reset_mock()
+    assert convert_dependent_views(["first.cities"], conn) == []
+    assert not cursor.execute.called
+
+
+def test_hash_inputs_with_unresolved_tables():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.side_effect = [
+        [("first.cities", "r")],
+        [("spectrum",)],
+    ]
+    assert hash_inputs(["first.cities", "spectrum.events"], cursor) is None
+    assert "svv_external_schemas" in cursor.execute.call_args[0][0]
+    assert cursor.execute.call_args[0][1] == (("spectrum",), ("spectrum",))
+
+    cursor.fetchall.side_effect = [
+        [("first.cities", "r")],
+        [],
+        [("first.cities", 1, 10, None, None)],
+    ]
+    assert hash_inputs(["first.cities", "c.id"], cursor) is not None
+
+    cursor.fetchall.side_effect = [
+        [("first.cities", "r")],
+        [("first.cities", 1, 10, None, None)],
+    ]
+    assert hash_inputs(["first.cities"], cursor) is not None
@@ -23,6 +23,9 @@ from duro.scheduler.table_config import (
     parse_table_config,
     build_table_configs,
     check_config_fields,
+    check_strategy_fields,
+    check_snapshots_fields,
+    check_export_fields,
 )
 from duro.utils.file_utils import load_tables_in_path
 from duro.utils.table import Table
@@ -301,3 +304,76 @@ def test_check_config_fields(views_path):
     tables_and_queries[0].config["distkey"] = None
     tables_and_queries[0].config["sortkey"] = "country"
     assert check_config_fields(tables_and_queries, views_path) is None
+
+
+def test_check_strategy_fields(views_path):
+    tables = load_tables_in_path(views_path)
+    graph = build_graph(tables)
+    configs = {t.name: t for t in build_table_configs(graph, views_path)}
+    cities, countries = configs["first.cities"], configs["first.countries"]
+
+    cities.config["strategy"] = "incremental"
+    with pytest.raises(ConfigFieldError):
+        check_strategy_fields(cities, views_path)
+
+    cities.config["incremental_key"] = "city"
+    assert check_strategy_fields(cities, views_path) is None
+
+    cities.config["unique_key"] = "missing_field"
+    with pytest.raises(ConfigFieldError):
+        check_strategy_fields(cities, views_path)
+
+    cities.config["strategy"] = "append_only"
+    with pytest.raises(ConfigFieldError):
+        check_strategy_fields(cities, views_path)
+
+    countries.config["strategy"] = "incremental"
+    countries.config["incremental_key"] = "country"
+    with pytest.raises(ConfigFieldError):
+        check_strategy_fields(countries, views_path)
+
+
+def test_check_snapshots_fields():
+    table = Table("first.cities", "select * from first.cities_raw", 60, {})
+    assert check_snapshots_fields(table) is None
+
+    table.config["snapshots_mode"] = "delta"
+    with pytest.raises(ConfigFieldError):
+        check_snapshots_fields(table)
+
+    table.config["snapshots_key"] = "city"
+    assert check_snapshots_fields(table) is None
+
+    table.config["snapshots_mode"] = "scd2"
+    with pytest.raises(ConfigFieldError):
+        check_snapshots_fields(table)
+
+
+def test_check_export_fields():
+    table = Table("first.cities", "select * from first.cities_raw", 60, {})
+    assert check_export_fields(table) is None
+
+    table.config["processor_mode"] = "stream"
+    assert check_export_fields(table) is None
+
+    table.config["export"] = "unload"
+    with pytest.raises(ConfigFieldError):
+        check_export_fields(table)
+
+    table.config["export"] = None
+    table.config["processor_format"] = "arrow"
+    with pytest.raises(ConfigFieldError):
+        check_export_fields(table)
+
+    table.config["processor_mode"] = None
+    table.config["processor_format"] = "orc"
+    with pytest.raises(ConfigFieldError):
+        check_export_fields(table)
+
+    table.config["processor_format"] = None
+    table.config["parallel"] = "4"
+    assert check_export_fields(table) is None
+
+    table.config["processor_mode"] = "pipe"
+    with pytest.raises(ConfigFieldError):
+        check_export_fields(table)
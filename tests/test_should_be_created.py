@@ -1,7 +1,14 @@
 import arrow
 
-from duro.create.sqlite import mark_table_as_waiting, mark_table_as_not_waiting, log_start
-from duro.create.tree import should_be_created
+import duro.create.tree
+from duro.create.sqlite import (
+    mark_table_as_waiting,
+    mark_table_as_not_waiting,
+    log_start,
+    log_phase,
+    update_last_created,
+)
+from duro.create.tree import should_be_created, wait_till_finished
 
 
 def test_should_be_created(db_str, db_cursor, table):
@@ -26,14 +33,33 @@ def test_should_be_created(db_str, db_cursor, table):
 
     start = arrow.now().replace(seconds=-180).timestamp
     log_start(db_str, table.name, start)
-    assert should_be_created(db_str, table) is True
+    assert should_be_created(db_str, table, stale_after=60) is True
 
     table.last_created = start
     assert should_be_created(db_str, table) is False
 
 
-def test_wait_till_finished(db_str, table):
-    pass
+def test_wait_till_finished(db_str, table, monkeypatch):
+    assert wait_till_finished(db_str, table.name, timeout=0) is True
+
+    log_start(db_str, table.name, arrow.now().replace(seconds=-600).timestamp)
+    log_phase(db_str, table.name, "select")
+    assert wait_till_finished(db_str, "first.countries", timeout=0) is True
+
+    checks = []
+
+    def finish(_):
+        checks.append(1)
+        if len(checks) == 2:
+            update_last_created(db_str, table.name, arrow.now().timestamp, 600)
+
+    monkeypatch.setattr(duro.create.tree.time, "sleep", finish)
+    assert wait_till_finished(db_str, table.name, stale_after=60) is True
+    assert len(checks) == 2
+
+    log_start(db_str, table.name, arrow.now().replace(seconds=-600).timestamp)
+    assert wait_till_finished(db_str, table.name, stale_after=60) is False
+    assert wait_till_finished(db_str, table.name, timeout=0) is True
 
 
 def test_list_children_for_table():
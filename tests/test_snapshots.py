@@ -0,0 +1,142 @@
+import arrow
+import pytest
+
+from duro.create.sqlite import get_last_snapshot, update_last_snapshot
+from duro.create.snapshots import (
+    build_as_of_query,
+    insert_delta,
+    make_delta_snapshot,
+    take_snapshot,
+)
+from duro.utils.table import Table
+from utils.errors import HistoryTableCreationError
+
+
+def delta_table() -> Table:
+    return Table(
+        "first.cities",
+        "select * from first.cities_raw",
+        60,
+        {
+            "snapshots_interval": "24h",
+            "snapshots_stored_for": "90d",
+            "snapshots_mode": "delta",
+            "snapshots_key": "city, country",
+        },
+    )
+
+
+columns = [("city", "character varying(256)"), ("country", "character varying(256)")]
+
+
+def test_delta_table_config():
+    table = delta_table()
+    assert table.snapshots_mode == "delta"
+    assert table.snapshots_key == ["city", "country"]
+    assert Table("first.cities", "", None).snapshots_mode == "full"
+
+
+def test_first_delta_snapshot(db_str):
+    conn, cursor = pytest.mock_connection(fetchall=[columns, []], rowcount=2)
+    assert make_delta_snapshot(delta_table(), db_str, conn) is True
+    create = pytest.executed_queries(cursor)[2]
+    assert pytest.similar(
+        create,
+        """
+        create table first.cities_history (
+            "city" character varying(256), "country" character varying(256),
+            "valid_from" timestamp, "valid_to" timestamp
+        );
+        """,
+    )
+    assert "insert into first.cities_history" in pytest.executed_queries(cursor)[5]
+    assert conn.commit.called
+    assert get_last_snapshot(db_str, "first.cities") is not None
+
+
+def test_delta_snapshot_adds_new_columns(db_str):
+    history = columns[:1] + [("valid_from", "timestamp"), ("valid_to", "timestamp")]
+    update_last_snapshot(db_str, "first.cities", arrow.now().shift(days=-2).timestamp)
+    conn, cursor = pytest.mock_connection(fetchall=[columns, history], rowcount=1)
+    assert make_delta_snapshot(delta_table(), db_str, conn) is True
+    assert pytest.similar(
+        pytest.executed_queries(cursor)[2],
+        """
+        alter table first.cities_history
+        add column "country" character varying(256);
+        """,
+    )
+
+
+def test_delta_snapshot_respects_interval(db_str):
+    history = columns + [("valid_from", "timestamp"), ("valid_to", "timestamp")]
+    update_last_snapshot(db_str, "first.cities", arrow.now().shift(hours=-1).timestamp)
+    conn, cursor = pytest.mock_connection(fetchall=[columns, history], rowcount=1)
+    assert make_delta_snapshot(delta_table(), db_str, conn) is False
+    assert len(pytest.executed_queries(cursor)) == 2
+
+
+def test_delta_snapshot_without_changes(db_str):
+    history = columns + [("valid_from", "timestamp"), ("valid_to", "timestamp")]
+    conn, cursor = pytest.mock_connection(fetchall=[columns, history, columns, history])
+    assert make_delta_snapshot(delta_table(), db_str, conn) is False
+    diff_queries = len(pytest.executed_queries(cursor))
+    assert get_last_snapshot(db_str, "first.cities") is not None
+
+    # the unchanged diff still counts for the interval
+    assert make_delta_snapshot(delta_table(), db_str, conn) is False
+    assert len(pytest.executed_queries(cursor)) == diff_queries + 2
+
+
+def test_delta_snapshot_needs_delta_history(db_str):
+    history = columns + [("snapshot_timestamp", "timestamp")]
+    conn, _ = pytest.mock_connection(fetchall=[columns, history])
+    with pytest.raises(HistoryTableCreationError):
+        take_snapshot(delta_table(), db_str, conn)
+
+
+def test_insert_delta():
+    conn, cursor = pytest.mock_connection()
+    cursor.rowcount = 2
+    assert insert_delta(delta_table(), ["city", "country"], conn) == 4
+    assert pytest.similar(
+        "".join(pytest.executed_queries(cursor)),
+        """
+        create temp table changed as (
+            select "city", "country" from first.cities_history where valid_to is null
+            except
+            select "city", "country" from first.cities
+        );
+
+        create temp table fresh as (
+            select "city", "country" from first.cities
+            except
+            select "city", "country" from first.cities_history where valid_to is null
+        );
+
+        update first.cities_history set valid_to = sysdate
+        from changed
+        where first.cities_history.valid_to is null
+            and (first.cities_history."city" = changed."city"
+                or (first.cities_history."city" is null and changed."city" is null))
+            and (first.cities_history."country" = changed."country"
+                or (first.cities_history."country" is null
+                    and changed."country" is null));
+
+        insert into first.cities_history ("city", "country", valid_from, valid_to)
+        select "city", "country", sysdate, null from fresh;
+
+        drop table changed; drop table fresh;
+        """,
+    )
+
+
+def test_build_as_of_query():
+    assert pytest.similar(
+        build_as_of_query("first.cities", "2018-03-27 12:00"),
+        """
+        select * from first.cities_history
+        where valid_from <= '2018-03-27 12:00'
+            and (valid_to is null or valid_to > '2018-03-27 12:00')
+        """,
+    )
@@ -0,0 +1,75 @@
+import csv
+
+import pytest
+
+from create.stream import ProcessorWorker, WorkerPool
+from utils.errors import ProcessorRunError
+
+
+@pytest.fixture
+def processor(tmpdir) -> str:
+    path = tmpdir.join("processor.py")
+    path.write(
+        "def process(rows):\n"
+        "    for row in rows:\n"
+        "        if row['a'] is None:\n"
+        "            raise ValueError('empty a')\n"
+        "        yield {'a': row['a'], 'sum': row['a'] + row['b']}\n"
+    )
+    return str(path)
+
+
+def read_csv(filename: str) -> list:
+    with open(filename) as csvfile:
+        return list(csv.reader(csvfile, delimiter=";"))
+
+
+def test_worker_runs_several_jobs(venv_path, processor, tmpdir):
+    output = str(tmpdir.join("processed.csv"))
+    worker = ProcessorWorker(venv_path)
+    try:
+        rows = worker.run("first.countries", processor, ["a", "b"], [[1, 2]], output)
+        assert rows == 1
+        assert read_csv(output) == [["a", "sum"], ["1", "3"]]
+
+        input_done = []
+        rows = worker.run(
+            "first.countries",
+            processor,
+            ["a", "b"],
+            ([i, i] for i in range(3)),
+            output,
+            lambda: input_done.append(True),
+        )
+        assert rows == 3
+        assert input_done == [True]
+        assert read_csv(output) == [["a", "sum"], ["0", "0"], ["1", "2"], ["2", "4"]]
+        assert worker.alive
+    finally:
+        worker.close()
+
+
+def test_worker_reports_processor_errors(venv_path, processor, tmpdir):
+    output = str(tmpdir.join("processed.csv"))
+    worker = ProcessorWorker(venv_path)
+    try:
+        with pytest.raises(ProcessorRunError) as e:
+            worker.run(
+                "first.countries", processor, ["a", "b"], [[1, 2], [None, 2]], output
+            )
+        assert "empty a" in str(e.value)
+    finally:
+        worker.close()
+
+
+def test_worker_pool_reuses_workers(venv_path):
+    pool = WorkerPool()
+    worker = pool.acquire(venv_path)
+    pool.release(worker)
+    assert pool.acquire(venv_path) is worker
+
+    worker.close()
+    pool.release(worker)
+    new_worker = pool.acquire(venv_path)
+    assert new_worker is not worker
+    new_worker.close()
@@ -68,3 +68,41 @@ def test_has_snapshots(db_str):
 
     parent = load_table_details(db_str, "second.parent")
     assert parent.store_snapshots is False
+
+
+def test_skip_unchanged():
+    assert Table("first.cities", "", None).skip_unchanged is False
+    assert (
+        Table("first.cities", "", None, {"skip_unchanged": "no"}).skip_unchanged
+        is False
+    )
+    assert (
+        Table("first.cities", "", None, {"skip_unchanged": "True"}).skip_unchanged
+        is True
+    )
+
+    with_query = Table("first.cities", "", None, {"freshness_query": "select 1"})
+    assert with_query.skip_unchanged is True
+    assert with_query.freshness_query == "select 1"
+
+
+def test_get_increment_query():
+    table = Table(
+        "first.cities",
+        "select * from first.cities_raw;\n",
+        None,
+        {"strategy": "incremental", "incremental_key": "updated", "distkey": "city"},
+    )
+    assert table.incremental is True
+    assert Table("first.cities", "", None).incremental is False
+    assert pytest.similar(
+        table.get_increment_query("'2018-03-27'"),
+        """
+        create table first.cities_duro_temp
+        distkey("city")
+        as (
+            select * from (select * from first.cities_raw) as increment
+            where "updated" > '2018-03-27'
+        );
+        """,
+    )
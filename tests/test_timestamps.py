@@ -3,7 +3,7 @@ import time
 import arrow
 import pytest
 
-from duro.create.timestamps import Timestamps
+from duro.create.timestamps import Timestamps, ProgressTimestamps
 
 
 # noinspection PyUnresolvedReferences
@@ -14,6 +14,7 @@ def test_timestamps():
         "start",
         "connect",
         "select",
+        "venv",
         "create_temp",
         "process",
         "csv",
@@ -23,7 +24,11 @@ def test_timestamps():
         "tests",
         "replace_old",
         "drop_old",
+        "merge",
         "make_snapshot",
+        "vacuum",
+        "analyze",
+        "skipped",
         "finish",
     ]
     assert ts.__slots__ == events
@@ -46,3 +51,15 @@ def test_timestamps():
     assert ts.drop_old - now <= 3
     assert ts.finish - now <= 3
     assert ts.duration <= 3
+
+
+# noinspection PyUnresolvedReferences
+# pylint: disable=no-member
+def test_progress_timestamps():
+    phases = []
+    ts = ProgressTimestamps(phases.append)
+    ts.log("start")
+    ts.log("select")
+    assert phases == ["start", "select"]
+    assert ts.events == Timestamps().events
+    assert len([v for v in ts.values if v is not None]) == 2
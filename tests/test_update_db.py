@@ -0,0 +1,33 @@
+import sqlite3
+
+from duro.update_db import update_db, updates
+
+
+def get_columns(connection, table: str) -> set:
+    return {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+
+
+def test_update_db_adds_timestamps_columns(db_str):
+    connection = sqlite3.connect(db_str)
+    connection.execute("DROP TABLE timestamps")
+    connection.execute('CREATE TABLE timestamps ("table" text, start int)')
+    connection.commit()
+
+    update_db(db_str)
+
+    assert {"skipped", "merge", "vacuum", "analyze", "venv"} <= get_columns(
+        connection, "timestamps"
+    )
+    version = connection.execute("SELECT major * 100 + minor FROM version")
+    assert version.fetchone()[0] == updates[-1][0]
+
+
+def test_update_db_skips_columns_added_by_creator(db_str):
+    connection = sqlite3.connect(db_str)
+    connection.execute("DROP TABLE timestamps")
+    connection.execute('CREATE TABLE timestamps ("table" text, skipped int)')
+    connection.commit()
+
+    update_db(db_str)
+
+    assert "skipped" in get_columns(connection, "timestamps")
@@ -0,0 +1,91 @@
+import os
+import time
+
+import pytest
+
+import duro.create.venvs as venvs_module
+from duro.create.venvs import (
+    collect_unused_venvs,
+    get_venv_key,
+    processor_venv,
+    ready_marker,
+)
+
+
+@pytest.fixture
+def venvs_folder(tmpdir, monkeypatch) -> str:
+    folder = str(tmpdir.join("venvs"))
+    monkeypatch.setattr(venvs_module, "venvs_folder", folder)
+    return folder
+
+
+@pytest.fixture
+def created(monkeypatch) -> list:
+    created = []
+
+    def create_venv(venv_path, requirements, table_name):
+        os.makedirs(venv_path, exist_ok=True)
+        open(os.path.join(venv_path, ready_marker), "w").close()
+        created.append(table_name)
+
+    monkeypatch.setattr(venvs_module, "create_venv", create_venv)
+    return created
+
+
+def test_get_venv_key(tmpdir):
+    first, second, third = (tmpdir.join(f"{i}.txt") for i in range(3))
+    first.write("requests==2.21.0\nidna==2.8\n")
+    second.write("idna==2.8\n\nrequests==2.21.0")
+    third.write("idna==2.7\nrequests==2.21.0")
+
+    assert get_venv_key(str(first)) == get_venv_key(str(second))
+    assert get_venv_key(str(first)) != get_venv_key(str(third))
+    assert get_venv_key(None) != get_venv_key(str(first))
+
+
+def test_processor_venv_is_shared(views_path, venvs_folder, created):
+    with processor_venv(views_path, "first.countries") as venv_path:
+        assert os.path.dirname(venv_path) == venvs_folder
+    with processor_venv(views_path, "first.countries") as same_venv_path:
+        assert same_venv_path == venv_path
+
+    with processor_venv(views_path, "first.cities") as other_venv_path:
+        assert other_venv_path != venv_path
+
+    assert created == ["first.countries", "first.cities"]
+
+
+def test_processor_venv_replaces_unfinished(views_path, venvs_folder, created):
+    requirements = os.path.join(views_path, "first", "countries_requirements.txt")
+    unfinished = os.path.join(venvs_folder, get_venv_key(requirements))
+    os.makedirs(unfinished)
+
+    with processor_venv(views_path, "first.countries") as venv_path:
+        assert venv_path == unfinished
+    assert created == ["first.countries"]
+
+
+def test_collect_unused_venvs(views_path, venvs_folder, created):
+    with processor_venv(views_path, "first.countries") as used:
+        pass
+    with processor_venv(views_path, "first.cities") as unused:
+        pass
+    os.makedirs(os.path.join(venvs_folder, "first.countries"))
+
+    week_ago = time.time() - 8 * 24 * 60 * 60
+    os.utime(os.path.join(unused, ready_marker), (week_ago, week_ago))
+    os.utime(os.path.join(venvs_folder, "first.countries"), (week_ago, week_ago))
+
+    removed = collect_unused_venvs(7)
+    assert sorted(removed) == sorted([os.path.basename(unused), "first.countries"])
+    assert os.path.exists(used)
+
+
+def test_venvs_in_use_arent_collected(views_path, venvs_folder, created):
+    with processor_venv(views_path, "first.countries") as venv_path:
+        week_ago = time.time() - 8 * 24 * 60 * 60
+        os.utime(os.path.join(venv_path, ready_marker), (week_ago, week_ago))
+        assert collect_unused_venvs(7) == []
+    assert os.path.exists(venv_path)
+
+    assert collect_unused_venvs(7) == [os.path.basename(venv_path)]
@@ -0,0 +1,26 @@
+import os
+import time
+
+from duro.utils.wakeup import open_wakeup_socket, notify_creator, wait_for_wakeup
+
+SOCKET_PATH = "./test_wakeup.sock"
+
+
+def test_wakeup():
+    sock = open_wakeup_socket(SOCKET_PATH)
+    try:
+        assert wait_for_wakeup(sock, 0.1) is False
+
+        assert notify_creator(SOCKET_PATH) is True
+        assert notify_creator(SOCKET_PATH) is True
+        start = time.time()
+        assert wait_for_wakeup(sock, 10) is True
+        assert time.time() - start < 1
+
+        assert wait_for_wakeup(sock, 0.1) is False
+    finally:
+        sock.close()
+        os.remove(SOCKET_PATH)
+
+    assert notify_creator(SOCKET_PATH) is False
+    assert notify_creator(None) is False